@@ -1,9 +1,64 @@
+import logging
+import os
+import re
+import secrets
+import shutil
 import sqlite3
 from pathlib import Path
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 DB_FILENAME = "beauty_salon.sqlite3"
 DB_PATH = Path(__file__).resolve().parent / DB_FILENAME
+FIELD_KEY_ENV = "SALON_FIELD_KEY"
+
+
+def branch_db_path(branch: Optional[str] = None) -> Path:
+    if not branch:
+        return DB_PATH
+    if not re.fullmatch(r"[\w-]+", branch):
+        raise ValueError(f"Недопустимое имя филиала: {branch!r}")
+    return DB_PATH.with_name(f"{DB_PATH.stem}_{branch}{DB_PATH.suffix}")
+
+
+def archive_db_path(db_path: Path) -> Path:
+    return db_path.with_name(f"{db_path.stem}_archive{db_path.suffix}")
+
+
+def field_key_path(db_path: Path) -> Path:
+    return db_path.with_name(f"{db_path.stem}_field.key")
+
+
+def copy_database(source: Path, target: Path) -> None:
+    source_connection = sqlite3.connect(str(source))
+    target_connection = sqlite3.connect(str(target))
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
+    key = field_key_path(source)
+    if key.exists():
+        shutil.copyfile(key, field_key_path(target))
+        os.chmod(field_key_path(target), 0o600)
+
+
+def _ensure_field_key(db_path: Path) -> None:
+    if os.environ.get(FIELD_KEY_ENV):
+        return
+    path = field_key_path(db_path)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, "w", encoding="ascii") as handle:
+        handle.write(secrets.token_hex(32))
+    logger.warning(
+        "Создан ключ шифрования паспортных данных %s: без него данные не расшифровать, "
+        "храните его вместе с резервными копиями или задайте SALON_FIELD_KEY",
+        path,
+    )
 
 
 def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
@@ -13,6 +68,14 @@ def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
     return connection
 
 
+def get_read_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    uri = f"{Path(db_path or DB_PATH).resolve().as_uri()}?mode=ro"
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
 def _create_schema(connection: sqlite3.Connection) -> None:
     connection.executescript(
         """
@@ -39,6 +102,7 @@ def _create_schema(connection: sqlite3.Connection) -> None:
             planned_end DATE,
             id_additional_option INTEGER,
             additional_notes TEXT,
+            passport_bidx TEXT,
             FOREIGN KEY (id_client) REFERENCES clients(id_client),
             FOREIGN KEY (id_additional_option) REFERENCES additional_info_options(id_option)
         );
@@ -144,6 +208,7 @@ def _create_schema(connection: sqlite3.Connection) -> None:
             planned_start DATE,
             planned_end DATE,
             id_additional_option INTEGER,
+            passport_bidx TEXT,
             FOREIGN KEY (id_appointment) REFERENCES appointments(id_appointment),
             FOREIGN KEY (id_additional_option) REFERENCES additional_info_options(id_option)
         );
@@ -172,15 +237,378 @@ def _create_schema(connection: sqlite3.Connection) -> None:
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (id_client) REFERENCES clients(id_client)
         );
+
+        CREATE TABLE IF NOT EXISTS payment_parts (
+            id_part INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_payment INTEGER NOT NULL,
+            payment_method TEXT CHECK (payment_method IN ('Наличные', 'Карта', 'Сертификат')),
+            amount NUMERIC,
+            id_certificate INTEGER,
+            FOREIGN KEY (id_payment) REFERENCES payments(id_payment),
+            FOREIGN KEY (id_certificate) REFERENCES gift_certificates(id_certificate)
+        );
+
+        CREATE TABLE IF NOT EXISTS service_price_history (
+            id_price INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_service INTEGER NOT NULL,
+            price NUMERIC NOT NULL,
+            valid_from DATE NOT NULL,
+            valid_to DATE,
+            FOREIGN KEY (id_service) REFERENCES service_pricelist(id_service)
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_service_price_history_service_from
+            ON service_price_history (id_service, valid_from);
+
+        CREATE TRIGGER IF NOT EXISTS trg_service_price_history_insert
+        AFTER INSERT ON service_pricelist
+        WHEN NEW.price IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO service_price_history (id_service, price, valid_from)
+            VALUES (NEW.id_service, NEW.price, '1900-01-01');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_service_price_history_update
+        AFTER UPDATE OF price ON service_pricelist
+        WHEN NEW.price IS NOT NULL AND NEW.price IS NOT (
+            SELECT price FROM service_price_history
+            WHERE id_service = NEW.id_service AND valid_from <= date('now', 'localtime')
+            ORDER BY valid_from DESC LIMIT 1
+        )
+        BEGIN
+            UPDATE service_price_history
+            SET valid_to = date('now', 'localtime')
+            WHERE id_service = NEW.id_service
+              AND valid_from < date('now', 'localtime')
+              AND (valid_to IS NULL OR valid_to > date('now', 'localtime'));
+            INSERT INTO service_price_history (id_service, price, valid_from, valid_to)
+            VALUES (
+                NEW.id_service,
+                NEW.price,
+                date('now', 'localtime'),
+                (SELECT MIN(valid_from) FROM service_price_history
+                 WHERE id_service = NEW.id_service AND valid_from > date('now', 'localtime'))
+            )
+            ON CONFLICT(id_service, valid_from) DO UPDATE SET price = excluded.price;
+        END;
+
+        CREATE TABLE IF NOT EXISTS client_metrics (
+            id_client INTEGER PRIMARY KEY,
+            first_visit DATE,
+            last_visit DATE,
+            visits INTEGER NOT NULL,
+            avg_gap_days REAL,
+            total_spend NUMERIC NOT NULL,
+            r_score INTEGER,
+            f_score INTEGER,
+            m_score INTEGER,
+            segment TEXT NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_client) REFERENCES clients(id_client)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_client_metrics_segment ON client_metrics (segment, last_visit);
+
+        CREATE INDEX IF NOT EXISTS idx_client_metrics_last_visit ON client_metrics (last_visit);
+
+        CREATE INDEX IF NOT EXISTS idx_client_metrics_visits ON client_metrics (visits);
+
+        CREATE INDEX IF NOT EXISTS idx_client_metrics_spend ON client_metrics (total_spend);
+
+        CREATE TABLE IF NOT EXISTS demand_aggregates (
+            specialization TEXT NOT NULL,
+            week_start DATE NOT NULL,
+            weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6),
+            hour INTEGER NOT NULL CHECK (hour BETWEEN 0 AND 23),
+            bookings INTEGER NOT NULL,
+            PRIMARY KEY (specialization, week_start, weekday, hour)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_demand_aggregates_week ON demand_aggregates (week_start);
+
+        CREATE TABLE IF NOT EXISTS waitlist (
+            id_waitlist INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_client INTEGER NOT NULL,
+            id_service INTEGER NOT NULL,
+            id_master INTEGER,
+            date_from DATE NOT NULL,
+            date_to DATE NOT NULL,
+            auto_book INTEGER NOT NULL DEFAULT 0 CHECK (auto_book IN (0, 1)),
+            status TEXT NOT NULL DEFAULT 'Ожидает' CHECK (status IN (
+                'Ожидает',
+                'Предложено',
+                'Записан',
+                'Снят',
+                'Истёк'
+            )),
+            offer_master INTEGER,
+            offer_date DATE,
+            offer_time TIME,
+            offer_expires_at TIMESTAMP,
+            id_appointment INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_client) REFERENCES clients(id_client),
+            FOREIGN KEY (id_service) REFERENCES service_pricelist(id_service),
+            FOREIGN KEY (id_master) REFERENCES masters(id_master),
+            FOREIGN KEY (id_appointment) REFERENCES appointments(id_appointment)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_waitlist_match ON waitlist (status, id_service, id_master, date_to);
+
+        CREATE INDEX IF NOT EXISTS idx_waitlist_client ON waitlist (id_client, status);
+
+        CREATE INDEX IF NOT EXISTS idx_waitlist_offer ON waitlist (status, offer_expires_at);
+
+        CREATE INDEX IF NOT EXISTS idx_waitlist_appointment ON waitlist (id_appointment);
+
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id_notification INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            id_appointment INTEGER,
+            id_waitlist INTEGER,
+            kind TEXT NOT NULL CHECK (kind IN ('Напоминание', 'Изменение', 'Отмена', 'Предложение')),
+            status TEXT NOT NULL DEFAULT 'Ожидает' CHECK (status IN (
+                'Ожидает',
+                'Отправлено',
+                'Ошибка',
+                'Отменено',
+                'Просрочено'
+            )),
+            due_at TIMESTAMP NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            sent_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_appointment) REFERENCES appointments(id_appointment),
+            FOREIGN KEY (id_waitlist) REFERENCES waitlist(id_waitlist)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (status, due_at);
+
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_appointment ON notification_outbox (id_appointment, status);
+
+        CREATE TRIGGER IF NOT EXISTS trg_outbox_appointment_insert
+        AFTER INSERT ON appointments
+        WHEN NEW.status = 'Запланирован'
+        BEGIN
+            INSERT OR IGNORE INTO notification_outbox (idempotency_key, id_appointment, kind, due_at)
+            VALUES (
+                'reminder:' || NEW.id_appointment || ':' || NEW.appointment_date || 'T' || NEW.appointment_time,
+                NEW.id_appointment,
+                'Напоминание',
+                datetime(NEW.appointment_date || ' ' || NEW.appointment_time, '-1 day')
+            );
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_outbox_appointment_change
+        AFTER UPDATE OF appointment_date, appointment_time, id_master ON appointments
+        WHEN NEW.status = 'Запланирован'
+            AND (NEW.appointment_date IS NOT OLD.appointment_date
+                 OR NEW.appointment_time IS NOT OLD.appointment_time
+                 OR NEW.id_master IS NOT OLD.id_master)
+        BEGIN
+            UPDATE notification_outbox
+            SET status = 'Отменено', updated_at = CURRENT_TIMESTAMP
+            WHERE id_appointment = NEW.id_appointment AND status = 'Ожидает'
+              AND idempotency_key <> 'reminder:' || NEW.id_appointment || ':' || NEW.appointment_date || 'T' || NEW.appointment_time;
+            INSERT OR IGNORE INTO notification_outbox (idempotency_key, id_appointment, kind, due_at)
+            VALUES (
+                'reminder:' || NEW.id_appointment || ':' || NEW.appointment_date || 'T' || NEW.appointment_time,
+                NEW.id_appointment,
+                'Напоминание',
+                datetime(NEW.appointment_date || ' ' || NEW.appointment_time, '-1 day')
+            );
+            INSERT OR IGNORE INTO notification_outbox (idempotency_key, id_appointment, kind, due_at)
+            VALUES (
+                'change:' || NEW.id_appointment || ':' || NEW.appointment_date || 'T' || NEW.appointment_time
+                    || ':' || COALESCE(NEW.id_master, ''),
+                NEW.id_appointment,
+                'Изменение',
+                datetime('now', 'localtime')
+            );
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_outbox_appointment_status
+        AFTER UPDATE OF status ON appointments
+        WHEN OLD.status = 'Запланирован' AND NEW.status IS NOT 'Запланирован'
+        BEGIN
+            UPDATE notification_outbox
+            SET status = 'Отменено', updated_at = CURRENT_TIMESTAMP
+            WHERE id_appointment = NEW.id_appointment AND status = 'Ожидает';
+            INSERT OR IGNORE INTO notification_outbox (idempotency_key, id_appointment, kind, due_at)
+            SELECT 'cancel:' || NEW.id_appointment, NEW.id_appointment, 'Отмена', datetime('now', 'localtime')
+            WHERE NEW.status = 'Отменён'
+              AND NEW.appointment_date || ' ' || NEW.appointment_time > datetime('now', 'localtime');
+        END;
+
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id_audit INTEGER PRIMARY KEY AUTOINCREMENT,
+            changed_at TIMESTAMP NOT NULL,
+            id_user INTEGER,
+            username TEXT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            action TEXT NOT NULL CHECK (action IN ('insert', 'update')),
+            diff TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log (entity, entity_id, id_audit);
+
+        CREATE TRIGGER IF NOT EXISTS trg_audit_log_no_update
+        BEFORE UPDATE ON audit_log
+        BEGIN
+            SELECT RAISE(ABORT, 'audit_log is append-only');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_audit_log_no_delete
+        BEFORE DELETE ON audit_log
+        BEGIN
+            SELECT RAISE(ABORT, 'audit_log is append-only');
+        END;
+
+        CREATE TABLE IF NOT EXISTS batch_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_appointments_master_slot
+            ON appointments (id_master, appointment_date, appointment_time);
+
+        CREATE INDEX IF NOT EXISTS idx_appointments_status_date
+            ON appointments (status, appointment_date, appointment_time);
+
+        CREATE INDEX IF NOT EXISTS idx_appointments_client_updated
+            ON appointments (id_client, updated_at);
+
+        CREATE INDEX IF NOT EXISTS idx_gift_certificates_status_expiration
+            ON gift_certificates (status, expiration_date);
+
+        CREATE INDEX IF NOT EXISTS idx_payments_appointment
+            ON payments (id_appointment);
+
+        CREATE INDEX IF NOT EXISTS idx_payment_parts_payment
+            ON payment_parts (id_payment);
+
+        CREATE INDEX IF NOT EXISTS idx_gift_certificates_number
+            ON gift_certificates (certificate_number);
         """
     )
 
 
+SEARCH_APPOINTMENT = 1
+SEARCH_CLIENT = 2
+SEARCH_SERVICE = 3
+
+_SEARCH_INDEX_STATEMENTS = (
+    """
+    CREATE VIRTUAL TABLE search_index USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_appointment_insert AFTER INSERT ON appointments
+    WHEN COALESCE(NEW.notes, '') <> ''
+    BEGIN
+        INSERT INTO search_index (rowid, body) VALUES (NEW.id_appointment * 4 + 1, NEW.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_appointment_update AFTER UPDATE OF notes ON appointments
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id_appointment * 4 + 1;
+        INSERT INTO search_index (rowid, body)
+        SELECT NEW.id_appointment * 4 + 1, NEW.notes WHERE COALESCE(NEW.notes, '') <> '';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_appointment_delete AFTER DELETE ON appointments
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id_appointment * 4 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_profile_insert AFTER INSERT ON client_profiles
+    WHEN COALESCE(NEW.additional_notes, '') <> ''
+    BEGIN
+        INSERT INTO search_index (rowid, body) VALUES (NEW.id_client * 4 + 2, NEW.additional_notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_profile_update AFTER UPDATE OF additional_notes ON client_profiles
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id_client * 4 + 2;
+        INSERT INTO search_index (rowid, body)
+        SELECT NEW.id_client * 4 + 2, NEW.additional_notes WHERE COALESCE(NEW.additional_notes, '') <> '';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_profile_delete AFTER DELETE ON client_profiles
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id_client * 4 + 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_service_insert AFTER INSERT ON service_pricelist
+    BEGIN
+        INSERT INTO search_index (rowid, body)
+        VALUES (NEW.id_service * 4 + 3, COALESCE(NEW.service_name, '') || ' ' || COALESCE(NEW.description, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_service_update AFTER UPDATE OF service_name, description ON service_pricelist
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id_service * 4 + 3;
+        INSERT INTO search_index (rowid, body)
+        VALUES (NEW.id_service * 4 + 3, COALESCE(NEW.service_name, '') || ' ' || COALESCE(NEW.description, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_service_delete AFTER DELETE ON service_pricelist
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id_service * 4 + 3;
+    END
+    """,
+    """
+    INSERT INTO search_index (rowid, body)
+    SELECT id_appointment * 4 + 1, notes FROM appointments WHERE COALESCE(notes, '') <> ''
+    UNION ALL
+    SELECT id_client * 4 + 2, additional_notes FROM client_profiles WHERE COALESCE(additional_notes, '') <> ''
+    UNION ALL
+    SELECT id_service * 4 + 3, COALESCE(service_name, '') || ' ' || COALESCE(description, '') FROM service_pricelist
+    """,
+)
+
+
+def _create_search_index(connection: sqlite3.Connection) -> bool:
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_index'").fetchone() is not None:
+        return True
+    try:
+        connection.execute(_SEARCH_INDEX_STATEMENTS[0])
+    except sqlite3.OperationalError:
+        return False
+    for statement in _SEARCH_INDEX_STATEMENTS[1:]:
+        connection.execute(statement)
+    return True
+
+
 def _table_has_rows(connection: sqlite3.Connection, table_name: str) -> bool:
     cursor = connection.execute(f"SELECT 1 FROM {table_name} LIMIT 1")
     return cursor.fetchone() is not None
 
 
+def _create_passport_indexes(connection: sqlite3.Connection) -> None:
+    for table_name in ("client_profiles", "appointment_forms"):
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_passport_bidx ON {table_name} (passport_bidx)"
+        )
+        connection.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_passport_plain ON {table_name} (passport_number)
+            WHERE passport_bidx IS NULL AND passport_number <> ''
+            """
+        )
+
+
 def _ensure_column(connection: sqlite3.Connection, table_name: str, column_name: str, column_ddl: str) -> None:
     rows = connection.execute(f"PRAGMA table_info({table_name})").fetchall()
     existing = {row["name"] for row in rows}
@@ -321,13 +749,40 @@ def seed_data(connection: sqlite3.Connection) -> None:
             (1, "0000 000000", "2024-03-01", "2024-03-03", 2, ""),)
 
 def init_db(seed: bool = True, db_path: Optional[Path] = None) -> Path:
+    _ensure_field_key(Path(db_path or DB_PATH))
     connection = get_connection(db_path)
     try:
+        connection.execute("PRAGMA journal_mode = WAL")
         _create_schema(connection)
         _ensure_column(connection, "client_profiles", "planned_start", "DATE")
         _ensure_column(connection, "client_profiles", "planned_end", "DATE")
+        _ensure_column(connection, "client_profiles", "passport_bidx", "TEXT")
+        _ensure_column(connection, "appointment_forms", "passport_bidx", "TEXT")
+        _create_passport_indexes(connection)
+        connection.execute(
+            "INSERT OR IGNORE INTO batch_state (key, value) VALUES ('field_crypto.salt', lower(hex(randomblob(16))))"
+        )
         if seed:
             seed_data(connection)
+        connection.execute(
+            """
+            INSERT INTO service_price_history (id_service, price, valid_from)
+            SELECT s.id_service, s.price, '1900-01-01'
+            FROM service_pricelist s
+            WHERE s.price IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM service_price_history h WHERE h.id_service = s.id_service)
+            """
+        )
+        _create_search_index(connection)
+        connection.execute(
+            """
+            INSERT OR IGNORE INTO notification_outbox (idempotency_key, id_appointment, kind, due_at)
+            SELECT 'reminder:' || id_appointment || ':' || appointment_date || 'T' || appointment_time,
+                   id_appointment, 'Напоминание', datetime(appointment_date || ' ' || appointment_time, '-1 day')
+            FROM appointments
+            WHERE status = 'Запланирован' AND appointment_date >= date('now', 'localtime')
+            """
+        )
 
         connection.execute(
             """
@@ -1,17 +1,28 @@
+import logging
+
 from PyQt5.QtWidgets import QApplication
-from db import init_db
-from salon_app.db_access import Db
+from salon_app.maintenance import MaintenanceWorker
+from salon_app.notifications import NotificationDispatcher
+from salon_app.shards import ShardRouter
 from salon_app.ui.login_window import LoginWindow
 
 def run() -> None:
-    init_db(seed=True)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    router = ShardRouter.from_env()
+    router.init_all(seed=True)
 
     app = QApplication([])
-    db = Db()
-    app.aboutToQuit.connect(db.close)
+    dbs = {branch: router.open(branch) for branch in router.branches}
+    for db in dbs.values():
+        app.aboutToQuit.connect(db.close)
+    workers = [MaintenanceWorker(router.paths[branch]) for branch in router.branches]
+    dispatchers = [NotificationDispatcher(router.paths[branch]) for branch in router.branches]
+    for worker in [*workers, *dispatchers]:
+        app.aboutToQuit.connect(worker.stop)
+        worker.start()
 
-    login = LoginWindow(db)
+    login = LoginWindow(dbs)
     result = login.exec_()
     if result != login.Accepted:
         return
-    app.exec_()
\ No newline at end of file
+    app.exec_()
@@ -0,0 +1,167 @@
+import argparse
+import logging
+import sqlite3
+import time
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+from db import DB_PATH, archive_db_path, get_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_MONTHS = 12
+DEFAULT_CHUNK_SIZE = 1000
+ARCHIVED_TABLES = ("appointments", "appointment_forms", "payments", "payment_parts")
+
+
+def attach_archive(
+    connection: sqlite3.Connection, db_path: Optional[Path] = None, create: bool = False, read_only: bool = False
+) -> Optional[str]:
+    path = archive_db_path(db_path or DB_PATH)
+    if not create and not path.exists():
+        return None
+
+    if read_only:
+        connection.execute("ATTACH DATABASE ? AS archive", (f"{path.resolve().as_uri()}?mode=ro",))
+        return archive_horizon(connection)
+
+    connection.execute("ATTACH DATABASE ? AS archive", (str(path),))
+    connection.execute("PRAGMA archive.journal_mode = WAL")
+    for table_name in ARCHIVED_TABLES:
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS archive.{table_name} AS SELECT * FROM main.{table_name} WHERE 0"
+        )
+        archived = {row[1] for row in connection.execute(f"PRAGMA archive.table_info({table_name})")}
+        for row in connection.execute(f"PRAGMA main.table_info({table_name})").fetchall():
+            if row[1] not in archived:
+                connection.execute(f"ALTER TABLE archive.{table_name} ADD COLUMN {row[1]} {row[2]}")
+    connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS archive.archive_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_appointments_id
+            ON appointments (id_appointment);
+
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_appointments_date
+            ON appointments (appointment_date, appointment_time);
+
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_appointments_client
+            ON appointments (id_client, appointment_date);
+
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_payments_appointment
+            ON payments (id_appointment);
+
+        CREATE INDEX IF NOT EXISTS archive.idx_archive_appointment_forms_passport_plain
+            ON appointment_forms (passport_number)
+            WHERE passport_bidx IS NULL AND passport_number <> '';
+        """
+    )
+    return archive_horizon(connection)
+
+
+def archive_attached(connection: sqlite3.Connection) -> bool:
+    return any(row[1] == "archive" for row in connection.execute("PRAGMA database_list"))
+
+
+def archive_horizon(connection: sqlite3.Connection) -> Optional[str]:
+    row = connection.execute("SELECT value FROM archive.archive_meta WHERE key = 'horizon'").fetchone()
+    return None if row is None else str(row["value"])
+
+
+_BATCH_IDS = "SELECT id_appointment FROM temp.archive_batch"
+_BATCH_PAYMENT_IDS = f"SELECT id_payment FROM main.payments WHERE id_appointment IN ({_BATCH_IDS})"
+_MOVE_BATCH_STATEMENTS = (
+    f"INSERT INTO archive.appointments SELECT * FROM main.appointments WHERE id_appointment IN ({_BATCH_IDS})",
+    f"INSERT INTO archive.appointment_forms SELECT * FROM main.appointment_forms WHERE id_appointment IN ({_BATCH_IDS})",
+    f"INSERT INTO archive.payment_parts SELECT * FROM main.payment_parts WHERE id_payment IN ({_BATCH_PAYMENT_IDS})",
+    f"INSERT INTO archive.payments SELECT * FROM main.payments WHERE id_appointment IN ({_BATCH_IDS})",
+    f"DELETE FROM main.payment_parts WHERE id_payment IN ({_BATCH_PAYMENT_IDS})",
+    f"DELETE FROM main.payments WHERE id_appointment IN ({_BATCH_IDS})",
+    f"DELETE FROM main.appointment_forms WHERE id_appointment IN ({_BATCH_IDS})",
+    f"DELETE FROM main.notification_outbox WHERE id_appointment IN ({_BATCH_IDS})",
+    f"UPDATE main.waitlist SET id_appointment = NULL WHERE id_appointment IN ({_BATCH_IDS})",
+    f"DELETE FROM main.appointments WHERE id_appointment IN ({_BATCH_IDS})",
+)
+_KEEP_SEARCH_STATEMENT = f"""
+    INSERT INTO main.search_index (rowid, body)
+    SELECT id_appointment * 4 + 1, notes FROM archive.appointments
+    WHERE id_appointment IN ({_BATCH_IDS}) AND COALESCE(notes, '') <> ''
+"""
+
+
+def _months_ago(today: date, months: int) -> date:
+    month_index = today.year * 12 + today.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(today.day, 28))
+
+
+def archive_old_records(
+    connection: sqlite3.Connection,
+    months: int = DEFAULT_ARCHIVE_MONTHS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    today: Optional[date] = None,
+) -> int:
+    cutoff = _months_ago(today or date.today(), months).isoformat()
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id_appointment INTEGER PRIMARY KEY)")
+    keep_search = connection.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'search_index'").fetchone()
+
+    total = 0
+    while True:
+        started = time.perf_counter()
+        with connection:
+            connection.execute("DELETE FROM temp.archive_batch")
+            cursor = connection.execute(
+                """
+                INSERT INTO temp.archive_batch (id_appointment)
+                SELECT id_appointment
+                FROM main.appointments
+                WHERE status IN ('Завершён', 'Отменён') AND appointment_date < ?
+                LIMIT ?
+                """,
+                (cutoff, chunk_size),
+            )
+            moved = cursor.rowcount
+            if moved == 0:
+                break
+
+            for statement in _MOVE_BATCH_STATEMENTS:
+                connection.execute(statement)
+            if keep_search is not None:
+                connection.execute(_KEEP_SEARCH_STATEMENT)
+        total += moved
+        logger.info("Перенесено в архив записей: %d (%.3f с)", moved, time.perf_counter() - started)
+
+    with connection:
+        connection.execute(
+            """
+            INSERT INTO archive.archive_meta (key, value) VALUES ('horizon', ?)
+            ON CONFLICT(key) DO UPDATE SET value = max(value, excluded.value)
+            """,
+            (cutoff,),
+        )
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Перенос старых записей в архивную БД")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--months", type=int, default=DEFAULT_ARCHIVE_MONTHS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    connection = get_connection(args.db)
+    try:
+        attach_archive(connection, args.db, create=True)
+        total = archive_old_records(connection, args.months, args.chunk_size)
+        logger.info("Всего перенесено в архив: %d", total)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
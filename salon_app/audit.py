@@ -0,0 +1,71 @@
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Iterable, Mapping, Optional
+
+SYSTEM_USERNAME = "обслуживание"
+MASKED_FIELDS = frozenset({"passport_number"})
+MASK = "***"
+
+
+def diff_fields(old: Optional[Mapping[str, Any]], new: Mapping[str, Any]) -> dict[str, list]:
+    diff = {}
+    for field, value in new.items():
+        before = None if old is None else old[field]
+        if before == value or (before is not None and value is not None and str(before) == str(value)):
+            continue
+        if field in MASKED_FIELDS:
+            diff[field] = [MASK if before else None, MASK if value else None]
+        else:
+            diff[field] = [before, value]
+    return diff
+
+
+class AuditLog:
+    def __init__(self, connection: sqlite3.Connection, username: Optional[str] = None) -> None:
+        self.connection = connection
+        self.id_user: Optional[int] = None
+        self.username = username
+
+    def record(self, entity: str, entity_id: int, action: str, diff: Mapping[str, list]) -> None:
+        self.record_many(entity, action, [(entity_id, diff)])
+
+    def record_many(self, entity: str, action: str, changes: Iterable[tuple[int, Mapping[str, list]]]) -> int:
+        changed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        rows = [
+            (
+                changed_at,
+                self.id_user,
+                self.username,
+                entity,
+                entity_id,
+                action,
+                json.dumps(diff, ensure_ascii=False, separators=(",", ":"), default=str),
+            )
+            for entity_id, diff in changes
+            if diff or action != "update"
+        ]
+        if rows:
+            self.connection.executemany(
+                """
+                INSERT INTO audit_log (changed_at, id_user, username, entity, entity_id, action, diff)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def history(self, entity: str, entity_id: int) -> list[sqlite3.Row]:
+        return self.connection.execute(
+            """
+            SELECT id_audit, changed_at, username, action, diff
+            FROM audit_log
+            WHERE entity = ? AND entity_id = ?
+            ORDER BY id_audit DESC
+            """,
+            (entity, entity_id),
+        ).fetchall()
+
+
+def system_audit(connection: sqlite3.Connection) -> AuditLog:
+    return AuditLog(connection, SYSTEM_USERNAME)
@@ -0,0 +1,242 @@
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from db import DB_PATH, archive_db_path, field_key_path
+
+DEFAULT_BACKUP_DIR = DB_PATH.parent / "backups"
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_SLEEP = 0.05
+DEFAULT_KEEP = 7
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def _snapshot_name(db_path: Path, now: datetime) -> str:
+    return f"{db_path.stem}-{now:%Y%m%d-%H%M%S}.tar.gz"
+
+
+def _members(db_path: Path) -> tuple[Path, Path, Path]:
+    return db_path, archive_db_path(db_path), field_key_path(db_path)
+
+
+def _integrity_ok(db_path: Path) -> bool:
+    connection = sqlite3.connect(str(db_path))
+    try:
+        rows = connection.execute("PRAGMA integrity_check").fetchall()
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        connection.close()
+    return [row[0] for row in rows] == ["ok"]
+
+
+def _rotate(backup_dir: Path, db_path: Path, keep: int) -> None:
+    snapshots = sorted(
+        [*backup_dir.glob(f"{db_path.stem}-*{db_path.suffix}.gz"), *backup_dir.glob(f"{db_path.stem}-*.tar.gz")]
+    )
+    for snapshot in snapshots[:-keep] if keep > 0 else []:
+        snapshot.unlink()
+
+
+def _copy_databases(
+    db_path: Path, target_dir: Path, pages: int, on_step: Callable[[int, int, int], None]
+) -> list[Path]:
+    main_db, archive_db, _field_key = _members(db_path)
+    schemas = [("main", main_db)]
+    source = sqlite3.connect(str(main_db))
+    try:
+        if archive_db.exists():
+            source.execute("ATTACH DATABASE ? AS archive", (str(archive_db),))
+            schemas.append(("archive", archive_db))
+        source.execute("BEGIN")
+        for schema, _path in schemas:
+            source.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()
+
+        copies = []
+        for schema, path in schemas:
+            copy = target_dir / path.name
+            target = sqlite3.connect(str(copy))
+            try:
+                source.backup(target, pages=pages, progress=on_step, name=schema)
+            finally:
+                target.close()
+            copies.append(copy)
+        source.rollback()
+    finally:
+        source.close()
+    return copies
+
+
+def create_snapshot(
+    db_path: Optional[Path] = None,
+    backup_dir: Path = DEFAULT_BACKUP_DIR,
+    pages: int = DEFAULT_PAGES_PER_STEP,
+    step_sleep: float = DEFAULT_STEP_SLEEP,
+    keep: int = DEFAULT_KEEP,
+    progress: Optional[ProgressCallback] = None,
+    include_key: bool = False,
+) -> Path:
+    db_path = db_path or DB_PATH
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    snapshot = backup_dir / _snapshot_name(db_path, datetime.now())
+
+    def on_step(_status: int, remaining: int, total: int) -> None:
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining and step_sleep > 0:
+            time.sleep(step_sleep)
+
+    field_key = field_key_path(db_path)
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        partial = snapshot.with_name(snapshot.name + ".part")
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as raw, tarfile.open(fileobj=raw, mode="w:gz") as bundle:
+            for copy in _copy_databases(db_path, Path(tmp), pages, on_step):
+                bundle.add(copy, arcname=copy.name)
+            if include_key and field_key.exists():
+                bundle.add(field_key, arcname=field_key.name)
+        os.replace(partial, snapshot)
+
+    _rotate(backup_dir, db_path, keep)
+    return snapshot
+
+
+def _unpack(snapshot: Path, target_dir: Path, main_name: str) -> Optional[list[Path]]:
+    try:
+        if not snapshot.name.endswith(".tar.gz"):
+            with gzip.open(snapshot, "rb") as src, (target_dir / main_name).open("wb") as dst:
+                shutil.copyfileobj(src, dst)
+            return [target_dir / main_name]
+        unpacked = []
+        with tarfile.open(snapshot, "r:gz") as bundle:
+            for member in bundle.getmembers():
+                if not member.isfile() or Path(member.name).name != member.name:
+                    continue
+                with bundle.extractfile(member) as src, (target_dir / member.name).open("wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                unpacked.append(target_dir / member.name)
+    except (OSError, EOFError, tarfile.TarError):
+        return None
+    return unpacked
+
+
+def _archive_matches(main_path: Path, archive_path: Path) -> bool:
+    connection = sqlite3.connect(str(main_path))
+    try:
+        connection.execute("ATTACH DATABASE ? AS archive", (str(archive_path),))
+        row = connection.execute(
+            """
+            SELECT 1 FROM main.appointments
+            WHERE id_appointment IN (SELECT id_appointment FROM archive.appointments)
+            LIMIT 1
+            """
+        ).fetchone()
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        connection.close()
+    return row is None
+
+
+def _unpacked_ok(unpacked: Optional[list[Path]], main_name: str) -> bool:
+    if not unpacked or all(path.name != main_name for path in unpacked):
+        return False
+    if not all(_integrity_ok(path) for path in unpacked if path.suffix != ".key"):
+        return False
+    main_path = next(path for path in unpacked if path.name == main_name)
+    archive_path = archive_db_path(main_path)
+    return archive_path not in unpacked or _archive_matches(main_path, archive_path)
+
+
+def verify_snapshot(snapshot: Path, db_path: Optional[Path] = None) -> bool:
+    main_name = db_path.name if db_path else snapshot.name.rsplit("-", 2)[0] + DB_PATH.suffix
+    with tempfile.TemporaryDirectory() as tmp:
+        return _unpacked_ok(_unpack(snapshot, Path(tmp), main_name), main_name)
+
+
+def _restore_database(source_path: Path, target_path: Path) -> None:
+    source = sqlite3.connect(str(source_path))
+    target = sqlite3.connect(str(target_path))
+    try:
+        source.backup(target)
+        target.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        target.close()
+        source.close()
+
+
+def restore_snapshot(snapshot: Path, db_path: Optional[Path] = None) -> bool:
+    db_path = db_path or DB_PATH
+    with tempfile.TemporaryDirectory(dir=db_path.parent) as tmp:
+        unpacked = _unpack(snapshot, Path(tmp), db_path.name)
+        if not _unpacked_ok(unpacked, db_path.name):
+            return False
+        for live_path in _members(db_path):
+            restored = Path(tmp) / live_path.name
+            if restored not in unpacked:
+                continue
+            if live_path.suffix == ".key":
+                os.chmod(restored, 0o600)
+                os.replace(restored, live_path)
+            else:
+                _restore_database(restored, live_path)
+    return True
+
+
+def _print_progress(done: int, total: int) -> None:
+    print(f"\rСтраниц скопировано: {done}/{total}", end="", flush=True)
+    if done == total:
+        print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Резервное копирование БД салона")
+    parser.add_argument("--db", type=Path, default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup")
+    backup_parser.add_argument("--dir", type=Path, default=DEFAULT_BACKUP_DIR)
+    backup_parser.add_argument("--pages", type=int, default=DEFAULT_PAGES_PER_STEP)
+    backup_parser.add_argument("--sleep", type=float, default=DEFAULT_STEP_SLEEP)
+    backup_parser.add_argument("--keep", type=int, default=DEFAULT_KEEP)
+    backup_parser.add_argument(
+        "--include-key",
+        action="store_true",
+        help="положить ключ шифрования паспортных данных в снимок (снимок тогда позволяет их расшифровать)",
+    )
+
+    verify_parser = commands.add_parser("verify")
+    verify_parser.add_argument("snapshot", type=Path)
+
+    restore_parser = commands.add_parser("restore")
+    restore_parser.add_argument("snapshot", type=Path)
+
+    args = parser.parse_args()
+    if args.command == "backup":
+        snapshot = create_snapshot(
+            args.db, args.dir, args.pages, args.sleep, args.keep, _print_progress, args.include_key
+        )
+        print(f"Снимок сохранён: {snapshot}")
+        if not args.include_key:
+            print(f"Ключ шифрования {field_key_path(args.db or DB_PATH)} в снимок не входит: храните его отдельно")
+    elif args.command == "verify":
+        ok = verify_snapshot(args.snapshot, args.db)
+        print("Проверка целостности: ok" if ok else "Проверка целостности не пройдена")
+        raise SystemExit(0 if ok else 1)
+    else:
+        ok = restore_snapshot(args.snapshot, args.db)
+        print("БД восстановлена" if ok else "Снимок повреждён, восстановление отменено")
+        raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+import argparse
+import inspect
+import json
+import random
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from db import copy_database, init_db
+from salon_app.datagen import generate, random_fio
+from salon_app.db_access import Db, ServiceChange
+from salon_app.rescheduling import Reassignment
+from salon_app.waitlist import add_to_waitlist, offer_slot
+
+DEFAULT_SCALES = "10k,100k"
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.25
+UNTIMED_METHODS = frozenset({"close", "set_actor", "snapshot"})
+FIXTURE_DAYS_AHEAD = 1000
+FIXTURE_ATTEMPTS = 50
+
+
+@dataclass
+class BenchContext:
+    rng: random.Random
+    today: date
+    client: dict
+    master: dict
+    service: dict
+    certificate_number: str
+    id_appointment: int = 0
+    id_waitlist: int = 0
+    plan: list[Reassignment] = field(default_factory=list)
+    slot: int = 0
+
+
+Case = Callable[[Db, BenchContext], object]
+Prepare = Callable[[Db, BenchContext], None]
+
+
+def _succeeded(result: object) -> bool:
+    if isinstance(result, tuple):
+        return bool(result[0])
+    return bool(result)
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    name: str
+    run: Case
+    prepare: Optional[Prepare] = None
+    check: Optional[Callable[[object], bool]] = None
+
+
+def _next_slot(ctx: BenchContext) -> tuple[date, str]:
+    ctx.slot += 1
+    return ctx.today + timedelta(days=FIXTURE_DAYS_AHEAD + ctx.slot // 11), f"{9 + ctx.slot % 11:02d}:00:00"
+
+
+def _create_appointment(db: Db, ctx: BenchContext) -> tuple[bool, str, Optional[int]]:
+    day, appointment_time = _next_slot(ctx)
+    return db.create_appointment_with_form(
+        id_client=ctx.client["id_client"],
+        id_master=ctx.master["id_master"],
+        id_service=ctx.service["id_service"],
+        appointment_date=day,
+        appointment_time=appointment_time,
+        passport_number="0000 000000",
+        visit_purpose="",
+        planned_start=day,
+        planned_end=day,
+        id_additional_option=None,
+        additional_notes="",
+    )
+
+
+def _prepare_appointment(db: Db, ctx: BenchContext) -> None:
+    ok, status, id_appointment = _create_appointment(db, ctx)
+    if not ok:
+        raise RuntimeError(f"Не удалось подготовить запись для замера: {status}")
+    ctx.id_appointment = id_appointment
+
+
+def _prepare_reassignment(db: Db, ctx: BenchContext) -> None:
+    for _ in range(FIXTURE_ATTEMPTS):
+        _prepare_appointment(db, ctx)
+        ctx.plan = db.plan_master_reassignment(ctx.master["id_master"])
+        if any(item.to_master is not None for item in ctx.plan):
+            return
+    raise RuntimeError("Не удалось подготовить перенос записей для замера: нет свободного мастера")
+
+
+def _prepare_offer(db: Db, ctx: BenchContext) -> None:
+    day, appointment_time = _next_slot(ctx)
+    add_to_waitlist(db.connection, ctx.client["id_client"], ctx.service["id_service"], day, day)
+    with db.connection:
+        match = offer_slot(
+            db.connection, ctx.service["id_service"], ctx.master["id_master"], day.isoformat(), appointment_time
+        )
+    if match is None or match.booked:
+        raise RuntimeError("Не удалось подготовить предложение из листа ожидания для замера")
+    ctx.id_waitlist = match.id_waitlist
+
+
+def _prepare_waitlist_entry(db: Db, ctx: BenchContext) -> None:
+    ctx.id_waitlist = add_to_waitlist(
+        db.connection, ctx.client["id_client"], ctx.service["id_service"], ctx.today, ctx.today + timedelta(days=14)
+    )
+
+
+CASES: list[BenchCase] = [
+    BenchCase("authenticate", lambda db, ctx: db.authenticate("admin", "admin"), check=_succeeded),
+    BenchCase("list_clients", lambda db, ctx: db.list_clients(), check=_succeeded),
+    BenchCase(
+        "list_client_records", lambda db, ctx: db.list_client_records(order_by="total_spend"), check=_succeeded
+    ),
+    BenchCase("find_clients", lambda db, ctx: db.find_clients("Иванова")),
+    BenchCase("find_clients_by_passport", lambda db, ctx: db.find_clients_by_passport("0000 000000")),
+    BenchCase("search", lambda db, ctx: db.search("стрижка")),
+    BenchCase("get_client_profile", lambda db, ctx: db.get_client_profile(ctx.client["id_client"])),
+    BenchCase("entity_history", lambda db, ctx: db.entity_history("client", ctx.client["id_client"])),
+    BenchCase("list_masters", lambda db, ctx: db.list_masters(), check=_succeeded),
+    BenchCase("list_active_masters", lambda db, ctx: db.list_active_masters(), check=_succeeded),
+    BenchCase("list_services", lambda db, ctx: db.list_services(), check=_succeeded),
+    BenchCase("list_categories", lambda db, ctx: db.list_categories(), check=_succeeded),
+    BenchCase("list_active_services", lambda db, ctx: db.list_active_services(), check=_succeeded),
+    BenchCase("list_additional_options", lambda db, ctx: db.list_additional_options()),
+    BenchCase("price_at", lambda db, ctx: db.price_at(ctx.service["id_service"], ctx.today)),
+    BenchCase("price_list_at", lambda db, ctx: db.price_list_at(ctx.today), check=_succeeded),
+    BenchCase("current_timestamp", lambda db, ctx: db.current_timestamp(), check=_succeeded),
+    BenchCase("list_appointments_all", lambda db, ctx: db.list_appointments(), check=_succeeded),
+    BenchCase("list_appointment_records", lambda db, ctx: db.list_appointment_records(), check=_succeeded),
+    BenchCase("appointment_totals", lambda db, ctx: db.appointment_totals(), check=_succeeded),
+    BenchCase(
+        "list_appointments_week",
+        lambda db, ctx: db.list_appointments(ctx.today - timedelta(days=7), ctx.today + timedelta(days=7)),
+    ),
+    BenchCase(
+        "list_client_appointments",
+        lambda db, ctx: db.list_client_appointments(ctx.client["id_client"]),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "get_client_appointment", lambda db, ctx: db.get_client_appointment(ctx.id_appointment), check=_succeeded
+    ),
+    BenchCase(
+        "list_client_appointment_changes",
+        lambda db, ctx: db.list_client_appointment_changes(ctx.client["id_client"], "1970-01-01 00:00:00"),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "list_client_appointment_ids",
+        lambda db, ctx: db.list_client_appointment_ids(ctx.client["id_client"]),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "is_master_available",
+        lambda db, ctx: db.is_master_available(ctx.master["id_master"], ctx.today, "10:00:00"),
+    ),
+    BenchCase("list_available_masters", lambda db, ctx: db.list_available_masters(ctx.today, "10:00:00")),
+    BenchCase(
+        "list_available_masters_in_period",
+        lambda db, ctx: db.list_available_masters_in_period(ctx.today, ctx.today + timedelta(days=3)),
+    ),
+    BenchCase(
+        "revenue_summary", lambda db, ctx: db.revenue_summary(ctx.today - timedelta(days=30), ctx.today)
+    ),
+    BenchCase("list_payments", lambda db, ctx: db.list_payments(ctx.id_appointment)),
+    BenchCase("get_certificate", lambda db, ctx: db.get_certificate(ctx.certificate_number), check=_succeeded),
+    BenchCase(
+        "plan_master_reassignment",
+        lambda db, ctx: db.plan_master_reassignment(ctx.master["id_master"]),
+        prepare=_prepare_appointment,
+        check=_succeeded,
+    ),
+    BenchCase(
+        "apply_master_reassignment",
+        lambda db, ctx: db.apply_master_reassignment(ctx.plan),
+        prepare=_prepare_reassignment,
+        check=_succeeded,
+    ),
+    BenchCase("forecast_demand", lambda db, ctx: db.forecast_demand()),
+    BenchCase("refresh_client_metrics", lambda db, ctx: db.refresh_client_metrics()),
+    BenchCase("run_maintenance", lambda db, ctx: db.run_maintenance()),
+    BenchCase(
+        "create_client",
+        lambda db, ctx: db.create_client(random_fio(ctx.rng), "1990-01-01", "79000000000", "", ctx.today.isoformat()),
+    ),
+    BenchCase(
+        "update_client",
+        lambda db, ctx: db.update_client(
+            ctx.client["id_client"], ctx.client["fio"], ctx.client["birth_date"], ctx.client["phone"],
+            ctx.client["email"], ctx.client["registration_date"],
+        ),
+    ),
+    BenchCase(
+        "upsert_client_profile",
+        lambda db, ctx: db.upsert_client_profile(
+            id_client=ctx.client["id_client"], passport_number="0000 000000", planned_start="",
+            planned_end="", id_additional_option=None, additional_notes="",
+        ),
+    ),
+    BenchCase(
+        "create_master",
+        lambda db, ctx: db.create_master(random_fio(ctx.rng), ctx.master["specialization"], "", "", ctx.today.isoformat(), 1),
+    ),
+    BenchCase(
+        "update_master",
+        lambda db, ctx: db.update_master(
+            ctx.master["id_master"], ctx.master["fio"], ctx.master["specialization"], ctx.master["phone"],
+            ctx.master["email"], ctx.master["hire_date"], ctx.master["is_active"],
+        ),
+    ),
+    BenchCase(
+        "update_service",
+        lambda db, ctx: db.update_service(
+            ctx.service["id_service"], ctx.service["id_category"], ctx.service["service_name"], "",
+            ctx.service["price"], ctx.service["duration_minutes"], "", ctx.service["is_active"],
+        ),
+    ),
+    BenchCase(
+        "create_service",
+        lambda db, ctx: db.create_service(
+            ctx.service["id_category"], f"Услуга {ctx.rng.randrange(10**9)}", "", 1000.0, 60, "", 1,
+        ),
+    ),
+    BenchCase(
+        "update_services_bulk",
+        lambda db, ctx: db.update_services_bulk(
+            [ServiceChange(ctx.service["id_service"], price=ctx.service["price"])]
+        ),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "reprice_category",
+        lambda db, ctx: db.reprice_category(ctx.service["id_category"], 0.0, ctx.today + timedelta(days=365)),
+    ),
+    BenchCase(
+        "add_to_waitlist",
+        lambda db, ctx: db.add_to_waitlist(
+            ctx.client["id_client"], ctx.service["id_service"], ctx.today, ctx.today + timedelta(days=14),
+        ),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "list_client_waitlist", lambda db, ctx: db.list_client_waitlist(ctx.client["id_client"]), check=_succeeded
+    ),
+    BenchCase(
+        "accept_waitlist_offer",
+        lambda db, ctx: db.accept_waitlist_offer(ctx.id_waitlist),
+        prepare=_prepare_offer,
+        check=_succeeded,
+    ),
+    BenchCase("create_appointment_with_form", _create_appointment, check=_succeeded),
+    BenchCase(
+        "transition_status",
+        lambda db, ctx: db.transition_status(ctx.id_appointment, "Отменён"),
+        prepare=_prepare_appointment,
+        check=_succeeded,
+    ),
+    BenchCase(
+        "transition_status_bulk",
+        lambda db, ctx: db.transition_status_bulk([ctx.id_appointment], "Отменён"),
+        prepare=_prepare_appointment,
+        check=_succeeded,
+    ),
+    BenchCase(
+        "remove_from_waitlist",
+        lambda db, ctx: db.remove_from_waitlist(ctx.id_waitlist, ctx.client["id_client"]),
+        prepare=_prepare_waitlist_entry,
+        check=_succeeded,
+    ),
+    BenchCase(
+        "record_payment",
+        lambda db, ctx: db.record_payment(id_appointment=ctx.id_appointment, amount=100, payment_method="Наличные"),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "redeem_certificate", lambda db, ctx: db.redeem_certificate(ctx.certificate_number, 1), check=_succeeded
+    ),
+    BenchCase(
+        "record_split_payment",
+        lambda db, ctx: db.record_split_payment(id_appointment=ctx.id_appointment, parts={"Наличные": 100}),
+        check=_succeeded,
+    ),
+    BenchCase(
+        "issue_certificate",
+        lambda db, ctx: db.issue_certificate(
+            id_client=ctx.client["id_client"], certificate_number=f"BENCH-{ctx.rng.randrange(10**12)}",
+            nominal_value=1000, issue_date=ctx.today, expiration_date=ctx.today + timedelta(days=365),
+            purchaser_name="", recipient_name="",
+        ),
+        check=_succeeded,
+    ),
+]
+
+
+def uncovered_methods(cases: list[BenchCase] = CASES) -> list[str]:
+    names = {case.name for case in cases}
+    return [
+        name
+        for name, _member in inspect.getmembers(Db, inspect.isfunction)
+        if not name.startswith("_")
+        and name not in UNTIMED_METHODS
+        and not any(case == name or case.startswith(f"{name}_") for case in names)
+    ]
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def _context(db: Db) -> BenchContext:
+    rng = random.Random(0)
+    today = date.today()
+    connection = db.connection
+    certificate_number = f"BENCH-{rng.randrange(10**12)}"
+    db.issue_certificate(
+        id_client=None, certificate_number=certificate_number, nominal_value=10**9, issue_date=today,
+        expiration_date=today + timedelta(days=365), purchaser_name="", recipient_name="",
+    )
+    db.refresh_client_metrics()
+    ctx = BenchContext(
+        rng=rng,
+        today=today,
+        client=dict(connection.execute("SELECT * FROM clients ORDER BY id_client DESC LIMIT 1").fetchone()),
+        master=dict(
+            connection.execute(
+                """
+                SELECT * FROM masters m
+                WHERE m.is_active = 1
+                  AND EXISTS (
+                    SELECT 1 FROM masters o
+                    WHERE o.is_active = 1 AND o.id_master <> m.id_master AND o.specialization IS m.specialization
+                  )
+                ORDER BY m.id_master
+                LIMIT 1
+                """
+            ).fetchone()
+        ),
+        service=dict(connection.execute("SELECT * FROM service_pricelist ORDER BY id_service LIMIT 1").fetchone()),
+        certificate_number=certificate_number,
+    )
+    _prepare_appointment(db, ctx)
+    return ctx
+
+
+def run_scale(db_path: Path, repeat: int, cases: list[BenchCase] = CASES) -> dict[str, dict[str, float]]:
+    db = Db(db_path)
+    try:
+        ctx = _context(db)
+        results = {}
+        for case in cases:
+            timings = []
+            for _ in range(repeat):
+                if case.prepare is not None:
+                    case.prepare(db, ctx)
+                started = time.perf_counter()
+                result = case.run(db, ctx)
+                timings.append(time.perf_counter() - started)
+                if case.check is not None and not case.check(result):
+                    raise RuntimeError(f"Замер {case.name}: вызов не выполнил работу ({result!r})")
+            results[case.name] = {"min": min(timings), "median": statistics.median(timings)}
+        return results
+    finally:
+        db.close()
+
+
+def ensure_database(workdir: Path, clients: int) -> Path:
+    db_path = workdir / f"bench_{clients}.sqlite3"
+    if not db_path.exists():
+        generate(db_path, clients=clients, masters=max(clients // 1000, 20))
+    else:
+        init_db(seed=False, db_path=db_path)
+    return db_path
+
+
+def find_regressions(
+    current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[tuple[str, str, float, float]]:
+    regressions = []
+    for scale, cases in current.items():
+        for name, timing in cases.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous is None or previous["median"] <= 0:
+                continue
+            if timing["median"] > previous["median"] * threshold:
+                regressions.append((scale, name, previous["median"], timing["median"]))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замеры производительности методов Db на синтетических данных")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="число клиентов, например 10k,100k,1m")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--workdir", type=Path, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    uncovered = uncovered_methods()
+    if uncovered:
+        print(f"Методы Db без замера: {', '.join(uncovered)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir: Optional[Path] = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        report = {}
+        for scale in (parse_scale(value) for value in args.scales.split(",")):
+            run_copy = Path(tmp) / f"run_{scale}.sqlite3"
+            copy_database(ensure_database(workdir, scale), run_copy)
+            report[str(scale)] = run_scale(run_copy, args.repeat)
+            run_copy.unlink()
+
+            print(f"\nКлиентов: {scale}")
+            for name, timing in report[str(scale)].items():
+                print(f"  {name:<34} min {timing['min'] * 1000:9.3f} мс   median {timing['median'] * 1000:9.3f} мс")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = find_regressions(report, baseline, args.threshold)
+        for scale, name, before, after in regressions:
+            print(f"Регрессия [{scale}] {name}: {before * 1000:.3f} -> {after * 1000:.3f} мс")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
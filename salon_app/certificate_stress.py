@@ -0,0 +1,98 @@
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from db import init_db
+from salon_app.db_access import Db
+
+
+def _worker(db_path: str, certificate_numbers: list[str], attempts: int, amount: float, seed: int) -> tuple[int, int]:
+    db = Db(Path(db_path))
+    rng = random.Random(seed)
+    succeeded = 0
+    try:
+        for _ in range(attempts):
+            ok, _status, _id = db.record_payment(
+                id_appointment=1,
+                amount=amount,
+                payment_method="Сертификат",
+                certificate_number=rng.choice(certificate_numbers),
+            )
+            if ok:
+                succeeded += 1
+    finally:
+        db.close()
+    return succeeded, attempts
+
+
+def run(processes: int, attempts: int, certificates: int, nominal: float, amount: float) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "stress.sqlite3"
+        init_db(seed=True, db_path=db_path)
+
+        db = Db(db_path)
+        numbers = [f"STRESS{i:05d}" for i in range(certificates)]
+        for number in numbers:
+            db.issue_certificate(
+                id_client=None,
+                certificate_number=number,
+                nominal_value=nominal,
+                issue_date=date.today(),
+                expiration_date=date.today() + timedelta(days=365),
+                purchaser_name="",
+                recipient_name="",
+            )
+
+        context = multiprocessing.get_context("spawn")
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            results = pool.starmap(
+                _worker,
+                [(str(db_path), numbers, attempts, amount, seed) for seed in range(processes)],
+            )
+        elapsed = time.perf_counter() - started
+
+        succeeded = sum(ok for ok, _ in results)
+        total = sum(tried for _, tried in results)
+
+        violations = db.connection.execute(
+            """
+            SELECT g.certificate_number, g.nominal_value, g.remaining_balance, g.status,
+                   COALESCE(SUM(p.amount), 0) AS redeemed
+            FROM gift_certificates g
+            LEFT JOIN payment_parts p ON p.id_certificate = g.id_certificate
+            WHERE g.certificate_number LIKE 'STRESS%'
+            GROUP BY g.id_certificate
+            HAVING g.remaining_balance < 0
+                OR g.nominal_value - g.remaining_balance <> redeemed
+                OR (g.remaining_balance = 0) <> (g.status = 'Использован')
+            """
+        ).fetchall()
+        db.close()
+
+    expected = min(total, certificates * int(nominal // amount))
+    print(f"Попыток: {total}, успешных списаний: {succeeded} (ожидалось {expected})")
+    print(f"Время: {elapsed:.2f} с, списаний в секунду: {succeeded / elapsed:.1f}")
+    for row in violations:
+        print(f"Нарушение баланса: {dict(row)}")
+    return not violations and succeeded == expected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка списаний по сертификатам")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--certificates", type=int, default=10)
+    parser.add_argument("--nominal", type=float, default=1000)
+    parser.add_argument("--amount", type=float, default=50)
+    args = parser.parse_args()
+    ok = run(args.processes, args.attempts, args.certificates, args.nominal, args.amount)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
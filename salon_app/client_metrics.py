@@ -0,0 +1,245 @@
+import argparse
+import logging
+import sqlite3
+import time
+from datetime import date
+from pathlib import Path
+from typing import Iterator, Optional
+
+from db import get_connection
+from salon_app.archive import attach_archive
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS = ("Лояльный", "Новый", "Уходящий", "Потерянный", "Обычный", "Без визитов")
+LAPSE_GAP_FACTOR = 2.0
+DEFAULT_CHUNK_SIZE = 500
+CLIENT_ORDERS = {
+    "id": "c.id_client",
+    "last_visit": "m.last_visit DESC",
+    "visits": "m.visits DESC",
+    "total_spend": "m.total_spend DESC",
+}
+_IN_CHUNK = "id_client > :after AND id_client <= :upto AND id_client IN (SELECT id_client FROM temp.metrics_batch)"
+
+
+def _state(connection: sqlite3.Connection, key: str) -> Optional[str]:
+    row = connection.execute("SELECT value FROM batch_state WHERE key = ?", (key,)).fetchone()
+    return None if row is None else str(row[0])
+
+
+def _set_state(connection: sqlite3.Connection, key: str, value: str) -> None:
+    connection.execute(
+        "INSERT INTO batch_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+def _archived(connection: sqlite3.Connection) -> bool:
+    return any(row[1] == "archive" for row in connection.execute("PRAGMA database_list"))
+
+
+def _mark_touched(connection: sqlite3.Connection, since: Optional[str], last_payment: int) -> int:
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS metrics_batch (id_client INTEGER PRIMARY KEY)")
+    connection.execute("DELETE FROM temp.metrics_batch")
+    if since is None:
+        cursor = connection.execute("INSERT INTO temp.metrics_batch SELECT id_client FROM clients")
+        return cursor.rowcount
+
+    cursor = connection.execute(
+        """
+        INSERT OR IGNORE INTO temp.metrics_batch (id_client)
+        SELECT id_client FROM clients WHERE created_at >= :since
+        UNION
+        SELECT id_client FROM appointments WHERE updated_at >= :since AND id_client IS NOT NULL
+        UNION
+        SELECT a.id_client
+        FROM payments p
+        JOIN appointments a ON a.id_appointment = p.id_appointment
+        WHERE p.id_payment > :last_payment AND a.id_client IS NOT NULL
+        """,
+        {"since": since, "last_payment": last_payment},
+    )
+    return cursor.rowcount
+
+
+def _chunk_bounds(connection: sqlite3.Connection, table_name: str, chunk_size: int) -> Iterator[tuple[int, int]]:
+    after = 0
+    while True:
+        row = connection.execute(
+            f"SELECT MAX(id_client) FROM (SELECT id_client FROM {table_name} WHERE id_client > ? ORDER BY id_client LIMIT ?)",
+            (after, chunk_size),
+        ).fetchone()
+        if row[0] is None:
+            return
+        yield after, int(row[0])
+        after = int(row[0])
+
+
+def _refresh_chunk(connection: sqlite3.Connection, after: int, upto: int) -> None:
+    if _archived(connection):
+        visits_source = f"""
+            SELECT id_client, appointment_date FROM main.appointments WHERE status = 'Завершён' AND {_IN_CHUNK}
+            UNION ALL
+            SELECT id_client, appointment_date FROM archive.appointments WHERE status = 'Завершён' AND {_IN_CHUNK}
+        """
+        spend_source = f"""
+            SELECT a.id_client, p.amount FROM main.appointments a JOIN main.payments p USING (id_appointment)
+            WHERE a.{_IN_CHUNK}
+            UNION ALL
+            SELECT a.id_client, p.amount FROM archive.appointments a JOIN archive.payments p USING (id_appointment)
+            WHERE a.{_IN_CHUNK}
+        """
+    else:
+        visits_source = f"SELECT id_client, appointment_date FROM appointments WHERE status = 'Завершён' AND {_IN_CHUNK}"
+        spend_source = f"""
+            SELECT a.id_client, p.amount FROM appointments a JOIN payments p USING (id_appointment)
+            WHERE a.{_IN_CHUNK}
+        """
+
+    params = {"after": after, "upto": upto}
+    connection.execute(
+        f"""
+        INSERT OR REPLACE INTO client_metrics (
+            id_client, first_visit, last_visit, visits, avg_gap_days, total_spend, segment, computed_at
+        )
+        WITH visits AS (
+            SELECT v.id_client, v.appointment_date,
+                   julianday(v.appointment_date)
+                   - julianday(LAG(v.appointment_date) OVER (PARTITION BY v.id_client ORDER BY v.appointment_date)) AS gap
+            FROM ({visits_source}) v
+        ),
+        visit_stats AS (
+            SELECT id_client, MIN(appointment_date) AS first_visit, MAX(appointment_date) AS last_visit,
+                   COUNT(*) AS visits, AVG(gap) AS avg_gap_days
+            FROM visits
+            GROUP BY id_client
+        ),
+        spend AS (
+            SELECT s.id_client, SUM(s.amount) AS total_spend
+            FROM ({spend_source}) s
+            GROUP BY s.id_client
+        )
+        SELECT b.id_client, v.first_visit, v.last_visit, COALESCE(v.visits, 0), v.avg_gap_days,
+               COALESCE(sp.total_spend, 0),
+               CASE WHEN v.visits IS NULL THEN 'Без визитов' ELSE 'Обычный' END,
+               CURRENT_TIMESTAMP
+        FROM temp.metrics_batch b
+        JOIN clients c ON c.id_client = b.id_client
+        LEFT JOIN visit_stats v ON v.id_client = b.id_client
+        LEFT JOIN spend sp ON sp.id_client = b.id_client
+        WHERE b.id_client > :after AND b.id_client <= :upto
+        """,
+        params,
+    )
+    connection.execute(
+        f"DELETE FROM client_metrics WHERE {_IN_CHUNK} AND id_client NOT IN (SELECT id_client FROM clients)",
+        params,
+    )
+
+
+def _score(connection: sqlite3.Connection, today: date) -> None:
+    connection.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS metrics_scores (
+            id_client INTEGER PRIMARY KEY, r_score INTEGER, f_score INTEGER, m_score INTEGER, segment TEXT
+        )
+        """
+    )
+    connection.execute("DELETE FROM temp.metrics_scores")
+    connection.execute(
+        """
+        INSERT INTO temp.metrics_scores (id_client, r_score, f_score, m_score, segment)
+        SELECT m.id_client, s.r_score, s.f_score, s.m_score,
+               CASE
+                   WHEN m.visits = 0 THEN 'Без визитов'
+                   WHEN s.r_score = 1 THEN 'Потерянный'
+                   WHEN m.avg_gap_days IS NOT NULL
+                        AND julianday(:today) - julianday(m.last_visit) > :factor * m.avg_gap_days THEN 'Уходящий'
+                   WHEN s.r_score <= 2 AND s.f_score >= 3 THEN 'Уходящий'
+                   WHEN m.visits = 1 AND s.r_score >= 4 THEN 'Новый'
+                   WHEN s.r_score >= 4 AND s.f_score >= 4 THEN 'Лояльный'
+                   ELSE 'Обычный'
+               END
+        FROM main.client_metrics m
+        LEFT JOIN (
+            SELECT id_client,
+                   NTILE(5) OVER (ORDER BY last_visit) AS r_score,
+                   NTILE(5) OVER (ORDER BY visits) AS f_score,
+                   NTILE(5) OVER (ORDER BY total_spend) AS m_score
+            FROM main.client_metrics
+            WHERE visits > 0
+        ) AS s ON s.id_client = m.id_client
+        """,
+        {"today": today.isoformat(), "factor": LAPSE_GAP_FACTOR},
+    )
+
+
+def _apply_scores(connection: sqlite3.Connection, after: int, upto: int) -> None:
+    connection.execute(
+        """
+        UPDATE client_metrics AS m
+        SET r_score = s.r_score, f_score = s.f_score, m_score = s.m_score, segment = s.segment
+        FROM temp.metrics_scores AS s
+        WHERE m.id_client = s.id_client
+          AND s.id_client > :after AND s.id_client <= :upto
+          AND (m.r_score IS NOT s.r_score OR m.f_score IS NOT s.f_score OR m.m_score IS NOT s.m_score
+               OR m.segment IS NOT s.segment)
+        """,
+        {"after": after, "upto": upto},
+    )
+
+
+def refresh_client_metrics(
+    connection: sqlite3.Connection,
+    today: Optional[date] = None,
+    full: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    today = today or date.today()
+    with connection:
+        started_at = str(connection.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0])
+        since = None if full else _state(connection, "client_metrics.refreshed_at")
+        last_payment = int(_state(connection, "client_metrics.last_payment") or 0)
+        scored_on = _state(connection, "client_metrics.scored_on")
+        max_payment = connection.execute("SELECT COALESCE(MAX(id_payment), 0) FROM payments").fetchone()[0]
+        touched = _mark_touched(connection, since, last_payment)
+
+    for after, upto in _chunk_bounds(connection, "temp.metrics_batch", chunk_size):
+        with connection:
+            _refresh_chunk(connection, after, upto)
+
+    if touched or since is None or scored_on != today.isoformat():
+        with connection:
+            _score(connection, today)
+        for after, upto in _chunk_bounds(connection, "temp.metrics_scores", chunk_size):
+            with connection:
+                _apply_scores(connection, after, upto)
+
+    with connection:
+        _set_state(connection, "client_metrics.refreshed_at", started_at)
+        _set_state(connection, "client_metrics.last_payment", str(max(int(max_payment), last_payment)))
+        _set_state(connection, "client_metrics.scored_on", today.isoformat())
+    return touched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пересчёт RFM-метрик клиентов")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--full", action="store_true", help="пересчитать всех клиентов, а не только изменённых")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    connection = get_connection(args.db)
+    try:
+        attach_archive(connection, args.db)
+        started = time.perf_counter()
+        touched = refresh_client_metrics(connection, full=args.full, chunk_size=args.chunk_size)
+        logger.info("Пересчитано клиентов: %d (%.3f с)", touched, time.perf_counter() - started)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from db import copy_database, init_db
+from salon_app.benchmark import ensure_database, parse_scale
+from salon_app.db_access import Db
+from salon_app.field_crypto import clear_key_cache, load_cipher
+
+DEFAULT_CLIENTS = "10k"
+DEFAULT_BOOKINGS = 400
+DEFAULT_BUDGET_US = 250.0
+SAMPLE_PASSPORT = "4510 123456"
+
+
+def _book(db: Db, id_client: int, id_master: int, id_service: int, day: date, hour: int, passport: str) -> float:
+    started = time.perf_counter()
+    ok, status, _id_appointment = db.create_appointment_with_form(
+        id_client=id_client,
+        id_master=id_master,
+        id_service=id_service,
+        appointment_date=day,
+        appointment_time=f"{hour:02d}:00:00",
+        passport_number=passport,
+        visit_purpose="",
+        planned_start=day,
+        planned_end=day,
+        id_additional_option=None,
+        additional_notes="",
+    )
+    elapsed = time.perf_counter() - started
+    if not ok:
+        raise RuntimeError(status)
+    return elapsed
+
+
+def measure(db: Db, bookings: int) -> dict[str, float]:
+    connection = db.connection
+    id_client = int(connection.execute("SELECT MAX(id_client) FROM clients").fetchone()[0])
+    masters = [int(row[0]) for row in connection.execute(
+        "SELECT id_master FROM masters WHERE is_active = 1 ORDER BY id_master DESC LIMIT 2"
+    )]
+    id_service = int(connection.execute("SELECT MIN(id_service) FROM service_pricelist").fetchone()[0])
+    start_day = date.today() + timedelta(days=3650)
+
+    clear_key_cache()
+    started = time.perf_counter()
+    cipher = load_cipher(connection)
+    derive_cold = time.perf_counter() - started
+    started = time.perf_counter()
+    load_cipher(connection)
+    derive_cached = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(bookings):
+        cipher.blind_index(cipher.decrypt(cipher.encrypt(SAMPLE_PASSPORT)))
+    field_ops = (time.perf_counter() - started) / bookings
+
+    plain = []
+    encrypted = []
+    for i in range(bookings):
+        day = start_day + timedelta(days=i // 10)
+        hour = 9 + i % 10
+        plain.append(_book(db, id_client, masters[0], id_service, day, hour, ""))
+        encrypted.append(_book(db, id_client, masters[1], id_service, day, hour, SAMPLE_PASSPORT))
+
+    found = db.find_clients_by_passport(SAMPLE_PASSPORT)
+    plan = " ".join(
+        str(row[3]) for row in connection.execute(
+            "EXPLAIN QUERY PLAN SELECT id_client FROM client_profiles WHERE passport_bidx = ?",
+            (cipher.blind_index(SAMPLE_PASSPORT),),
+        )
+    )
+    return {
+        "derive_cold": derive_cold,
+        "derive_cached": derive_cached,
+        "field_ops": field_ops,
+        "plain": statistics.median(plain),
+        "encrypted": statistics.median(encrypted),
+        "overhead": statistics.median(encrypted) - statistics.median(plain),
+        "lookup_hits": float(len(found)),
+        "lookup_indexed": float("idx_client_profiles_passport_bidx" in plan),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Накладные расходы шифрования паспортных данных при создании записи")
+    parser.add_argument("--clients", default=DEFAULT_CLIENTS)
+    parser.add_argument("--bookings", type=int, default=DEFAULT_BOOKINGS)
+    parser.add_argument("--budget-us", type=float, default=DEFAULT_BUDGET_US, help="допустимая надбавка на запись, мкс")
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        run_copy = Path(tmp) / "crypto.sqlite3"
+        copy_database(ensure_database(workdir, parse_scale(args.clients)), run_copy)
+        init_db(seed=False, db_path=run_copy)
+        db = Db(run_copy)
+        try:
+            report = measure(db, args.bookings)
+        finally:
+            db.close()
+
+    print(f"Вывод ключа (первый раз):     {report['derive_cold'] * 1000:9.1f} мс")
+    print(f"Вывод ключа (из кэша):        {report['derive_cached'] * 1e6:9.1f} мкс")
+    print(f"Шифрование + индекс + чтение: {report['field_ops'] * 1e6:9.1f} мкс")
+    print(f"Запись без паспорта (медиана): {report['plain'] * 1e6:8.1f} мкс")
+    print(f"Запись с паспортом (медиана):  {report['encrypted'] * 1e6:8.1f} мкс")
+    print(f"Надбавка на запись:           {report['overhead'] * 1e6:9.1f} мкс (бюджет {args.budget_us:.0f} мкс)")
+    print(
+        f"Поиск по паспорту: найдено {report['lookup_hits']:.0f}, "
+        f"{'по индексу' if report['lookup_indexed'] else 'ПОЛНЫЙ ПРОСМОТР'}"
+    )
+
+    if report["overhead"] * 1e6 > args.budget_us or not report["lookup_indexed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
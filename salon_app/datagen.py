@@ -0,0 +1,248 @@
+import argparse
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from db import get_connection, init_db
+
+BATCH_SIZE = 10_000
+
+MALE_SURNAMES = (
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Фёдоров",
+    "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев",
+)
+MALE_NAMES = ("Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья", "Кирилл", "Михаил")
+FEMALE_NAMES = ("Анна", "Мария", "Елена", "Ольга", "Наталья", "Татьяна", "Ирина", "Екатерина", "Светлана", "Юлия")
+PATRONYMIC_ROOTS = ("Александров", "Дмитриев", "Сергеев", "Андреев", "Алексеев", "Иванов", "Петров", "Михайлов")
+SPECIALIZATIONS = ("Парикмахер", "Визажист", "Маникюр", "Косметолог", "Массажист")
+WEEKDAYS = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье")
+SERVICES_PER_CATEGORY = 10
+PAST_STATUSES = ("Завершён",) * 17 + ("Отменён", "Не явился")
+NOTE_PHRASES = (
+    "аллергия на краситель", "просит мастера-женщину", "опаздывает, позвонить заранее", "чувствительная кожа",
+    "принести свои материалы", "подарочный сертификат", "повторная коррекция", "постоянный клиент",
+    "светлое окрашивание", "короткая стрижка", "гель-лак нюд", "массаж шейно-воротниковой зоны",
+)
+NOTES_SHARE = 0.3
+
+
+def random_fio(rng: random.Random) -> str:
+    surname = rng.choice(MALE_SURNAMES)
+    patronymic_root = rng.choice(PATRONYMIC_ROOTS)
+    if rng.random() < 0.7:
+        return f"{surname}а {rng.choice(FEMALE_NAMES)} {patronymic_root}на"
+    return f"{surname} {rng.choice(MALE_NAMES)} {patronymic_root}ич"
+
+
+def _batched(rows: Iterable[tuple], size: int = BATCH_SIZE) -> Iterator[list[tuple]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _insert(connection: sqlite3.Connection, sql: str, rows: Iterable[tuple]) -> int:
+    total = 0
+    for batch in _batched(rows):
+        connection.executemany(sql, batch)
+        total += len(batch)
+    connection.commit()
+    return total
+
+
+def _max_id(connection: sqlite3.Connection, table_name: str, column_name: str) -> int:
+    return int(connection.execute(f"SELECT COALESCE(MAX({column_name}), 0) FROM {table_name}").fetchone()[0])
+
+
+def generate(
+    db_path: Path,
+    *,
+    clients: int = 10_000,
+    masters: int = 100,
+    years: int = 2,
+    visits_per_client: float = 3.0,
+    seed: int = 0,
+    today: Optional[date] = None,
+) -> dict[str, int]:
+    rng = random.Random(seed)
+    notes_rng = random.Random(seed + 1)
+    today = today or date.today()
+    start_day = today - timedelta(days=365 * years)
+    horizon_days = 365 * years + 60
+
+    init_db(seed=True, db_path=db_path)
+    connection = get_connection(db_path)
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("PRAGMA journal_mode = MEMORY")
+    counts = {}
+    try:
+        category_ids = [int(row[0]) for row in connection.execute("SELECT id_category FROM service_categories")]
+        first_service = _max_id(connection, "service_pricelist", "id_service") + 1
+        counts["services"] = _insert(
+            connection,
+            """
+            INSERT INTO service_pricelist (
+                id_category, service_name, description, price, duration_minutes, required_materials, is_active
+            )
+            VALUES (?, ?, ?, ?, ?, ?, 1)
+            """,
+            (
+                (id_category, f"Услуга {id_category}-{n}", f"Описание услуги {id_category}-{n}",
+                 rng.randrange(500, 8000, 100), rng.choice((30, 45, 60, 90, 120)), "")
+                for id_category in category_ids
+                for n in range(1, SERVICES_PER_CATEGORY + 1)
+            ),
+        )
+        services = [
+            (int(row[0]), float(row[1]))
+            for row in connection.execute(
+                "SELECT id_service, price FROM service_pricelist WHERE id_service >= ?", (first_service,)
+            )
+        ]
+
+        first_master = _max_id(connection, "masters", "id_master") + 1
+        counts["masters"] = _insert(
+            connection,
+            "INSERT INTO masters (fio, specialization, phone, email, hire_date, is_active) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (random_fio(rng), rng.choice(SPECIALIZATIONS), f"79{rng.randrange(10**9):09d}",
+                 f"master{first_master + i}@salon.ru", (start_day - timedelta(days=rng.randrange(3650))).isoformat(),
+                 0 if rng.random() < 0.05 else 1)
+                for i in range(masters)
+            ),
+        )
+        master_ids = [
+            int(row[0]) for row in connection.execute("SELECT id_master FROM masters WHERE id_master >= ?", (first_master,))
+        ]
+        counts["master_schedule"] = _insert(
+            connection,
+            """
+            INSERT INTO master_schedule (id_master, weekday, start_time, end_time, slot_duration_minutes)
+            VALUES (?, ?, ?, ?, 60)
+            """,
+            (
+                (id_master, weekday, "09:00:00", "20:00:00")
+                for id_master in master_ids
+                for weekday in rng.sample(WEEKDAYS, 5)
+            ),
+        )
+
+        first_client = _max_id(connection, "clients", "id_client") + 1
+        counts["clients"] = _insert(
+            connection,
+            "INSERT INTO clients (fio, birth_date, phone, email, registration_date) VALUES (?, ?, ?, ?, ?)",
+            (
+                (random_fio(rng), date(rng.randrange(1950, 2006), rng.randrange(1, 13), rng.randrange(1, 29)).isoformat(),
+                 f"79{rng.randrange(10**9):09d}", f"client{first_client + i}@mail.ru",
+                 (start_day + timedelta(days=rng.randrange(365 * years))).isoformat())
+                for i in range(clients)
+            ),
+        )
+        last_client = _max_id(connection, "clients", "id_client")
+        first_client = last_client - clients + 1
+
+        def appointments() -> Iterator[tuple]:
+            for _ in range(int(clients * visits_per_client)):
+                day = start_day + timedelta(days=rng.randrange(horizon_days))
+                id_service, price = rng.choice(services)
+                status = "Запланирован" if day >= today else rng.choice(PAST_STATUSES)
+                yield (
+                    rng.randint(first_client, last_client), rng.choice(master_ids), id_service, day.isoformat(),
+                    f"{rng.randrange(9, 20):02d}:00:00", status, price,
+                    "; ".join(notes_rng.sample(NOTE_PHRASES, 2)) if notes_rng.random() < NOTES_SHARE else "",
+                )
+
+        first_appointment = _max_id(connection, "appointments", "id_appointment") + 1
+        counts["appointments"] = _insert(
+            connection,
+            """
+            INSERT INTO appointments (
+                id_client, id_master, id_service, appointment_date, appointment_time, status, total_price, notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            appointments(),
+        )
+
+        counts["appointment_forms"] = connection.execute(
+            """
+            INSERT INTO appointment_forms (id_appointment, passport_number, visit_purpose, planned_start, planned_end)
+            SELECT id_appointment,
+                   printf('%04d %06d', id_appointment * 7919 % 10000, id_appointment * 104729 % 1000000),
+                   '', appointment_date, appointment_date
+            FROM appointments
+            WHERE id_appointment >= ?
+            """,
+            (first_appointment,),
+        ).rowcount
+        counts["payments"] = connection.execute(
+            """
+            INSERT INTO payments (id_appointment, payment_date, amount, payment_method)
+            SELECT id_appointment, appointment_date, total_price,
+                   CASE id_appointment * 31 % 4 WHEN 0 THEN 'Наличные' WHEN 1 THEN 'Сертификат' ELSE 'Карта' END
+            FROM appointments
+            WHERE id_appointment >= ? AND status = 'Завершён'
+            """,
+            (first_appointment,),
+        ).rowcount
+        connection.commit()
+
+        def certificates() -> Iterator[tuple]:
+            first_certificate = _max_id(connection, "gift_certificates", "id_certificate") + 1
+            for i in range(max(clients // 20, 1)):
+                issued = start_day + timedelta(days=rng.randrange(365 * years))
+                expires = issued + timedelta(days=365)
+                nominal = rng.choice((1000, 2000, 3000, 5000, 10000))
+                remaining = rng.choice((nominal, nominal, nominal // 2, 0))
+                status = "Использован" if remaining == 0 else ("Истёк" if expires < today else "Активирован")
+                yield (
+                    rng.randint(first_client, last_client), f"GEN{first_certificate + i:08d}", nominal, remaining,
+                    issued.isoformat(), expires.isoformat(), random_fio(rng), random_fio(rng), status,
+                )
+
+        counts["gift_certificates"] = _insert(
+            connection,
+            """
+            INSERT INTO gift_certificates (
+                id_client, certificate_number, nominal_value, remaining_balance, issue_date, expiration_date,
+                purchaser_name, recipient_name, status
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            certificates(),
+        )
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Генерация синтетической БД салона")
+    parser.add_argument("db", type=Path)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--masters", type=int, default=100)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--visits-per-client", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(
+        args.db,
+        clients=args.clients,
+        masters=args.masters,
+        years=args.years,
+        visits_per_client=args.visits_per_client,
+        seed=args.seed,
+    )
+    for table_name, count in counts.items():
+        print(f"{table_name}: {count}")
+    print(f"Время: {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
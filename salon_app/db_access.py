@@ -1,8 +1,37 @@
 import sqlite3
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import date
-from typing import Optional
-from db import get_connection
+from pathlib import Path
+from typing import Iterator, Optional
+from db import get_connection, get_read_connection
+from salon_app.archive import archive_attached, archive_horizon, attach_archive
+from salon_app.audit import AuditLog, diff_fields
+from salon_app.client_metrics import CLIENT_ORDERS, refresh_client_metrics
+from salon_app.field_crypto import UNREADABLE, register_field_functions
+from salon_app.forecast import ForecastCell, forecast_demand
+from salon_app.maintenance import run_maintenance
+from salon_app.pricing import price_at, price_list_at, reprice_category
+from salon_app.read_model import view_rows_enabled
+from salon_app.records import AppointmentRecord, ClientRecord, DisplayRows
+from salon_app.rescheduling import Reassignment, apply_reassignment, plan_reassignment
+from salon_app.search import SearchHit, search
+from salon_app.waitlist import (
+    accept_offer,
+    add_to_waitlist,
+    fill_cancelled_slot,
+    list_client_waitlist,
+    remove_from_waitlist,
+)
+
+STATUS_TRANSITIONS = {
+    "Запланирован": ("Клиент пришёл", "Не явился", "Отменён"),
+    "Клиент пришёл": ("Выполняется", "Отменён"),
+    "Выполняется": ("Завершён",),
+    "Завершён": (),
+    "Не явился": (),
+    "Отменён": (),
+}
 
 @dataclass(frozen=True)
 class AuthUser:
@@ -12,13 +41,51 @@ class AuthUser:
     id_client: Optional[int]
 
 
+@dataclass(frozen=True)
+class ServiceChange:
+    id_service: int
+    service_name: Optional[str] = None
+    price: Optional[float] = None
+    duration_minutes: Optional[int] = None
+
+
 class Db:
-    def __init__(self) -> None:
-        self.connection = get_connection()
+    def __init__(self, db_path: Optional[Path] = None, read_only: bool = False) -> None:
+        self.db_path = db_path
+        self.read_only = read_only
+        self.connection = get_read_connection(db_path) if read_only else get_connection(db_path)
+        attach_archive(self.connection, db_path, read_only=read_only)
+        self.view_rows = view_rows_enabled(self.connection)
+        self.audit = AuditLog(self.connection)
+        self.cipher = register_field_functions(self.connection)
 
     def close(self) -> None:
         self.connection.close()
 
+    def set_actor(self, user: Optional[AuthUser]) -> None:
+        self.audit.id_user = None if user is None else user.id_user
+        self.audit.username = None if user is None else user.username
+
+    def entity_history(self, entity: str, entity_id: int) -> list[sqlite3.Row]:
+        return self.audit.history(entity, entity_id)
+
+    def _audit(
+        self, entity: str, entity_id: int, old: Optional[sqlite3.Row], new: dict[str, object]
+    ) -> None:
+        self.audit.record(entity, entity_id, "insert" if old is None else "update", diff_fields(old, new))
+
+    @contextmanager
+    def snapshot(self) -> Iterator["Db"]:
+        self._archive_horizon()
+        self.connection.execute("BEGIN")
+        try:
+            yield self
+        finally:
+            self.connection.rollback()
+
+    def run_maintenance(self) -> dict[str, int]:
+        return run_maintenance(self.connection)
+
     def authenticate(self, username: str, password: str) -> Optional[AuthUser]:
         row = self.connection.execute(
             "SELECT id_user, username, role FROM users WHERE username = ? AND password_hash = ?",
@@ -36,28 +103,95 @@ class Db:
             if mapping is not None:
                 id_client = int(mapping["id_client"])
 
-        return AuthUser(
+        user = AuthUser(
             id_user=int(row["id_user"]),
             username=str(row["username"]),
             role=str(row["role"]),
             id_client=id_client,
         )
+        self.set_actor(user)
+        return user
 
     def list_clients(self) -> list[sqlite3.Row]:
         return self.connection.execute(
             "SELECT id_client, fio, birth_date, phone, email, registration_date FROM clients ORDER BY id_client"
         ).fetchall()
 
+    def list_client_records(self, segment: Optional[str] = None, order_by: str = "id") -> DisplayRows[ClientRecord]:
+        if segment is None and order_by == "id":
+            source = "clients c LEFT JOIN client_metrics m ON m.id_client = c.id_client"
+        else:
+            source = "client_metrics m CROSS JOIN clients c ON c.id_client = m.id_client"
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(
+            f"""
+            SELECT c.id_client, c.fio, c.birth_date, c.phone, c.email, c.registration_date,
+                   m.last_visit, m.visits, m.total_spend, m.segment
+            FROM {source}
+            WHERE :segment IS NULL OR m.segment = :segment
+            ORDER BY {CLIENT_ORDERS[order_by]}
+            """,
+            {"segment": segment},
+        ).fetchall()
+        return DisplayRows(ClientRecord, rows)
+
+    def refresh_client_metrics(self, full: bool = False) -> int:
+        return refresh_client_metrics(self.connection, full=full)
+
+    def forecast_demand(self, weeks: int = 2, specialization: Optional[str] = None) -> list[ForecastCell]:
+        return forecast_demand(self.connection, weeks, specialization)
+
+    def search(self, text: str, limit: int = 50) -> list[SearchHit]:
+        return search(self.connection, text, limit)
+
+    def find_clients(self, text: str) -> list[sqlite3.Row]:
+        pattern = f"%{text}%"
+        return self.connection.execute(
+            """
+            SELECT id_client, fio, birth_date, phone, email, registration_date
+            FROM clients
+            WHERE fio LIKE ? OR phone LIKE ? OR email LIKE ?
+            ORDER BY fio
+            """,
+            (pattern, pattern, pattern),
+        ).fetchall()
+
+    def find_clients_by_passport(self, passport_number: str) -> list[sqlite3.Row]:
+        passport_bidx = self.cipher.blind_index(passport_number)
+        if passport_bidx is None:
+            return []
+        return self.connection.execute(
+            """
+            SELECT c.id_client, c.fio, c.birth_date, c.phone, c.email, c.registration_date
+            FROM client_profiles p
+            JOIN clients c ON c.id_client = p.id_client
+            WHERE p.passport_bidx = ?
+            ORDER BY c.fio
+            """,
+            (passport_bidx,),
+        ).fetchall()
+
     def get_client_profile(self, id_client: int) -> Optional[sqlite3.Row]:
         return self.connection.execute(
             """
-            SELECT id_client, passport_number, planned_start, planned_end, id_additional_option, additional_notes
+            SELECT id_client, field_decrypt(passport_number) AS passport_number, planned_start, planned_end,
+                   id_additional_option, additional_notes
             FROM client_profiles
             WHERE id_client = ?
             """,
             (id_client,),
         ).fetchone()
 
+    def _encrypt_passport(self, id_client: int, passport_number: str) -> tuple[Optional[str], Optional[str]]:
+        if passport_number == UNREADABLE:
+            row = self.connection.execute(
+                "SELECT passport_number, passport_bidx FROM client_profiles WHERE id_client = ?", (id_client,)
+            ).fetchone()
+            if row is not None:
+                return row["passport_number"], row["passport_bidx"]
+        return self.cipher.encrypt(passport_number), self.cipher.blind_index(passport_number)
+
     def upsert_client_profile(
         self,
         *,
@@ -68,12 +202,25 @@ class Db:
         id_additional_option: Optional[int],
         additional_notes: str,
     ) -> None:
+        old = self.connection.execute(
+            """
+            SELECT field_decrypt(passport_number) AS passport_number, planned_start, planned_end,
+                   id_additional_option, additional_notes
+            FROM client_profiles WHERE id_client = ?
+            """,
+            (id_client,),
+        ).fetchone()
+        encrypted_passport, passport_bidx = self._encrypt_passport(id_client, passport_number)
         self.connection.execute(
             """
-            INSERT INTO client_profiles (id_client, passport_number, planned_start, planned_end, id_additional_option, additional_notes)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO client_profiles (
+                id_client, passport_number, passport_bidx, planned_start, planned_end, id_additional_option,
+                additional_notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(id_client) DO UPDATE SET
                 passport_number = excluded.passport_number,
+                passport_bidx = excluded.passport_bidx,
                 planned_start = excluded.planned_start,
                 planned_end = excluded.planned_end,
                 id_additional_option = excluded.id_additional_option,
@@ -81,27 +228,56 @@ class Db:
             """,
             (
                 id_client,
-                passport_number,
+                encrypted_passport,
+                passport_bidx,
                 planned_start,
                 planned_end,
                 id_additional_option,
                 additional_notes,
             ),
         )
+        self._audit(
+            "client_profile",
+            id_client,
+            old,
+            {
+                "passport_number": passport_number,
+                "planned_start": planned_start,
+                "planned_end": planned_end,
+                "id_additional_option": id_additional_option,
+                "additional_notes": additional_notes,
+            },
+        )
         self.connection.commit()
 
     def create_client(self, fio: str, birth_date: str, phone: str, email: str, registration_date: str) -> None:
-        self.connection.execute(
+        cursor = self.connection.execute(
             "INSERT INTO clients (fio, birth_date, phone, email, registration_date) VALUES (?, ?, ?, ?, ?)",
             (fio, birth_date, phone, email, registration_date),
         )
+        self._audit(
+            "client",
+            int(cursor.lastrowid),
+            None,
+            {"fio": fio, "birth_date": birth_date, "phone": phone, "email": email, "registration_date": registration_date},
+        )
         self.connection.commit()
 
     def update_client(self, id_client: int, fio: str, birth_date: str, phone: str, email: str, registration_date: str) -> None:
+        old = self.connection.execute(
+            "SELECT fio, birth_date, phone, email, registration_date FROM clients WHERE id_client = ?", (id_client,)
+        ).fetchone()
         self.connection.execute(
             "UPDATE clients SET fio = ?, birth_date = ?, phone = ?, email = ?, registration_date = ?, updated_at = CURRENT_TIMESTAMP WHERE id_client = ?",
             (fio, birth_date, phone, email, registration_date, id_client),
         )
+        if old is not None:
+            self._audit(
+                "client",
+                id_client,
+                old,
+                {"fio": fio, "birth_date": birth_date, "phone": phone, "email": email, "registration_date": registration_date},
+            )
         self.connection.commit()
 
     def list_masters(self) -> list[sqlite3.Row]:
@@ -112,21 +288,50 @@ class Db:
     def create_master(
         self, fio: str, specialization: str, phone: str, email: str, hire_date: str, is_active: int
     ) -> None:
-        self.connection.execute(
+        cursor = self.connection.execute(
             "INSERT INTO masters (fio, specialization, phone, email, hire_date, is_active) VALUES (?, ?, ?, ?, ?, ?)",
             (fio, specialization, phone, email, hire_date, is_active),
         )
+        self._audit(
+            "master",
+            int(cursor.lastrowid),
+            None,
+            {
+                "fio": fio, "specialization": specialization, "phone": phone, "email": email,
+                "hire_date": hire_date, "is_active": is_active,
+            },
+        )
         self.connection.commit()
 
     def update_master(
         self, id_master: int, fio: str, specialization: str, phone: str, email: str, hire_date: str, is_active: int
     ) -> None:
+        old = self.connection.execute(
+            "SELECT fio, specialization, phone, email, hire_date, is_active FROM masters WHERE id_master = ?",
+            (id_master,),
+        ).fetchone()
         self.connection.execute(
             "UPDATE masters SET fio = ?, specialization = ?, phone = ?, email = ?, hire_date = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id_master = ?",
             (fio, specialization, phone, email, hire_date, is_active, id_master),
         )
+        if old is not None:
+            self._audit(
+                "master",
+                id_master,
+                old,
+                {
+                    "fio": fio, "specialization": specialization, "phone": phone, "email": email,
+                    "hire_date": hire_date, "is_active": is_active,
+                },
+            )
         self.connection.commit()
 
+    def plan_master_reassignment(self, id_master: int, from_date: Optional[date] = None) -> list[Reassignment]:
+        return plan_reassignment(self.connection, id_master, from_date)
+
+    def apply_master_reassignment(self, plan: list[Reassignment]) -> int:
+        return apply_reassignment(self.connection, plan, self.audit)
+
     def list_services(self) -> list[sqlite3.Row]:
         return self.connection.execute(
             """
@@ -162,7 +367,7 @@ class Db:
         required_materials: str,
         is_active: int,
     ) -> None:
-        self.connection.execute(
+        cursor = self.connection.execute(
             """
             INSERT INTO service_pricelist (
                 id_category, service_name, description, price, duration_minutes, required_materials, is_active
@@ -171,6 +376,15 @@ class Db:
             """,
             (id_category, service_name, description, price, duration_minutes, required_materials, is_active),
         )
+        self._audit(
+            "service",
+            int(cursor.lastrowid),
+            None,
+            {
+                "id_category": id_category, "service_name": service_name, "description": description, "price": price,
+                "duration_minutes": duration_minutes, "required_materials": required_materials, "is_active": is_active,
+            },
+        )
         self.connection.commit()
 
     def update_service(
@@ -184,6 +398,13 @@ class Db:
         required_materials: str,
         is_active: int,
     ) -> None:
+        old = self.connection.execute(
+            """
+            SELECT id_category, service_name, description, price, duration_minutes, required_materials, is_active
+            FROM service_pricelist WHERE id_service = ?
+            """,
+            (id_service,),
+        ).fetchone()
         self.connection.execute(
             """
             UPDATE service_pricelist
@@ -193,39 +414,247 @@ class Db:
             """,
             (id_category, service_name, description, price, duration_minutes, required_materials, is_active, id_service),
         )
+        if old is not None:
+            self._audit(
+                "service",
+                id_service,
+                old,
+                {
+                    "id_category": id_category, "service_name": service_name, "description": description,
+                    "price": price, "duration_minutes": duration_minutes, "required_materials": required_materials,
+                    "is_active": is_active,
+                },
+            )
         self.connection.commit()
 
+    def update_services_bulk(self, changes: list[ServiceChange]) -> tuple[bool, str]:
+        if not changes:
+            return True, "Нет изменений"
+        for change in changes:
+            if change.service_name is not None and not change.service_name.strip():
+                return False, f"Услуга {change.id_service}: пустое название"
+            if change.price is not None and change.price < 0:
+                return False, f"Услуга {change.id_service}: отрицательная цена"
+            if change.duration_minutes is not None and change.duration_minutes <= 0:
+                return False, f"Услуга {change.id_service}: некорректная длительность"
+
+        placeholders = ", ".join("?" for _ in changes)
+        old = {
+            int(row["id_service"]): row
+            for row in self.connection.execute(
+                f"""
+                SELECT id_service, service_name, price, duration_minutes
+                FROM service_pricelist WHERE id_service IN ({placeholders})
+                """,
+                [change.id_service for change in changes],
+            )
+        }
+        try:
+            cursor = self.connection.executemany(
+                """
+                UPDATE service_pricelist
+                SET service_name = COALESCE(?, service_name),
+                    price = COALESCE(?, price),
+                    duration_minutes = COALESCE(?, duration_minutes),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id_service = ?
+                """,
+                [
+                    (
+                        change.service_name.strip() if change.service_name is not None else None,
+                        change.price,
+                        change.duration_minutes,
+                        change.id_service,
+                    )
+                    for change in changes
+                ],
+            )
+            if cursor.rowcount != len(changes):
+                self.connection.rollback()
+                return False, "Часть услуг не найдена, изменения отменены"
+            for change in changes:
+                new = {
+                    "service_name": change.service_name.strip() if change.service_name is not None else None,
+                    "price": change.price,
+                    "duration_minutes": change.duration_minutes,
+                }
+                self._audit(
+                    "service",
+                    change.id_service,
+                    old[change.id_service],
+                    {field: value for field, value in new.items() if value is not None},
+                )
+        except sqlite3.Error as error:
+            self.connection.rollback()
+            return False, f"Ошибка сохранения: {error}"
+        self.connection.commit()
+        return True, f"Изменено услуг: {len(changes)}"
+
+    def price_at(self, id_service: int, on_date: date) -> Optional[float]:
+        return price_at(self.connection, id_service, on_date)
+
+    def price_list_at(self, on_date: date) -> list[sqlite3.Row]:
+        return price_list_at(self.connection, on_date)
+
+    def reprice_category(self, id_category: int, percent: float, valid_from: Optional[date] = None) -> int:
+        return reprice_category(self.connection, id_category, percent, valid_from, self.audit)
+
+    def _archive_horizon(self) -> Optional[str]:
+        if not archive_attached(self.connection):
+            if self.connection.in_transaction:
+                return None
+            attach_archive(self.connection, self.db_path, read_only=self.read_only)
+            if not archive_attached(self.connection):
+                return None
+        return archive_horizon(self.connection)
+
+    def _needs_archive(self, date_from: Optional[date]) -> bool:
+        horizon = self._archive_horizon()
+        if horizon is None:
+            return False
+        return date_from is None or date_from.isoformat() < horizon
+
+    def _date_bounds(self, date_from: Optional[date], date_to: Optional[date]) -> tuple[str, dict]:
+        conditions, params = [], {}
+        if date_from is not None:
+            conditions.append("appointment_date >= :date_from")
+            params["date_from"] = date_from.isoformat()
+        if date_to is not None:
+            conditions.append("appointment_date <= :date_to")
+            params["date_to"] = date_to.isoformat()
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def _appointments_source(self, date_from: Optional[date], date_to: Optional[date]) -> tuple[str, dict]:
+        where, params = self._date_bounds(date_from, date_to)
+        if self._needs_archive(date_from):
+            return (
+                f"""
+                (
+                    SELECT id_appointment, id_client, id_master, id_service, appointment_date, appointment_time,
+                           status, total_price
+                    FROM main.appointments
+                    {where}
+                    UNION ALL
+                    SELECT id_appointment, id_client, id_master, id_service, appointment_date, appointment_time,
+                           status, total_price
+                    FROM archive.appointments
+                    {where}
+                )
+                """,
+                params,
+            )
+        if not where:
+            return "appointments", params
+        return f"(SELECT * FROM appointments {where})", params
+
+    def _appointments_query(self, date_from: Optional[date], date_to: Optional[date]) -> tuple[str, dict]:
+        if self.view_rows and not self._needs_archive(date_from):
+            where, params = self._date_bounds(date_from, date_to)
+            return (
+                f"""
+                SELECT id_appointment, appointment_date, appointment_time, status,
+                       client_fio, master_fio, service_name, total_price
+                FROM appointment_view_rows
+                {where}
+                ORDER BY appointment_date DESC, appointment_time DESC
+                """,
+                params,
+            )
+
+        source, params = self._appointments_source(date_from, date_to)
+        return (
+            f"""
+            SELECT a.id_appointment, a.appointment_date, a.appointment_time, a.status,
+                   cl.fio AS client_fio, m.fio AS master_fio, s.service_name, a.total_price
+            FROM {source} a
+            LEFT JOIN clients cl ON cl.id_client = a.id_client
+            LEFT JOIN masters m ON m.id_master = a.id_master
+            LEFT JOIN service_pricelist s ON s.id_service = a.id_service
+            ORDER BY a.appointment_date DESC, a.appointment_time DESC
+            """,
+            params,
+        )
+
     def list_appointments(
         self, date_from: Optional[date] = None, date_to: Optional[date] = None
     ) -> list[sqlite3.Row]:
-        if date_from is None or date_to is None:
+        return self.connection.execute(*self._appointments_query(date_from, date_to)).fetchall()
+
+    def list_appointment_records(
+        self, date_from: Optional[date] = None, date_to: Optional[date] = None
+    ) -> DisplayRows[AppointmentRecord]:
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        return DisplayRows(AppointmentRecord, cursor.execute(*self._appointments_query(date_from, date_to)).fetchall())
+
+    def appointment_totals(self, date_from: Optional[date] = None, date_to: Optional[date] = None) -> sqlite3.Row:
+        source, params = self._appointments_source(date_from, date_to)
+        return self.connection.execute(
+            f"""
+            SELECT COUNT(*) AS appointments_count, COALESCE(SUM(a.total_price), 0) AS total_amount
+            FROM {source} a
+            """,
+            params,
+        ).fetchone()
+
+    def revenue_summary(self, date_from: date, date_to: date) -> sqlite3.Row:
+        return self.connection.execute(
+            """
+            SELECT COUNT(*) AS payments_count, COALESCE(SUM(amount), 0) AS total_amount
+            FROM payments
+            WHERE payment_date BETWEEN ? AND ?
+            """,
+            (date_from.isoformat(), date_to.isoformat()),
+        ).fetchone()
+
+    def list_client_appointments(self, id_client: int, date_from: Optional[date] = None) -> list[sqlite3.Row]:
+        params = {"id_client": id_client, "date_from": date_from.isoformat() if date_from else None}
+        if self._needs_archive(date_from):
             return self.connection.execute(
                 """
                 SELECT a.id_appointment, a.appointment_date, a.appointment_time, a.status,
-                       cl.fio AS client_fio, m.fio AS master_fio, s.service_name, a.total_price
-                FROM appointments a
-                LEFT JOIN clients cl ON cl.id_client = a.id_client
+                       m.fio AS master_fio, s.service_name, a.total_price
+                FROM (
+                    SELECT id_appointment, id_master, id_service, appointment_date, appointment_time, status, total_price
+                    FROM main.appointments
+                    WHERE id_client = :id_client AND (:date_from IS NULL OR appointment_date >= :date_from)
+                    UNION ALL
+                    SELECT id_appointment, id_master, id_service, appointment_date, appointment_time, status, total_price
+                    FROM archive.appointments
+                    WHERE id_client = :id_client AND (:date_from IS NULL OR appointment_date >= :date_from)
+                ) a
                 LEFT JOIN masters m ON m.id_master = a.id_master
                 LEFT JOIN service_pricelist s ON s.id_service = a.id_service
                 ORDER BY a.appointment_date DESC, a.appointment_time DESC
+                """,
+                params,
+            ).fetchall()
+
+        if self.view_rows:
+            return self.connection.execute(
                 """
+                SELECT id_appointment, appointment_date, appointment_time, status, master_fio, service_name, total_price
+                FROM appointment_view_rows
+                WHERE id_client = :id_client AND (:date_from IS NULL OR appointment_date >= :date_from)
+                ORDER BY appointment_date DESC, appointment_time DESC
+                """,
+                params,
             ).fetchall()
 
         return self.connection.execute(
             """
             SELECT a.id_appointment, a.appointment_date, a.appointment_time, a.status,
-                   cl.fio AS client_fio, m.fio AS master_fio, s.service_name, a.total_price
+                   m.fio AS master_fio, s.service_name, a.total_price
             FROM appointments a
-            LEFT JOIN clients cl ON cl.id_client = a.id_client
             LEFT JOIN masters m ON m.id_master = a.id_master
             LEFT JOIN service_pricelist s ON s.id_service = a.id_service
-            WHERE a.appointment_date BETWEEN ? AND ?
+            WHERE a.id_client = :id_client AND (:date_from IS NULL OR a.appointment_date >= :date_from)
             ORDER BY a.appointment_date DESC, a.appointment_time DESC
             """,
-            (date_from.isoformat(), date_to.isoformat()),
+            params,
         ).fetchall()
 
-    def list_client_appointments(self, id_client: int) -> list[sqlite3.Row]:
+    def get_client_appointment(self, id_appointment: int) -> Optional[sqlite3.Row]:
         return self.connection.execute(
             """
             SELECT a.id_appointment, a.appointment_date, a.appointment_time, a.status,
@@ -233,11 +662,47 @@ class Db:
             FROM appointments a
             LEFT JOIN masters m ON m.id_master = a.id_master
             LEFT JOIN service_pricelist s ON s.id_service = a.id_service
-            WHERE a.id_client = ?
-            ORDER BY a.appointment_date DESC, a.appointment_time DESC
+            WHERE a.id_appointment = ?
             """,
-            (id_client,),
+            (id_appointment,),
+        ).fetchone()
+
+    def _client_appointments_source(self) -> str:
+        columns = (
+            "id_appointment, id_client, id_master, id_service, appointment_date, appointment_time, "
+            "status, total_price, updated_at"
+        )
+        if not self._needs_archive(None):
+            return "appointments"
+        return f"""(
+            SELECT {columns} FROM main.appointments WHERE id_client = :id_client
+            UNION ALL
+            SELECT {columns} FROM archive.appointments WHERE id_client = :id_client
+        )"""
+
+    def list_client_appointment_changes(self, id_client: int, since: str) -> list[sqlite3.Row]:
+        return self.connection.execute(
+            f"""
+            SELECT a.id_appointment, a.appointment_date, a.appointment_time, a.status,
+                   m.fio AS master_fio, s.service_name, a.total_price
+            FROM {self._client_appointments_source()} a
+            LEFT JOIN masters m ON m.id_master = a.id_master
+            LEFT JOIN service_pricelist s ON s.id_service = a.id_service
+            WHERE a.id_client = :id_client
+              AND (a.updated_at >= :since OR m.updated_at >= :since OR s.updated_at >= :since)
+            """,
+            {"id_client": id_client, "since": since},
+        ).fetchall()
+
+    def list_client_appointment_ids(self, id_client: int) -> set[int]:
+        rows = self.connection.execute(
+            f"SELECT a.id_appointment FROM {self._client_appointments_source()} a WHERE a.id_client = :id_client",
+            {"id_client": id_client},
         ).fetchall()
+        return {int(row[0]) for row in rows}
+
+    def current_timestamp(self) -> str:
+        return str(self.connection.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0])
 
     def is_master_available(self, id_master: int, appointment_date: date, appointment_time: str) -> bool:
         row = self.connection.execute(
@@ -315,7 +780,12 @@ class Db:
                 id_client, id_master, id_service, appointment_date, appointment_time, status, total_price, notes
             )
             VALUES (?, ?, ?, ?, ?, 'Запланирован',
-                    (SELECT price FROM service_pricelist WHERE id_service = ?),
+                    COALESCE(
+                        (SELECT price FROM service_price_history
+                         WHERE id_service = ? AND valid_from <= ?
+                         ORDER BY valid_from DESC LIMIT 1),
+                        (SELECT price FROM service_pricelist WHERE id_service = ?)
+                    ),
                     ?)
             """,
             (
@@ -325,21 +795,26 @@ class Db:
                 appointment_date.isoformat(),
                 appointment_time,
                 id_service,
+                appointment_date.isoformat(),
+                id_service,
                 additional_notes,
             ),
         )
         id_appointment = int(cursor.lastrowid)
 
+        encrypted_passport, passport_bidx = self._encrypt_passport(id_client, passport_number)
         self.connection.execute(
             """
             INSERT INTO appointment_forms (
-                id_appointment, passport_number, visit_purpose, planned_start, planned_end, id_additional_option
+                id_appointment, passport_number, passport_bidx, visit_purpose, planned_start, planned_end,
+                id_additional_option
             )
-            VALUES (?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 id_appointment,
-                passport_number,
+                encrypted_passport,
+                passport_bidx,
                 visit_purpose,
                 planned_start.isoformat(),
                 planned_end.isoformat(),
@@ -347,12 +822,24 @@ class Db:
             ),
         )
 
+        old_profile = self.connection.execute(
+            """
+            SELECT field_decrypt(passport_number) AS passport_number, planned_start, planned_end,
+                   id_additional_option, additional_notes
+            FROM client_profiles WHERE id_client = ?
+            """,
+            (id_client,),
+        ).fetchone()
         self.connection.execute(
             """
-            INSERT INTO client_profiles (id_client, passport_number, planned_start, planned_end, id_additional_option, additional_notes)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO client_profiles (
+                id_client, passport_number, passport_bidx, planned_start, planned_end, id_additional_option,
+                additional_notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(id_client) DO UPDATE SET
                 passport_number = excluded.passport_number,
+                passport_bidx = excluded.passport_bidx,
                 planned_start = excluded.planned_start,
                 planned_end = excluded.planned_end,
                 id_additional_option = excluded.id_additional_option,
@@ -360,7 +847,8 @@ class Db:
             """,
             (
                 id_client,
-                passport_number,
+                encrypted_passport,
+                passport_bidx,
                 planned_start.isoformat(),
                 planned_end.isoformat(),
                 id_additional_option,
@@ -368,10 +856,308 @@ class Db:
             ),
         )
 
+        self._audit(
+            "appointment",
+            id_appointment,
+            None,
+            {
+                "id_client": id_client, "id_master": id_master, "id_service": id_service,
+                "appointment_date": appointment_date.isoformat(), "appointment_time": appointment_time,
+            },
+        )
+        self._audit(
+            "client_profile",
+            id_client,
+            old_profile,
+            {
+                "passport_number": passport_number,
+                "planned_start": planned_start.isoformat(),
+                "planned_end": planned_end.isoformat(),
+                "id_additional_option": id_additional_option,
+                "additional_notes": additional_notes,
+            },
+        )
         self.connection.commit()
         return True, "Запись создана", id_appointment
 
+    def _status_update_sql(self, new_status: str) -> Optional[str]:
+        sources = [status for status, targets in STATUS_TRANSITIONS.items() if new_status in targets]
+        if not sources:
+            return None
+        placeholders = ", ".join(f"'{status}'" for status in sources)
+        return f"""
+            UPDATE appointments
+            SET status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id_appointment = ? AND status IN ({placeholders})
+            """
+
+    def transition_status(self, id_appointment: int, new_status: str) -> tuple[bool, str]:
+        sql = self._status_update_sql(new_status)
+        if sql is None:
+            return False, "Недопустимый статус"
+
+        old = self.connection.execute(
+            "SELECT status FROM appointments WHERE id_appointment = ?", (id_appointment,)
+        ).fetchone()
+        match = None
+        try:
+            cursor = self.connection.execute(sql, (new_status, id_appointment))
+            if cursor.rowcount == 1:
+                self._audit("appointment", id_appointment, old, {"status": new_status})
+                if new_status == "Отменён":
+                    match = fill_cancelled_slot(self.connection, id_appointment, audit=self.audit)
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        if cursor.rowcount != 1:
+            return False, "Переход статуса недопустим"
+        if match is not None and match.booked:
+            return True, "Статус изменён, слот занят клиентом из листа ожидания"
+        if match is not None:
+            return True, "Статус изменён, слот предложен клиенту из листа ожидания"
+        return True, "Статус изменён"
+
+    def transition_status_bulk(self, ids: list[int], new_status: str) -> int:
+        sql = self._status_update_sql(new_status)
+        if sql is None or not ids:
+            return 0
+
+        placeholders = ", ".join("?" for _ in ids)
+        old = self.connection.execute(
+            f"SELECT id_appointment, status FROM appointments WHERE id_appointment IN ({placeholders})", ids
+        ).fetchall()
+        try:
+            self.connection.executemany(sql, [(new_status, id_appointment) for id_appointment in ids])
+            changed = {
+                int(row[0])
+                for row in self.connection.execute(
+                    f"SELECT id_appointment FROM appointments WHERE id_appointment IN ({placeholders}) AND status = ?",
+                    [*ids, new_status],
+                )
+            }
+            transitioned = [row for row in old if int(row["id_appointment"]) in changed and row["status"] != new_status]
+            for row in transitioned:
+                self._audit("appointment", int(row["id_appointment"]), row, {"status": new_status})
+                if new_status == "Отменён":
+                    fill_cancelled_slot(self.connection, int(row["id_appointment"]), audit=self.audit)
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        return len(transitioned)
+
+    def add_to_waitlist(
+        self,
+        id_client: int,
+        id_service: int,
+        date_from: date,
+        date_to: date,
+        id_master: Optional[int] = None,
+        auto_book: bool = False,
+    ) -> tuple[bool, str]:
+        if date_from > date_to:
+            return False, "Некорректный период"
+        add_to_waitlist(self.connection, id_client, id_service, date_from, date_to, id_master, auto_book, self.audit)
+        return True, "Вы в листе ожидания"
+
+    def list_client_waitlist(self, id_client: int) -> list[sqlite3.Row]:
+        return list_client_waitlist(self.connection, id_client)
+
+    def accept_waitlist_offer(self, id_waitlist: int) -> tuple[bool, str, Optional[int]]:
+        return accept_offer(self.connection, id_waitlist, audit=self.audit)
+
+    def remove_from_waitlist(self, id_waitlist: int, id_client: int) -> bool:
+        return remove_from_waitlist(self.connection, id_waitlist, id_client, self.audit)
+
     def list_additional_options(self) -> list[sqlite3.Row]:
         return self.connection.execute(
             "SELECT id_option, option_name FROM additional_info_options ORDER BY option_name"
-        ).fetchall()
\ No newline at end of file
+        ).fetchall()
+
+    def get_certificate(self, certificate_number: str) -> Optional[sqlite3.Row]:
+        return self.connection.execute(
+            """
+            SELECT id_certificate, id_client, certificate_number, nominal_value, remaining_balance,
+                   issue_date, expiration_date, purchaser_name, recipient_name, status
+            FROM gift_certificates
+            WHERE certificate_number = ?
+            """,
+            (certificate_number,),
+        ).fetchone()
+
+    def issue_certificate(
+        self,
+        *,
+        id_client: Optional[int],
+        certificate_number: str,
+        nominal_value: float,
+        issue_date: date,
+        expiration_date: date,
+        purchaser_name: str,
+        recipient_name: str,
+    ) -> int:
+        cursor = self.connection.execute(
+            """
+            INSERT INTO gift_certificates (
+                id_client, certificate_number, nominal_value, remaining_balance, issue_date, expiration_date,
+                purchaser_name, recipient_name, status
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Активирован')
+            """,
+            (
+                id_client,
+                certificate_number,
+                nominal_value,
+                nominal_value,
+                issue_date.isoformat(),
+                expiration_date.isoformat(),
+                purchaser_name,
+                recipient_name,
+            ),
+        )
+        id_certificate = int(cursor.lastrowid)
+        self._audit(
+            "certificate",
+            id_certificate,
+            None,
+            {
+                "id_client": id_client, "certificate_number": certificate_number, "nominal_value": nominal_value,
+                "issue_date": issue_date.isoformat(), "expiration_date": expiration_date.isoformat(),
+                "purchaser_name": purchaser_name, "recipient_name": recipient_name, "status": "Активирован",
+            },
+        )
+        self.connection.commit()
+        return id_certificate
+
+    def _redeem_certificate(self, certificate_number: str, amount: float) -> Optional[int]:
+        row = self.connection.execute(
+            "SELECT id_certificate, remaining_balance, status FROM gift_certificates WHERE certificate_number = ?",
+            (certificate_number,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        new = self.connection.execute(
+            """
+            UPDATE gift_certificates
+            SET remaining_balance = remaining_balance - ?,
+                status = CASE WHEN remaining_balance - ? <= 0 THEN 'Использован' ELSE status END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id_certificate = ?
+              AND status = 'Активирован'
+              AND remaining_balance >= ?
+              AND (expiration_date IS NULL OR expiration_date >= date('now', 'localtime'))
+            RETURNING remaining_balance, status
+            """,
+            (amount, amount, row["id_certificate"], amount),
+        ).fetchall()
+        if len(new) != 1:
+            return None
+        self._audit(
+            "certificate",
+            int(row["id_certificate"]),
+            row,
+            {"remaining_balance": new[0]["remaining_balance"], "status": new[0]["status"]},
+        )
+        return int(row["id_certificate"])
+
+    def redeem_certificate(self, certificate_number: str, amount: float) -> bool:
+        if amount <= 0:
+            return False
+        try:
+            id_certificate = self._redeem_certificate(certificate_number, amount)
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        return id_certificate is not None
+
+    def record_payment(
+        self,
+        *,
+        id_appointment: int,
+        amount: float,
+        payment_method: str,
+        certificate_number: Optional[str] = None,
+        payment_date: Optional[date] = None,
+    ) -> tuple[bool, str, Optional[int]]:
+        return self._record_payment(
+            id_appointment, payment_method, {payment_method: amount}, certificate_number, payment_date
+        )
+
+    def record_split_payment(
+        self,
+        *,
+        id_appointment: int,
+        parts: dict[str, float],
+        certificate_number: Optional[str] = None,
+        payment_date: Optional[date] = None,
+    ) -> tuple[bool, str, Optional[int]]:
+        return self._record_payment(id_appointment, "Смешанная", parts, certificate_number, payment_date)
+
+    def _record_payment(
+        self,
+        id_appointment: int,
+        payment_method: str,
+        parts: dict[str, float],
+        certificate_number: Optional[str],
+        payment_date: Optional[date],
+    ) -> tuple[bool, str, Optional[int]]:
+        if not parts or any(amount <= 0 for amount in parts.values()):
+            return False, "Некорректная сумма", None
+        if any(method not in ("Наличные", "Карта", "Сертификат") for method in parts):
+            return False, "Некорректный способ оплаты", None
+
+        certificate_amount = parts.get("Сертификат", 0)
+        if certificate_amount and not certificate_number:
+            return False, "Не указан сертификат", None
+
+        try:
+            id_certificate = None
+            if certificate_amount:
+                id_certificate = self._redeem_certificate(certificate_number, certificate_amount)
+                if id_certificate is None:
+                    self.connection.rollback()
+                    return False, "Сертификат недействителен или недостаточно средств", None
+
+            payment = {
+                "id_appointment": id_appointment,
+                "payment_date": (payment_date or date.today()).isoformat(),
+                "amount": sum(parts.values()),
+                "payment_method": payment_method,
+            }
+            cursor = self.connection.execute(
+                """
+                INSERT INTO payments (id_appointment, payment_date, amount, payment_method)
+                VALUES (:id_appointment, :payment_date, :amount, :payment_method)
+                """,
+                payment,
+            )
+            id_payment = int(cursor.lastrowid)
+
+            self.connection.executemany(
+                "INSERT INTO payment_parts (id_payment, payment_method, amount, id_certificate) VALUES (?, ?, ?, ?)",
+                [
+                    (id_payment, method, amount, id_certificate if method == "Сертификат" else None)
+                    for method, amount in parts.items()
+                ],
+            )
+            self._audit("payment", id_payment, None, {**payment, "parts": parts})
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+
+        self.connection.commit()
+        return True, "Оплата проведена", id_payment
+
+    def list_payments(self, id_appointment: int) -> list[sqlite3.Row]:
+        return self.connection.execute(
+            """
+            SELECT id_payment, id_appointment, payment_date, amount, payment_method
+            FROM payments
+            WHERE id_appointment = ?
+            ORDER BY id_payment
+            """,
+            (id_appointment,),
+        ).fetchall()
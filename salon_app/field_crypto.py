@@ -0,0 +1,162 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from db import FIELD_KEY_ENV, field_key_path
+from salon_app.archive import archive_attached
+
+logger = logging.getLogger(__name__)
+
+SALT_STATE_KEY = "field_crypto.salt"
+CHECK_STATE_KEY = "field_crypto.check"
+KDF_ITERATIONS = 600_000
+PREFIX = "enc2:"
+NONCE_BYTES = 12
+BLIND_INDEX_CHARS = 32
+UNREADABLE = "[не удалось расшифровать]"
+DEFAULT_CHUNK_SIZE = 500
+
+_EPHEMERAL_SECRET = secrets.token_bytes(32)
+
+
+class FieldCipher:
+    def __init__(self, master: bytes) -> None:
+        self._aead = AESGCM(hmac.new(master, b"encrypt", hashlib.sha256).digest())
+        self._index_key = hmac.new(master, b"blind-index", hashlib.sha256).digest()
+        self.check = hmac.new(master, b"key-check", hashlib.sha256).hexdigest()[:16]
+
+    def encrypt(self, value: Optional[str]) -> Optional[str]:
+        if not value or value.startswith(PREFIX):
+            return value
+        nonce = secrets.token_bytes(NONCE_BYTES)
+        token = nonce + self._aead.encrypt(nonce, value.encode("utf-8"), PREFIX.encode("ascii"))
+        return PREFIX + base64.urlsafe_b64encode(token).decode("ascii")
+
+    def decrypt(self, value: Optional[str]) -> Optional[str]:
+        if not value or not value.startswith(PREFIX):
+            return value
+        try:
+            raw = base64.urlsafe_b64decode(value[len(PREFIX):])
+            return self._aead.decrypt(raw[:NONCE_BYTES], raw[NONCE_BYTES:], PREFIX.encode("ascii")).decode("utf-8")
+        except (InvalidTag, ValueError, binascii.Error):
+            logger.warning("Не удалось расшифровать паспортные данные: ключ не подходит или значение повреждено")
+            return UNREADABLE
+
+    def blind_index(self, value: Optional[str]) -> Optional[str]:
+        normalized = "".join(ch for ch in (value or "").upper() if ch.isalnum())
+        if not normalized:
+            return None
+        digest = hmac.new(self._index_key, normalized.encode("utf-8"), hashlib.sha256).hexdigest()
+        return digest[:BLIND_INDEX_CHARS]
+
+
+@lru_cache(maxsize=8)
+def _derive(secret: bytes, salt: bytes) -> FieldCipher:
+    return FieldCipher(hashlib.pbkdf2_hmac("sha256", secret, salt, KDF_ITERATIONS))
+
+
+def clear_key_cache() -> None:
+    _derive.cache_clear()
+
+
+def _db_file(connection: sqlite3.Connection) -> Optional[Path]:
+    for row in connection.execute("PRAGMA database_list"):
+        if row[1] == "main" and row[2]:
+            return Path(row[2])
+    return None
+
+
+def _secret(connection: sqlite3.Connection) -> bytes:
+    passphrase = os.environ.get(FIELD_KEY_ENV)
+    if passphrase:
+        return passphrase.encode("utf-8")
+    db_file = _db_file(connection)
+    if db_file is None:
+        return _EPHEMERAL_SECRET
+    path = field_key_path(db_file)
+    if not path.exists():
+        raise RuntimeError(
+            f"Нет ключа шифрования паспортных данных: задайте {FIELD_KEY_ENV} или восстановите {path}"
+        )
+    return path.read_text(encoding="ascii").strip().encode("ascii")
+
+
+def _state(connection: sqlite3.Connection, key: str) -> Optional[str]:
+    row = connection.execute("SELECT value FROM batch_state WHERE key = ?", (key,)).fetchone()
+    return None if row is None else str(row[0])
+
+
+def _init_state(connection: sqlite3.Connection, key: str, value: str) -> str:
+    current = _state(connection, key)
+    if current is None and not connection.execute("PRAGMA query_only").fetchone()[0]:
+        with connection:
+            connection.execute("INSERT OR IGNORE INTO batch_state (key, value) VALUES (?, ?)", (key, value))
+        current = _state(connection, key)
+    return value if current is None else current
+
+
+def load_cipher(connection: sqlite3.Connection) -> FieldCipher:
+    salt = _init_state(connection, SALT_STATE_KEY, secrets.token_hex(16))
+    cipher = _derive(_secret(connection), bytes.fromhex(salt))
+    if _init_state(connection, CHECK_STATE_KEY, cipher.check) != cipher.check:
+        logger.error(
+            "Ключ шифрования паспортных данных не совпадает с ключом, которым они зашифрованы: "
+            "паспорта будут показаны как «%s»",
+            UNREADABLE,
+        )
+    return cipher
+
+
+def register_field_functions(connection: sqlite3.Connection, cipher: Optional[FieldCipher] = None) -> FieldCipher:
+    cipher = cipher or load_cipher(connection)
+    connection.create_function("field_encrypt", 1, cipher.encrypt)
+    connection.create_function("field_decrypt", 1, cipher.decrypt, deterministic=True)
+    connection.create_function("field_blind_index", 1, cipher.blind_index, deterministic=True)
+    return cipher
+
+
+def _encrypted_tables(connection: sqlite3.Connection) -> list[tuple[str, str, str]]:
+    tables = [
+        ("main.client_profiles", "id_client", "idx_client_profiles_passport_plain"),
+        ("main.appointment_forms", "id_appointment", "idx_appointment_forms_passport_plain"),
+    ]
+    if archive_attached(connection):
+        tables.append(("archive.appointment_forms", "id_appointment", "idx_archive_appointment_forms_passport_plain"))
+    return tables
+
+
+def encrypt_plaintext_passports(connection: sqlite3.Connection, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    register_field_functions(connection)
+    total = 0
+    for table_name, key, index_name in _encrypted_tables(connection):
+        while True:
+            with connection:
+                cursor = connection.execute(
+                    f"""
+                    UPDATE {table_name}
+                    SET passport_number = field_encrypt(passport_number),
+                        passport_bidx = field_blind_index(passport_number)
+                    WHERE {key} IN (
+                        SELECT {key} FROM {table_name} INDEXED BY {index_name}
+                        WHERE passport_bidx IS NULL AND passport_number <> ''
+                          AND passport_number NOT LIKE '{PREFIX}%'
+                        LIMIT ?
+                    )
+                    """,
+                    (chunk_size,),
+                )
+            total += cursor.rowcount
+            if cursor.rowcount < chunk_size:
+                break
+    return total
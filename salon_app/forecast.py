@@ -0,0 +1,272 @@
+import argparse
+import logging
+import sqlite3
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from db import get_connection
+from salon_app.archive import attach_archive
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье")
+DEMAND_STATUSES = ("Запланирован", "Клиент пришёл", "Выполняется", "Завершён", "Не явился")
+SEASON_WEEKS = 52
+LEVEL_ALPHA = 0.3
+TREND_BETA = 0.05
+SEASON_GAMMA = 0.1
+SEASON_FLOOR = 0.2
+PROFILE_HALF_LIFE_WEEKS = 8.0
+
+_WEEKDAY = "((CAST(strftime('%w', {d}) AS INTEGER) + 6) % 7)"
+_WEEK_START = "date({d}, '-' || " + _WEEKDAY + " || ' days')"
+_STATUSES = ", ".join(f"'{status}'" for status in DEMAND_STATUSES)
+
+
+@dataclass(frozen=True)
+class ForecastCell:
+    specialization: str
+    week_start: date
+    weekday: int
+    hour: int
+    booked: int
+    expected: float
+    capacity: int
+    load: Optional[float]
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _state(connection: sqlite3.Connection, key: str) -> Optional[str]:
+    row = connection.execute("SELECT value FROM batch_state WHERE key = ?", (key,)).fetchone()
+    return None if row is None else str(row[0])
+
+
+def _archived(connection: sqlite3.Connection) -> bool:
+    return any(row[1] == "archive" for row in connection.execute("PRAGMA database_list"))
+
+
+def _aggregate_source(schema: str) -> str:
+    return f"""
+        SELECT m.specialization, {_WEEK_START.format(d="a.appointment_date")} AS week_start,
+               {_WEEKDAY.format(d="a.appointment_date")} AS weekday,
+               CAST(substr(a.appointment_time, 1, 2) AS INTEGER) AS hour
+        FROM {schema}.appointments a
+        JOIN main.masters m ON m.id_master = a.id_master
+        WHERE a.status IN ({_STATUSES})
+          AND a.appointment_date >= (SELECT MIN(week_start) FROM temp.demand_weeks)
+          AND a.appointment_date < (SELECT date(MAX(week_start), '+7 days') FROM temp.demand_weeks)
+          AND m.specialization IS NOT NULL
+    """
+
+
+def refresh_demand_aggregates(connection: sqlite3.Connection, full: bool = False) -> int:
+    schemas = ("main", "archive") if _archived(connection) else ("main",)
+    source = " UNION ALL ".join(_aggregate_source(schema) for schema in schemas)
+    with connection:
+        started_at = str(connection.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0])
+        since = None if full else _state(connection, "demand.refreshed_at")
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS demand_weeks (week_start DATE PRIMARY KEY)")
+        connection.execute("DELETE FROM temp.demand_weeks")
+        touched_sql = f"SELECT DISTINCT {_WEEK_START.format(d='appointment_date')} FROM {{schema}}.appointments"
+        if since is None:
+            connection.execute(
+                "INSERT OR IGNORE INTO temp.demand_weeks "
+                + " UNION ".join(touched_sql.format(schema=schema) for schema in schemas)
+            )
+        else:
+            connection.execute(
+                f"INSERT OR IGNORE INTO temp.demand_weeks {touched_sql.format(schema='main')} WHERE updated_at >= ?",
+                (since,),
+            )
+        weeks = connection.execute("SELECT COUNT(*) FROM temp.demand_weeks").fetchone()[0]
+        if since is None:
+            connection.execute("DELETE FROM demand_aggregates")
+        elif weeks:
+            connection.execute("DELETE FROM demand_aggregates WHERE week_start IN (SELECT week_start FROM temp.demand_weeks)")
+        if weeks:
+            connection.execute(
+                f"""
+                INSERT INTO demand_aggregates (specialization, week_start, weekday, hour, bookings)
+                SELECT specialization, week_start, weekday, hour, COUNT(*)
+                FROM ({source})
+                WHERE week_start IN (SELECT week_start FROM temp.demand_weeks)
+                GROUP BY specialization, week_start, weekday, hour
+                """
+            )
+        connection.execute(
+            "INSERT INTO batch_state (key, value) VALUES ('demand.refreshed_at', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (started_at,),
+        )
+    return int(weeks)
+
+
+def _trim_start(series: list[float]) -> list[float]:
+    if not series:
+        return series
+    threshold = sorted(series)[len(series) // 2] / 2
+    start = next(i for i, value in enumerate(series) if value >= threshold)
+    return series[start:]
+
+
+def _smooth(series: list[float], horizon: int) -> list[float]:
+    if not series:
+        return [0.0] * horizon
+
+    if len(series) >= 2 * SEASON_WEEKS:
+        first = sum(series[:SEASON_WEEKS]) / SEASON_WEEKS
+        second = sum(series[SEASON_WEEKS:2 * SEASON_WEEKS]) / SEASON_WEEKS
+        season = [max(SEASON_FLOOR, value / first) if first else 1.0 for value in series[:SEASON_WEEKS]]
+        level, trend = first, (second - first) / SEASON_WEEKS
+        for t in range(SEASON_WEEKS, len(series)):
+            index = t % SEASON_WEEKS
+            previous = level
+            level = LEVEL_ALPHA * series[t] / season[index] + (1 - LEVEL_ALPHA) * (level + trend)
+            trend = TREND_BETA * (level - previous) + (1 - TREND_BETA) * trend
+            if level > 0:
+                season[index] = max(
+                    SEASON_FLOOR, SEASON_GAMMA * series[t] / level + (1 - SEASON_GAMMA) * season[index]
+                )
+        n = len(series)
+        return [max(0.0, (level + h * trend) * season[(n + h - 1) % SEASON_WEEKS]) for h in range(1, horizon + 1)]
+
+    level, trend = series[0], 0.0
+    for value in series[1:]:
+        previous = level
+        level = LEVEL_ALPHA * value + (1 - LEVEL_ALPHA) * (level + trend)
+        trend = TREND_BETA * (level - previous) + (1 - TREND_BETA) * trend
+    return [max(0.0, level + h * trend) for h in range(1, horizon + 1)]
+
+
+def _capacity(connection: sqlite3.Connection) -> dict[tuple[str, int, int], int]:
+    capacity: dict[tuple[str, int, int], int] = defaultdict(int)
+    rows = connection.execute(
+        """
+        SELECT m.specialization, s.weekday, s.start_time, s.end_time, s.slot_duration_minutes
+        FROM master_schedule s
+        JOIN masters m ON m.id_master = s.id_master
+        WHERE m.is_active = 1 AND m.specialization IS NOT NULL
+        """
+    )
+    for row in rows:
+        if row["weekday"] not in WEEKDAYS:
+            continue
+        weekday = WEEKDAYS.index(row["weekday"])
+        step = timedelta(minutes=int(row["slot_duration_minutes"] or 60))
+        slot = datetime.combine(date.min, datetime.strptime(row["start_time"], "%H:%M:%S").time())
+        end = datetime.combine(date.min, datetime.strptime(row["end_time"], "%H:%M:%S").time())
+        while slot + step <= end:
+            capacity[row["specialization"], weekday, slot.hour] += 1
+            slot += step
+    return capacity
+
+
+def forecast_demand(
+    connection: sqlite3.Connection,
+    weeks: int = 2,
+    specialization: Optional[str] = None,
+    today: Optional[date] = None,
+) -> list[ForecastCell]:
+    current = _week_start(today or date.today())
+    horizon_end = current + timedelta(weeks=weeks)
+    rows = connection.execute(
+        """
+        SELECT specialization, week_start, weekday, hour, bookings
+        FROM demand_aggregates
+        WHERE (:specialization IS NULL OR specialization = :specialization) AND week_start < :horizon_end
+        """,
+        {"specialization": specialization, "horizon_end": horizon_end.isoformat()},
+    )
+
+    totals: dict[str, dict[date, int]] = defaultdict(lambda: defaultdict(int))
+    cells: dict[str, dict[tuple[date, int, int], int]] = defaultdict(dict)
+    for row in rows:
+        week_start = date.fromisoformat(row["week_start"])
+        key = (week_start, int(row["weekday"]), int(row["hour"]))
+        cells[row["specialization"]][key] = int(row["bookings"])
+        if week_start < current:
+            totals[row["specialization"]][week_start] += int(row["bookings"])
+
+    capacity = _capacity(connection)
+    result = []
+    for name in sorted(set(cells) | {key[0] for key in capacity if specialization in (None, key[0])}):
+        history = totals.get(name, {})
+        first = min(history, default=current)
+        series = [float(history.get(first + timedelta(weeks=i), 0)) for i in range((current - first).days // 7)]
+        expected_totals = _smooth(_trim_start(series), weeks)
+
+        profile: dict[tuple[int, int], float] = defaultdict(float)
+        weight_total = 0.0
+        for (week_start, weekday, hour), bookings in cells.get(name, {}).items():
+            if week_start < current:
+                weight = 0.5 ** (((current - week_start).days // 7) / PROFILE_HALF_LIFE_WEEKS)
+                profile[weekday, hour] += weight * bookings
+        for week_start, bookings in history.items():
+            weight_total += 0.5 ** (((current - week_start).days // 7) / PROFILE_HALF_LIFE_WEEKS) * bookings
+
+        slots = {(weekday, hour) for (spec, weekday, hour) in capacity if spec == name} | set(profile)
+        for h in range(weeks):
+            week_start = current + timedelta(weeks=h)
+            for weekday, hour in sorted(slots):
+                share = profile.get((weekday, hour), 0.0) / weight_total if weight_total else 0.0
+                booked = cells.get(name, {}).get((week_start, weekday, hour), 0)
+                expected = max(expected_totals[h] * share, float(booked))
+                cell_capacity = capacity.get((name, weekday, hour), 0)
+                result.append(
+                    ForecastCell(
+                        specialization=name,
+                        week_start=week_start,
+                        weekday=weekday,
+                        hour=hour,
+                        booked=booked,
+                        expected=round(expected, 2),
+                        capacity=cell_capacity,
+                        load=round(expected / cell_capacity, 3) if cell_capacity else None,
+                    )
+                )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Прогноз загрузки мастеров по дням недели, часам и специализациям")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--weeks", type=int, default=2)
+    parser.add_argument("--specialization", default=None)
+    parser.add_argument("--min-load", type=float, default=0.0, help="показывать ячейки с загрузкой не ниже порога")
+    parser.add_argument("--full", action="store_true", help="пересобрать агрегаты целиком")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    connection = get_connection(args.db)
+    try:
+        attach_archive(connection, args.db)
+        started = time.perf_counter()
+        weeks = refresh_demand_aggregates(connection, full=args.full)
+        logger.info("Обновлено недель в агрегатах: %d (%.3f с)", weeks, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        cells = forecast_demand(connection, args.weeks, args.specialization)
+        logger.info("Прогноз: %d ячеек (%.3f с)", len(cells), time.perf_counter() - started)
+    finally:
+        connection.close()
+
+    print(f"{'Неделя':<11} {'День':<12} {'Час':>3} {'Специализация':<14} {'Записано':>8} {'Прогноз':>8} {'Мест':>5} {'Загрузка':>8}")
+    for cell in cells:
+        if args.min_load and (not cell.expected if cell.load is None else cell.load < args.min_load):
+            continue
+        load = "—" if cell.load is None else f"{cell.load:.0%}"
+        print(
+            f"{cell.week_start.isoformat():<11} {WEEKDAYS[cell.weekday]:<12} {cell.hour:>3} {cell.specialization:<14} "
+            f"{cell.booked:>8} {cell.expected:>8.2f} {cell.capacity:>5} {load:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sqlite3
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Optional
+
+from salon_app.db_access import Db
+
+SYNC_OVERLAP = timedelta(seconds=60)
+
+Move = tuple[Optional[int], Optional[int]]
+
+
+def _sort_key(row: sqlite3.Row) -> tuple[str, str, int]:
+    return str(row["appointment_date"] or ""), str(row["appointment_time"] or ""), int(row["id_appointment"])
+
+
+class ClientHistoryCache:
+    def __init__(self, db: Db, id_client: int) -> None:
+        self.db = db
+        self.id_client = id_client
+        self.rows: dict[int, sqlite3.Row] = {}
+        self.synced_at: Optional[str] = None
+        self._keys: list[tuple[str, str, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def ordered(self) -> list[sqlite3.Row]:
+        return [self.rows[key[2]] for key in reversed(self._keys)]
+
+    def warm(self) -> list[sqlite3.Row]:
+        with self.db.snapshot() as view:
+            synced_at = view.current_timestamp()
+            rows = view.list_client_appointments(self.id_client)
+        self.synced_at = synced_at
+        self.rows = {int(row["id_appointment"]): row for row in rows}
+        self._keys = sorted(_sort_key(row) for row in rows)
+        return self.ordered()
+
+    def upsert(self, row: sqlite3.Row) -> Optional[Move]:
+        id_appointment = int(row["id_appointment"])
+        old = self.rows.get(id_appointment)
+        if old is not None and tuple(old) == tuple(row):
+            return None
+
+        old_index = None
+        if old is not None:
+            position = bisect_left(self._keys, _sort_key(old))
+            old_index = len(self._keys) - 1 - position
+            del self._keys[position]
+
+        key = _sort_key(row)
+        position = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self.rows[id_appointment] = row
+        return old_index, len(self._keys) - 1 - position
+
+    def remove(self, id_appointment: int) -> Optional[Move]:
+        old = self.rows.pop(id_appointment, None)
+        if old is None:
+            return None
+        position = bisect_left(self._keys, _sort_key(old))
+        del self._keys[position]
+        return len(self._keys) - position, None
+
+    def add(self, id_appointment: int) -> Optional[Move]:
+        row = self.db.get_client_appointment(id_appointment)
+        if row is None:
+            return None
+        return self.upsert(row)
+
+    def sync(self) -> list[tuple[sqlite3.Row, Move]]:
+        if self.synced_at is None:
+            self.warm()
+            return []
+
+        since = str(datetime.fromisoformat(self.synced_at) - SYNC_OVERLAP)
+        with self.db.snapshot() as view:
+            synced_at = view.current_timestamp()
+            rows = view.list_client_appointment_changes(self.id_client, since)
+            current_ids = view.list_client_appointment_ids(self.id_client)
+        self.synced_at = synced_at
+
+        changes = []
+        for id_appointment in [key[2] for key in self._keys if key[2] not in current_ids]:
+            row = self.rows[id_appointment]
+            changes.append((row, self.remove(id_appointment)))
+        for row in rows:
+            move = self.upsert(row)
+            if move is not None:
+                changes.append((row, move))
+        return changes
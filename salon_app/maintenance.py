@@ -0,0 +1,189 @@
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from db import get_connection
+from salon_app.archive import attach_archive
+from salon_app.audit import AuditLog, system_audit
+from salon_app.client_metrics import refresh_client_metrics
+from salon_app.field_crypto import encrypt_plaintext_passports
+from salon_app.forecast import refresh_demand_aggregates
+from salon_app.pricing import apply_due_prices
+from salon_app.waitlist import expire_waitlist
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_NO_SHOW_GRACE_MINUTES = 60
+DEFAULT_INTERVAL_SECONDS = 15 * 60.0
+
+
+def _update_in_chunks(
+    connection: sqlite3.Connection, sql: str, params: tuple, chunk_size: int, audit: AuditLog, entity: str, diff: dict
+) -> int:
+    total = 0
+    while True:
+        with connection:
+            ids = [int(row[0]) for row in connection.execute(sql, (*params, chunk_size)).fetchall()]
+            audit.record_many(entity, "update", [(entity_id, diff) for entity_id in ids])
+        total += len(ids)
+        if len(ids) < chunk_size:
+            return total
+
+
+def expire_certificates(
+    connection: sqlite3.Connection,
+    now: Optional[datetime] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    audit: Optional[AuditLog] = None,
+) -> int:
+    today = (now or datetime.now()).date().isoformat()
+    return _update_in_chunks(
+        connection,
+        """
+        UPDATE gift_certificates
+        SET status = 'Истёк', updated_at = CURRENT_TIMESTAMP
+        WHERE id_certificate IN (
+            SELECT id_certificate
+            FROM gift_certificates
+            WHERE status = 'Активирован' AND expiration_date < ?
+            LIMIT ?
+        )
+        RETURNING id_certificate
+        """,
+        (today,),
+        chunk_size,
+        audit or system_audit(connection),
+        "certificate",
+        {"status": ["Активирован", "Истёк"]},
+    )
+
+
+def mark_no_shows(
+    connection: sqlite3.Connection,
+    now: Optional[datetime] = None,
+    grace_minutes: int = DEFAULT_NO_SHOW_GRACE_MINUTES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    audit: Optional[AuditLog] = None,
+) -> int:
+    cutoff = (now or datetime.now()) - timedelta(minutes=grace_minutes)
+    cutoff_date = cutoff.date().isoformat()
+    cutoff_time = cutoff.time().replace(microsecond=0).isoformat()
+    return _update_in_chunks(
+        connection,
+        """
+        UPDATE appointments
+        SET status = 'Не явился', updated_at = CURRENT_TIMESTAMP
+        WHERE id_appointment IN (
+            SELECT id_appointment
+            FROM appointments
+            WHERE status = 'Запланирован'
+              AND (appointment_date < ? OR (appointment_date = ? AND appointment_time < ?))
+            LIMIT ?
+        )
+        RETURNING id_appointment
+        """,
+        (cutoff_date, cutoff_date, cutoff_time),
+        chunk_size,
+        audit or system_audit(connection),
+        "appointment",
+        {"status": ["Запланирован", "Не явился"]},
+    )
+
+
+def run_maintenance(
+    connection: sqlite3.Connection,
+    now: Optional[datetime] = None,
+    grace_minutes: int = DEFAULT_NO_SHOW_GRACE_MINUTES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, int]:
+    now = now or datetime.now()
+    result = {}
+
+    started = time.perf_counter()
+    result["expired_certificates"] = expire_certificates(connection, now, chunk_size)
+    logger.info(
+        "Истёкших сертификатов: %d (%.3f с)", result["expired_certificates"], time.perf_counter() - started
+    )
+
+    started = time.perf_counter()
+    result["no_shows"] = mark_no_shows(connection, now, grace_minutes, chunk_size)
+    logger.info("Неявок: %d (%.3f с)", result["no_shows"], time.perf_counter() - started)
+
+    started = time.perf_counter()
+    result["waitlist"] = expire_waitlist(connection, now)
+    logger.info("Истёкших предложений и заявок ожидания: %d (%.3f с)", result["waitlist"], time.perf_counter() - started)
+
+    started = time.perf_counter()
+    result["encrypted_passports"] = encrypt_plaintext_passports(connection, chunk_size)
+    logger.info(
+        "Зашифровано паспортных данных: %d (%.3f с)", result["encrypted_passports"], time.perf_counter() - started
+    )
+
+    started = time.perf_counter()
+    result["due_prices"] = apply_due_prices(connection, now.date())
+    logger.info("Вступивших в силу цен: %d (%.3f с)", result["due_prices"], time.perf_counter() - started)
+
+    started = time.perf_counter()
+    result["client_metrics"] = refresh_client_metrics(connection, now.date(), chunk_size=chunk_size)
+    logger.info("Пересчитано метрик клиентов: %d (%.3f с)", result["client_metrics"], time.perf_counter() - started)
+
+    started = time.perf_counter()
+    result["demand_weeks"] = refresh_demand_aggregates(connection)
+    logger.info("Обновлено недель спроса: %d (%.3f с)", result["demand_weeks"], time.perf_counter() - started)
+
+    return result
+
+
+class MaintenanceWorker:
+    def __init__(self, db_path: Optional[Path] = None, interval: float = DEFAULT_INTERVAL_SECONDS) -> None:
+        self.db_path = db_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="salon-maintenance", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        connection = get_connection(self.db_path)
+        try:
+            attach_archive(connection, self.db_path)
+            while not self._stop.is_set():
+                try:
+                    run_maintenance(connection)
+                except Exception:
+                    logger.exception("Ошибка обслуживания БД %s", self.db_path)
+                self._stop.wait(self.interval)
+        finally:
+            connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обслуживание БД: истечение сертификатов, неявки, шифрование паспортов, цены, метрики клиентов и спрос")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--grace-minutes", type=int, default=DEFAULT_NO_SHOW_GRACE_MINUTES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    connection = get_connection(args.db)
+    try:
+        attach_archive(connection, args.db)
+        run_maintenance(connection, grace_minutes=args.grace_minutes, chunk_size=args.chunk_size)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import argparse
+import json
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Optional, TextIO
+
+from db import DB_PATH, get_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_INTERVAL_SECONDS = 60.0
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+CLAIM_LEASE = timedelta(minutes=5)
+
+SMTP_HOST_ENV = "SALON_SMTP_HOST"
+SMTP_PORT_ENV = "SALON_SMTP_PORT"
+SMTP_USER_ENV = "SALON_SMTP_USER"
+SMTP_PASSWORD_ENV = "SALON_SMTP_PASSWORD"
+SMTP_FROM_ENV = "SALON_SMTP_FROM"
+OUTBOX_FILE_ENV = "SALON_OUTBOX_FILE"
+
+
+@dataclass(frozen=True)
+class Notification:
+    id_notification: int
+    idempotency_key: str
+    kind: str
+    recipient: str
+    subject: str
+    body: str
+
+
+class PermanentSendError(Exception):
+    pass
+
+
+class Sender:
+    def open(self) -> None:
+        pass
+
+    def send(self, notification: Notification) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileSender(Sender):
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file: Optional[TextIO] = None
+        self._sent: set[str] = set()
+
+    def open(self) -> None:
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as existing:
+                self._sent = {json.loads(line)["idempotency_key"] for line in existing if line.strip()}
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def send(self, notification: Notification) -> None:
+        if notification.idempotency_key in self._sent:
+            return
+        self._file.write(json.dumps(
+            {
+                "idempotency_key": notification.idempotency_key,
+                "to": notification.recipient,
+                "subject": notification.subject,
+                "body": notification.body,
+            },
+            ensure_ascii=False,
+        ) + "\n")
+        self._file.flush()
+        self._sent.add(notification.idempotency_key)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SmtpSender(Sender):
+    def __init__(
+        self, host: str, port: int, sender: str, user: Optional[str] = None, password: Optional[str] = None
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.user = user
+        self.password = password
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def open(self) -> None:
+        self._smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self._smtp.has_extn("starttls"):
+            self._smtp.starttls()
+        if self.user:
+            self._smtp.login(self.user, self.password or "")
+
+    def send(self, notification: Notification) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = notification.recipient
+        message["Subject"] = notification.subject
+        message["Message-ID"] = f"<{notification.idempotency_key}@{self.host}>"
+        message["X-Idempotency-Key"] = notification.idempotency_key
+        message.set_content(notification.body)
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as exc:
+            raise PermanentSendError(str(exc)) from exc
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+
+def sender_from_env(db_path: Optional[Path] = None) -> Sender:
+    host = os.environ.get(SMTP_HOST_ENV)
+    if host:
+        return SmtpSender(
+            host,
+            int(os.environ.get(SMTP_PORT_ENV, "25")),
+            os.environ.get(SMTP_FROM_ENV, f"salon@{host}"),
+            os.environ.get(SMTP_USER_ENV),
+            os.environ.get(SMTP_PASSWORD_ENV),
+        )
+    path = os.environ.get(OUTBOX_FILE_ENV)
+    if path:
+        return FileSender(Path(path))
+    db_path = db_path or DB_PATH
+    return FileSender(db_path.with_name(f"{db_path.stem}_outbox.jsonl"))
+
+
+def _render(row: sqlite3.Row) -> tuple[str, str]:
+    when = f"{row['appointment_date']} в {str(row['appointment_time'])[:5]}"
+    greeting = f"Здравствуйте, {row['client_fio'] or 'клиент'}!"
+    service = row["service_name"] or "услугу"
+    if row["kind"] == "Отмена":
+        return "Запись отменена", f"{greeting}\n\nВаша запись на «{service}» {when} отменена."
+    details = f"«{service}», мастер {row['master_fio'] or '—'}, {when}."
+    if row["kind"] == "Предложение":
+        return "Освободилось время для записи", (
+            f"{greeting}\n\nОсвободилось время: {details}\n"
+            f"Подтвердите запись в личном кабинете до {str(row['offer_expires_at'])[:16]}."
+        )
+    if row["kind"] == "Изменение":
+        return "Запись изменена", f"{greeting}\n\nВаша запись изменена: {details}"
+    return f"Напоминание о записи {when}", f"{greeting}\n\nНапоминаем о записи: {details}"
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.replace(microsecond=0).isoformat(sep=" ")
+
+
+def _claim(
+    connection: sqlite3.Connection, now: datetime, batch_size: int
+) -> tuple[list[tuple[Notification, int]], list[int]]:
+    with connection:
+        claimed = connection.execute(
+            """
+            UPDATE notification_outbox
+            SET due_at = :lease_until, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id_notification IN (
+                SELECT id_notification FROM notification_outbox
+                WHERE status = 'Ожидает' AND due_at <= :now
+                ORDER BY due_at
+                LIMIT :limit
+            )
+            RETURNING id_notification
+            """,
+            {"now": _timestamp(now), "lease_until": _timestamp(now + CLAIM_LEASE), "limit": batch_size},
+        ).fetchall()
+    if not claimed:
+        return [], []
+
+    placeholders = ", ".join("?" for _ in claimed)
+    rows = connection.execute(
+        f"""
+        SELECT o.id_notification, o.idempotency_key, o.kind, o.attempts,
+               COALESCE(w.offer_date, a.appointment_date) AS appointment_date,
+               COALESCE(w.offer_time, a.appointment_time) AS appointment_time,
+               w.status AS offer_status, w.offer_expires_at,
+               c.fio AS client_fio, c.email, m.fio AS master_fio, s.service_name
+        FROM notification_outbox o
+        LEFT JOIN appointments a ON a.id_appointment = o.id_appointment
+        LEFT JOIN waitlist w ON w.id_waitlist = o.id_waitlist
+        LEFT JOIN clients c ON c.id_client = COALESCE(w.id_client, a.id_client)
+        LEFT JOIN masters m ON m.id_master = COALESCE(w.offer_master, a.id_master)
+        LEFT JOIN service_pricelist s ON s.id_service = COALESCE(w.id_service, a.id_service)
+        WHERE o.id_notification IN ({placeholders})
+        ORDER BY o.due_at
+        """,
+        [row[0] for row in claimed],
+    ).fetchall()
+
+    moment = _timestamp(now)
+    batch, expired = [], []
+    for row in rows:
+        starts_at = f"{row['appointment_date']} {row['appointment_time']}"
+        if (
+            row["appointment_date"] is None
+            or (row["kind"] == "Напоминание" and starts_at <= moment)
+            or (row["kind"] == "Предложение" and (row["offer_status"] != "Предложено" or row["offer_expires_at"] <= moment))
+        ):
+            expired.append(int(row["id_notification"]))
+            continue
+        subject, body = _render(row)
+        notification = Notification(
+            id_notification=int(row["id_notification"]),
+            idempotency_key=str(row["idempotency_key"]),
+            kind=str(row["kind"]),
+            recipient=str(row["email"] or ""),
+            subject=subject,
+            body=body,
+        )
+        batch.append((notification, int(row["attempts"])))
+    return batch, expired
+
+
+def _backoff(attempts: int) -> timedelta:
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * (1 + random.random() / 10)
+
+
+def dispatch(
+    connection: sqlite3.Connection,
+    sender: Sender,
+    now: Optional[datetime] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> dict[str, int]:
+    result = {"sent": 0, "retried": 0, "failed": 0, "expired": 0}
+    opened = False
+    try:
+        while True:
+            moment = now or datetime.now()
+            batch, expired = _claim(connection, moment, batch_size)
+            if not batch and not expired:
+                return result
+            if batch and not opened:
+                sender.open()
+                opened = True
+
+            sent, retries, failures = [], [], []
+            for notification, attempts in batch:
+                try:
+                    if not notification.recipient:
+                        raise PermanentSendError("Нет email получателя")
+                    sender.send(notification)
+                    sent.append((_timestamp(datetime.now()), notification.id_notification))
+                except PermanentSendError as exc:
+                    failures.append((str(exc), notification.id_notification))
+                except (OSError, smtplib.SMTPException) as exc:
+                    if attempts >= max_attempts:
+                        failures.append((str(exc), notification.id_notification))
+                    else:
+                        retry_at = _timestamp(moment + _backoff(attempts))
+                        retries.append((retry_at, str(exc), notification.id_notification))
+
+            with connection:
+                connection.executemany(
+                    """
+                    UPDATE notification_outbox
+                    SET status = 'Отправлено', sent_at = ?, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id_notification = ?
+                    """,
+                    sent,
+                )
+                connection.executemany(
+                    """
+                    UPDATE notification_outbox
+                    SET due_at = ?, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id_notification = ?
+                    """,
+                    retries,
+                )
+                connection.executemany(
+                    """
+                    UPDATE notification_outbox
+                    SET status = 'Ошибка', last_error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id_notification = ?
+                    """,
+                    failures,
+                )
+                connection.executemany(
+                    """
+                    UPDATE notification_outbox
+                    SET status = 'Просрочено', updated_at = CURRENT_TIMESTAMP
+                    WHERE id_notification = ?
+                    """,
+                    [(id_notification,) for id_notification in expired],
+                )
+            result["sent"] += len(sent)
+            result["retried"] += len(retries)
+            result["failed"] += len(failures)
+            result["expired"] += len(expired)
+    finally:
+        if opened:
+            sender.close()
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        sender: Optional[Sender] = None,
+        interval: float = DEFAULT_INTERVAL_SECONDS,
+    ) -> None:
+        self.db_path = db_path
+        self.sender = sender or sender_from_env(db_path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="salon-notifications", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        connection = get_connection(self.db_path)
+        try:
+            while not self._stop.is_set():
+                try:
+                    result = dispatch(connection, self.sender)
+                    if any(result.values()):
+                        logger.info("Уведомления: %s", result)
+                except Exception:
+                    logger.exception("Ошибка отправки уведомлений")
+                self._stop.wait(self.interval)
+        finally:
+            connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Отправка напоминаний и уведомлений о записях из outbox")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--file", type=Path, default=None, help="писать уведомления в JSONL-файл вместо SMTP")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sender = FileSender(args.file) if args.file else sender_from_env(args.db)
+    connection = get_connection(args.db)
+    try:
+        started = time.perf_counter()
+        result = dispatch(connection, sender, batch_size=args.batch_size)
+        logger.info(
+            "Отправлено: %d, повтор: %d, ошибок: %d, просрочено: %d (%.3f с)",
+            result["sent"], result["retried"], result["failed"], result["expired"], time.perf_counter() - started,
+        )
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import queue
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from salon_app.db_access import AuthUser, Db
+
+DEFAULT_READERS = 4
+
+READ_METHODS = (
+    "list_clients",
+    "list_client_records",
+    "forecast_demand",
+    "find_clients",
+    "find_clients_by_passport",
+    "search",
+    "get_client_profile",
+    "list_masters",
+    "list_services",
+    "list_categories",
+    "list_active_masters",
+    "list_active_services",
+    "list_appointments",
+    "list_appointment_records",
+    "appointment_totals",
+    "revenue_summary",
+    "list_client_appointments",
+    "list_client_waitlist",
+    "get_client_appointment",
+    "list_client_appointment_changes",
+    "list_client_appointment_ids",
+    "current_timestamp",
+    "list_available_masters",
+    "list_available_masters_in_period",
+    "list_additional_options",
+    "get_certificate",
+    "list_payments",
+    "price_at",
+    "price_list_at",
+)
+
+
+class PooledDb(Db):
+    def __init__(self, db_path: Optional[Path] = None, readers: int = DEFAULT_READERS) -> None:
+        super().__init__(db_path)
+        self._readers: queue.Queue = queue.Queue()
+        for _ in range(max(readers, 1)):
+            self._readers.put(Db(db_path, read_only=True))
+
+    def close(self) -> None:
+        while not self._readers.empty():
+            self._readers.get_nowait().connection.close()
+        super().close()
+
+    @contextmanager
+    def reader(self) -> Iterator[Db]:
+        reader = self._readers.get()
+        try:
+            yield reader
+        finally:
+            if reader.connection.in_transaction:
+                reader.connection.rollback()
+            self._readers.put(reader)
+
+    def authenticate(self, username: str, password: str) -> Optional[AuthUser]:
+        with self.reader() as reader:
+            user = reader.authenticate(username, password)
+        if user is not None:
+            self.set_actor(user)
+        return user
+
+    @contextmanager
+    def snapshot(self) -> Iterator[Db]:
+        with self.reader() as reader, reader.snapshot() as view:
+            yield view
+
+
+def _read_through_pool(name: str) -> Callable[..., Any]:
+    def method(self: PooledDb, *args: Any, **kwargs: Any) -> Any:
+        with self.reader() as reader:
+            return getattr(reader, name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+for _name in READ_METHODS:
+    setattr(PooledDb, _name, _read_through_pool(_name))
@@ -0,0 +1,167 @@
+import argparse
+import logging
+import sqlite3
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+from db import get_connection
+from salon_app.audit import AuditLog, system_audit
+
+logger = logging.getLogger(__name__)
+
+_PRICE_AT = """
+    SELECT h.price FROM service_price_history h
+    WHERE h.id_service = {service} AND h.valid_from <= {on_date}
+    ORDER BY h.valid_from DESC LIMIT 1
+"""
+
+
+def price_at(connection: sqlite3.Connection, id_service: int, on_date: date) -> Optional[float]:
+    row = connection.execute(
+        f"""
+        SELECT COALESCE(({_PRICE_AT.format(service=":id_service", on_date=":on_date")}), price) AS price
+        FROM service_pricelist
+        WHERE id_service = :id_service
+        """,
+        {"id_service": id_service, "on_date": on_date.isoformat()},
+    ).fetchone()
+    return None if row is None else row["price"]
+
+
+def price_list_at(connection: sqlite3.Connection, on_date: date) -> list[sqlite3.Row]:
+    return connection.execute(
+        """
+        SELECT s.id_service, s.service_name, h.price, h.valid_from, h.valid_to
+        FROM service_price_history h
+        JOIN service_pricelist s ON s.id_service = h.id_service
+        WHERE h.valid_from <= :on_date AND (h.valid_to IS NULL OR h.valid_to > :on_date)
+        ORDER BY s.id_service
+        """,
+        {"on_date": on_date.isoformat()},
+    ).fetchall()
+
+
+def _apply_due_prices(
+    connection: sqlite3.Connection, today: date, id_category: Optional[int], audit: AuditLog
+) -> int:
+    due = connection.execute(
+        f"""
+        SELECT s.id_service, s.price AS old_price,
+               ({_PRICE_AT.format(service="s.id_service", on_date=":today")}) AS new_price
+        FROM service_pricelist AS s
+        WHERE (:id_category IS NULL OR s.id_category = :id_category)
+          AND EXISTS (SELECT 1 FROM service_price_history h WHERE h.id_service = s.id_service AND h.valid_from <= :today)
+          AND s.price IS NOT ({_PRICE_AT.format(service="s.id_service", on_date=":today")})
+        """,
+        {"today": today.isoformat(), "id_category": id_category},
+    ).fetchall()
+    connection.executemany(
+        "UPDATE service_pricelist SET price = ?, updated_at = CURRENT_TIMESTAMP WHERE id_service = ?",
+        [(row["new_price"], row["id_service"]) for row in due],
+    )
+    audit.record_many(
+        "service", "update", [(int(row["id_service"]), {"price": [row["old_price"], row["new_price"]]}) for row in due]
+    )
+    return len(due)
+
+
+def apply_due_prices(
+    connection: sqlite3.Connection, today: Optional[date] = None, audit: Optional[AuditLog] = None
+) -> int:
+    with connection:
+        return _apply_due_prices(connection, today or date.today(), None, audit or system_audit(connection))
+
+
+def reprice_category(
+    connection: sqlite3.Connection,
+    id_category: int,
+    percent: float,
+    valid_from: Optional[date] = None,
+    audit: Optional[AuditLog] = None,
+) -> int:
+    audit = audit or system_audit(connection)
+    params = {
+        "id_category": id_category,
+        "factor": 1 + percent / 100,
+        "valid_from": (valid_from or date.today()).isoformat(),
+    }
+    with connection:
+        connection.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS reprice_batch (
+                id_service INTEGER PRIMARY KEY, old_price NUMERIC, price NUMERIC
+            )
+            """
+        )
+        connection.execute("DELETE FROM temp.reprice_batch")
+        connection.execute(
+            f"""
+            INSERT INTO temp.reprice_batch (id_service, old_price)
+            SELECT s.id_service, COALESCE(({_PRICE_AT.format(service="s.id_service", on_date=":valid_from")}), s.price)
+            FROM service_pricelist s
+            WHERE s.id_category = :id_category AND s.price IS NOT NULL
+            """,
+            params,
+        )
+        batch = connection.execute(
+            "UPDATE temp.reprice_batch SET price = ROUND(old_price * :factor, 2) RETURNING id_service, old_price, price",
+            params,
+        ).fetchall()
+        changed = len(batch)
+        connection.execute(
+            """
+            UPDATE service_price_history
+            SET valid_to = :valid_from
+            WHERE id_service IN (SELECT id_service FROM temp.reprice_batch)
+              AND valid_from < :valid_from
+              AND (valid_to IS NULL OR valid_to > :valid_from)
+            """,
+            params,
+        )
+        connection.execute(
+            """
+            INSERT INTO service_price_history (id_service, price, valid_from, valid_to)
+            SELECT b.id_service, b.price, :valid_from,
+                   (SELECT MIN(h.valid_from) FROM service_price_history h
+                    WHERE h.id_service = b.id_service AND h.valid_from > :valid_from)
+            FROM temp.reprice_batch b
+            WHERE true
+            ON CONFLICT(id_service, valid_from) DO UPDATE SET price = excluded.price
+            """,
+            params,
+        )
+        audit.record_many(
+            "service",
+            "update",
+            [
+                (
+                    int(row["id_service"]),
+                    {"scheduled_price": [row["old_price"], row["price"]], "valid_from": [None, params["valid_from"]]},
+                )
+                for row in batch
+            ],
+        )
+        _apply_due_prices(connection, date.today(), id_category, audit)
+    logger.info("Категория %d: новые цены для %d услуг с %s", id_category, changed, params["valid_from"])
+    return changed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Изменение цен категории с даты вступления в силу")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--category", type=int, required=True)
+    parser.add_argument("--percent", type=float, required=True)
+    parser.add_argument("--from", dest="valid_from", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    connection = get_connection(args.db)
+    try:
+        reprice_category(connection, args.category, args.percent, args.valid_from)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
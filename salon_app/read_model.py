@@ -0,0 +1,198 @@
+import argparse
+import sqlite3
+from pathlib import Path
+
+from db import get_connection
+
+VIEW_ROWS_TABLE = "appointment_view_rows"
+
+_VIEW_ROW_VALUES = """
+    NEW.id_appointment, NEW.id_client, NEW.id_master, NEW.id_service,
+    NEW.appointment_date, NEW.appointment_time, NEW.status, NEW.total_price,
+    (SELECT fio FROM clients WHERE id_client = NEW.id_client),
+    (SELECT fio FROM masters WHERE id_master = NEW.id_master),
+    (SELECT service_name FROM service_pricelist WHERE id_service = NEW.id_service)
+"""
+
+_VIEW_ROW_COLUMNS = """
+    id_appointment, id_client, id_master, id_service, appointment_date, appointment_time, status, total_price,
+    client_fio, master_fio, service_name
+"""
+
+_ENABLE_SCRIPT = f"""
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS appointment_view_rows (
+    id_appointment INTEGER PRIMARY KEY,
+    id_client INTEGER,
+    id_master INTEGER,
+    id_service INTEGER,
+    appointment_date DATE,
+    appointment_time TIME,
+    status TEXT,
+    total_price NUMERIC,
+    client_fio TEXT,
+    master_fio TEXT,
+    service_name TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_view_rows_admin
+    ON appointment_view_rows (
+        appointment_date, appointment_time, status, client_fio, master_fio, service_name, total_price
+    );
+
+CREATE INDEX IF NOT EXISTS idx_view_rows_client
+    ON appointment_view_rows (
+        id_client, appointment_date, appointment_time, status, master_fio, service_name, total_price
+    );
+
+CREATE INDEX IF NOT EXISTS idx_view_rows_master ON appointment_view_rows (id_master);
+
+CREATE INDEX IF NOT EXISTS idx_view_rows_service ON appointment_view_rows (id_service);
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_appointment_insert
+AFTER INSERT ON appointments
+BEGIN
+    INSERT OR REPLACE INTO appointment_view_rows ({_VIEW_ROW_COLUMNS}) VALUES ({_VIEW_ROW_VALUES});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_appointment_update
+AFTER UPDATE OF id_appointment, id_client, id_master, id_service, appointment_date, appointment_time, status, total_price
+ON appointments
+BEGIN
+    DELETE FROM appointment_view_rows WHERE id_appointment = OLD.id_appointment;
+    INSERT INTO appointment_view_rows ({_VIEW_ROW_COLUMNS}) VALUES ({_VIEW_ROW_VALUES});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_appointment_delete
+AFTER DELETE ON appointments
+BEGIN
+    DELETE FROM appointment_view_rows WHERE id_appointment = OLD.id_appointment;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_client_insert
+AFTER INSERT ON clients
+BEGIN
+    UPDATE appointment_view_rows SET client_fio = NEW.fio WHERE id_client = NEW.id_client;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_client_update
+AFTER UPDATE OF id_client, fio ON clients
+BEGIN
+    UPDATE appointment_view_rows SET client_fio = NULL WHERE id_client = OLD.id_client;
+    UPDATE appointment_view_rows SET client_fio = NEW.fio WHERE id_client = NEW.id_client;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_client_delete
+AFTER DELETE ON clients
+BEGIN
+    UPDATE appointment_view_rows SET client_fio = NULL WHERE id_client = OLD.id_client;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_master_insert
+AFTER INSERT ON masters
+BEGIN
+    UPDATE appointment_view_rows SET master_fio = NEW.fio WHERE id_master = NEW.id_master;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_master_update
+AFTER UPDATE OF id_master, fio ON masters
+BEGIN
+    UPDATE appointment_view_rows SET master_fio = NULL WHERE id_master = OLD.id_master;
+    UPDATE appointment_view_rows SET master_fio = NEW.fio WHERE id_master = NEW.id_master;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_master_delete
+AFTER DELETE ON masters
+BEGIN
+    UPDATE appointment_view_rows SET master_fio = NULL WHERE id_master = OLD.id_master;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_service_insert
+AFTER INSERT ON service_pricelist
+BEGIN
+    UPDATE appointment_view_rows SET service_name = NEW.service_name WHERE id_service = NEW.id_service;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_service_update
+AFTER UPDATE OF id_service, service_name ON service_pricelist
+BEGIN
+    UPDATE appointment_view_rows SET service_name = NULL WHERE id_service = OLD.id_service;
+    UPDATE appointment_view_rows SET service_name = NEW.service_name WHERE id_service = NEW.id_service;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_view_rows_service_delete
+AFTER DELETE ON service_pricelist
+BEGIN
+    UPDATE appointment_view_rows SET service_name = NULL WHERE id_service = OLD.id_service;
+END;
+
+DELETE FROM appointment_view_rows;
+
+INSERT INTO appointment_view_rows ({_VIEW_ROW_COLUMNS})
+SELECT a.id_appointment, a.id_client, a.id_master, a.id_service, a.appointment_date, a.appointment_time,
+       a.status, a.total_price, cl.fio, m.fio, s.service_name
+FROM appointments a
+LEFT JOIN clients cl ON cl.id_client = a.id_client
+LEFT JOIN masters m ON m.id_master = a.id_master
+LEFT JOIN service_pricelist s ON s.id_service = a.id_service;
+
+COMMIT;
+"""
+
+_DISABLE_SCRIPT = """
+BEGIN;
+DROP TRIGGER IF EXISTS trg_view_rows_appointment_insert;
+DROP TRIGGER IF EXISTS trg_view_rows_appointment_update;
+DROP TRIGGER IF EXISTS trg_view_rows_appointment_delete;
+DROP TRIGGER IF EXISTS trg_view_rows_client_insert;
+DROP TRIGGER IF EXISTS trg_view_rows_client_update;
+DROP TRIGGER IF EXISTS trg_view_rows_client_delete;
+DROP TRIGGER IF EXISTS trg_view_rows_master_insert;
+DROP TRIGGER IF EXISTS trg_view_rows_master_update;
+DROP TRIGGER IF EXISTS trg_view_rows_master_delete;
+DROP TRIGGER IF EXISTS trg_view_rows_service_insert;
+DROP TRIGGER IF EXISTS trg_view_rows_service_update;
+DROP TRIGGER IF EXISTS trg_view_rows_service_delete;
+DROP TABLE IF EXISTS appointment_view_rows;
+COMMIT;
+"""
+
+
+def view_rows_enabled(connection: sqlite3.Connection) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (VIEW_ROWS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def enable_view_rows(connection: sqlite3.Connection) -> None:
+    connection.executescript(_ENABLE_SCRIPT)
+
+
+def disable_view_rows(connection: sqlite3.Connection) -> None:
+    connection.executescript(_DISABLE_SCRIPT)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Денормализованная таблица строк для списков записей")
+    parser.add_argument("--db", type=Path, default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("enable")
+    commands.add_parser("disable")
+    args = parser.parse_args()
+
+    connection = get_connection(args.db)
+    try:
+        if args.command == "enable":
+            enable_view_rows(connection)
+            print("Таблица appointment_view_rows включена")
+        else:
+            disable_view_rows(connection)
+            print("Таблица appointment_view_rows отключена")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
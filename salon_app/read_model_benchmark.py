@@ -0,0 +1,106 @@
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+from db import copy_database
+from salon_app.benchmark import ensure_database, parse_scale
+from salon_app.db_access import Db
+from salon_app.read_model import disable_view_rows, enable_view_rows, view_rows_enabled
+
+DEFAULT_CLIENTS = "100k"
+DEFAULT_REPEAT = 5
+DEFAULT_BOOKINGS = 50
+
+
+def _median(action: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def benchmark(db_path: Path, repeat: int, bookings: int) -> dict[str, dict[str, float]]:
+    db = Db(db_path)
+    try:
+        if view_rows_enabled(db.connection):
+            disable_view_rows(db.connection)
+        row = db.connection.execute(
+            "SELECT id_client FROM appointments GROUP BY id_client ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()
+        id_client = int(row["id_client"])
+        slot = db.connection.execute(
+            "SELECT id_master, id_service FROM appointments ORDER BY id_appointment LIMIT 1"
+        ).fetchone()
+        today = date.today()
+        counter = iter(range(10**9))
+
+        def book() -> None:
+            n = next(counter)
+            day = today + timedelta(days=1000 + n // 24)
+            db.create_appointment_with_form(
+                id_client=id_client,
+                id_master=int(slot["id_master"]),
+                id_service=int(slot["id_service"]),
+                appointment_date=day,
+                appointment_time=f"{n % 24:02d}:00:00",
+                passport_number="",
+                visit_purpose="",
+                planned_start=day,
+                planned_end=day,
+                id_additional_option=None,
+                additional_notes="",
+            )
+
+        cases: dict[str, Callable[[], object]] = {
+            "list_appointments_all": db.list_appointments,
+            "list_appointments_week": lambda: db.list_appointments(today - timedelta(days=7), today + timedelta(days=7)),
+            "list_client_appointments": lambda: db.list_client_appointments(id_client),
+            f"create_appointment x{bookings}": lambda: [book() for _ in range(bookings)],
+        }
+
+        report: dict[str, dict[str, float]] = {name: {} for name in cases}
+        for mode in ("join", "view_rows"):
+            if mode == "view_rows":
+                started = time.perf_counter()
+                enable_view_rows(db.connection)
+                report["enable_view_rows"] = {"view_rows": time.perf_counter() - started}
+            db.view_rows = mode == "view_rows"
+            for name, action in cases.items():
+                report[name][mode] = _median(action, repeat)
+        return report
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение списков записей через JOIN и через appointment_view_rows")
+    parser.add_argument("--db", type=Path, default=None, help="готовая БД; по умолчанию генерируется синтетическая")
+    parser.add_argument("--clients", default=DEFAULT_CLIENTS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--bookings", type=int, default=DEFAULT_BOOKINGS)
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        run_copy = Path(tmp) / "read_model.sqlite3"
+        copy_database(args.db or ensure_database(workdir, parse_scale(args.clients)), run_copy)
+        report = benchmark(run_copy, args.repeat, args.bookings)
+
+    print(f"{'':<34}{'join':>14}{'view_rows':>14}")
+    for name, timings in report.items():
+        cells = "".join(
+            f"{timings[mode] * 1000:>11.2f} мс" if mode in timings else f"{'-':>14}" for mode in ("join", "view_rows")
+        )
+        print(f"{name:<34}{cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from typing import Generic, Iterator, NamedTuple, Sequence, TypeVar, Union, overload
+
+R = TypeVar("R", bound=tuple)
+
+
+class ClientRecord(NamedTuple):
+    id_client: str
+    fio: str
+    birth_date: str
+    phone: str
+    email: str
+    registration_date: str
+    last_visit: str
+    visits: str
+    total_spend: str
+    segment: str
+
+
+class AppointmentRecord(NamedTuple):
+    id_appointment: str
+    appointment_date: str
+    appointment_time: str
+    status: str
+    client_fio: str
+    master_fio: str
+    service_name: str
+    total_price: str
+
+
+def _text(value: object) -> str:
+    return str(value or "")
+
+
+class DisplayRows(Sequence[R], Generic[R]):
+    def __init__(self, record_type: type[R], rows: list[tuple]) -> None:
+        self.record_type = record_type
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @overload
+    def __getitem__(self, index: int) -> R: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "DisplayRows[R]": ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[R, "DisplayRows[R]"]:
+        if isinstance(index, slice):
+            return DisplayRows(self.record_type, self.rows[index])
+        return self.record_type._make(map(_text, self.rows[index]))
+
+    def __iter__(self) -> Iterator[R]:
+        make = self.record_type._make
+        for values in self.rows:
+            yield make(map(_text, values))
@@ -0,0 +1,142 @@
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from salon_app.audit import AuditLog, system_audit
+
+WEEKDAYS = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье")
+
+
+@dataclass(frozen=True)
+class Reassignment:
+    id_appointment: int
+    appointment_date: str
+    appointment_time: str
+    from_master: int
+    to_master: Optional[int]
+
+
+def plan_reassignment(
+    connection: sqlite3.Connection, id_master: int, from_date: Optional[date] = None
+) -> list[Reassignment]:
+    from_day = (from_date or date.today()).isoformat()
+
+    master = connection.execute(
+        "SELECT specialization FROM masters WHERE id_master = ?", (id_master,)
+    ).fetchone()
+    if master is None:
+        return []
+
+    affected = connection.execute(
+        """
+        SELECT id_appointment, appointment_date, appointment_time
+        FROM appointments
+        WHERE id_master = ? AND appointment_date >= ? AND status = 'Запланирован'
+        ORDER BY appointment_date, appointment_time, id_appointment
+        """,
+        (id_master, from_day),
+    ).fetchall()
+    if not affected:
+        return []
+
+    candidates = [
+        int(row["id_master"])
+        for row in connection.execute(
+            """
+            SELECT id_master FROM masters
+            WHERE is_active = 1 AND id_master <> ? AND specialization IS ?
+            ORDER BY id_master
+            """,
+            (id_master, master["specialization"]),
+        )
+    ]
+
+    schedule: dict[tuple[int, str], list[tuple[str, str]]] = defaultdict(list)
+    busy: set[tuple[int, str, str]] = set()
+    load: dict[int, int] = {candidate: 0 for candidate in candidates}
+    if candidates:
+        placeholders = ", ".join("?" for _ in candidates)
+        for row in connection.execute(
+            f"SELECT id_master, weekday, start_time, end_time FROM master_schedule WHERE id_master IN ({placeholders})",
+            candidates,
+        ):
+            schedule[(int(row["id_master"]), str(row["weekday"]))].append(
+                (str(row["start_time"]), str(row["end_time"]))
+            )
+        for row in connection.execute(
+            f"""
+            SELECT id_master, appointment_date, appointment_time
+            FROM appointments
+            WHERE id_master IN ({placeholders})
+              AND appointment_date >= ?
+              AND status IN ('Запланирован', 'Клиент пришёл', 'Выполняется')
+            """,
+            (*candidates, from_day),
+        ):
+            busy.add((int(row["id_master"]), str(row["appointment_date"]), str(row["appointment_time"])))
+            load[int(row["id_master"])] += 1
+
+    plan = []
+    for row in affected:
+        appointment_date = str(row["appointment_date"])
+        appointment_time = str(row["appointment_time"])
+        weekday = WEEKDAYS[date.fromisoformat(appointment_date).weekday()]
+
+        chosen = None
+        for candidate in candidates:
+            if (candidate, appointment_date, appointment_time) in busy:
+                continue
+            if not any(start <= appointment_time < end for start, end in schedule.get((candidate, weekday), ())):
+                continue
+            if chosen is None or load[candidate] < load[chosen]:
+                chosen = candidate
+
+        if chosen is not None:
+            busy.add((chosen, appointment_date, appointment_time))
+            load[chosen] += 1
+
+        plan.append(
+            Reassignment(
+                id_appointment=int(row["id_appointment"]),
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                from_master=id_master,
+                to_master=chosen,
+            )
+        )
+    return plan
+
+
+def apply_reassignment(
+    connection: sqlite3.Connection, plan: list[Reassignment], audit: Optional[AuditLog] = None
+) -> int:
+    audit = audit or system_audit(connection)
+    moves = [item for item in plan if item.to_master is not None]
+    if not moves:
+        return 0
+
+    moved = []
+    with connection:
+        for item in moves:
+            cursor = connection.execute(
+                """
+                UPDATE appointments
+                SET id_master = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id_appointment = ? AND id_master = ? AND status = 'Запланирован'
+                  AND NOT EXISTS (
+                    SELECT 1
+                    FROM appointments b
+                    WHERE b.id_master = ?
+                      AND b.appointment_date = appointments.appointment_date
+                      AND b.appointment_time = appointments.appointment_time
+                      AND b.status IN ('Запланирован', 'Клиент пришёл', 'Выполняется')
+                  )
+                """,
+                (item.to_master, item.id_appointment, item.from_master, item.to_master),
+            )
+            if cursor.rowcount == 1:
+                moved.append((item.id_appointment, {"id_master": [item.from_master, item.to_master]}))
+        audit.record_many("appointment", "update", moved)
+    return len(moved)
@@ -0,0 +1,105 @@
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Sequence
+
+from db import copy_database
+from salon_app.benchmark import ensure_database, parse_scale
+from salon_app.db_access import Db
+
+DEFAULT_CLIENTS = "100k"
+DEFAULT_REPEAT = 3
+
+APPOINTMENT_COLUMNS = (
+    "id_appointment", "appointment_date", "appointment_time", "status",
+    "client_fio", "master_fio", "service_name", "total_price",
+)
+CLIENT_COLUMNS = ("id_client", "fio", "birth_date", "phone", "email", "registration_date")
+
+
+def _row_cells(rows: list, columns: tuple[str, ...]) -> int:
+    count = 0
+    for row in rows:
+        count += len([str(row[column] or "") for column in columns])
+    return count
+
+
+def _record_cells(records: Sequence[tuple]) -> int:
+    count = 0
+    for record in records:
+        count += len([cell for cell in record])
+    return count
+
+
+def _measure(load: Callable[[], Sequence], render: Callable[[Sequence], int], repeat: int) -> dict[str, float]:
+    load_times = []
+    render_times = []
+    refresh_times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = load()
+        loaded = time.perf_counter()
+        render(result)
+        finished = time.perf_counter()
+        load_times.append(loaded - started)
+        render_times.append(finished - loaded)
+        refresh_times.append(finished - started)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": len(result),
+        "load": min(load_times),
+        "render": min(render_times),
+        "refresh": min(refresh_times),
+        "retained": retained,
+        "peak": peak,
+    }
+
+
+def compare(db: Db, repeat: int) -> dict[str, dict[str, float]]:
+    return {
+        "appointments Row": _measure(
+            db.list_appointments, lambda rows: _row_cells(rows, APPOINTMENT_COLUMNS), repeat
+        ),
+        "appointments record": _measure(db.list_appointment_records, _record_cells, repeat),
+        "clients Row": _measure(db.list_clients, lambda rows: _row_cells(rows, CLIENT_COLUMNS), repeat),
+        "clients record": _measure(db.list_client_records, _record_cells, repeat),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение sqlite3.Row и компактных записей по памяти и времени")
+    parser.add_argument("--clients", default=DEFAULT_CLIENTS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        run_copy = Path(tmp) / "rows.sqlite3"
+        copy_database(ensure_database(workdir, parse_scale(args.clients)), run_copy)
+        db = Db(run_copy)
+        try:
+            report = compare(db, args.repeat)
+        finally:
+            db.close()
+
+    print(f"{'':<22}{'строк':>9}{'загрузка':>12}{'отрисовка':>12}{'всего':>12}{'память':>12}{'пик':>12}")
+    for name, stats in report.items():
+        print(
+            f"{name:<22}{stats['rows']:>9}{stats['load'] * 1000:>9.1f} мс{stats['render'] * 1000:>9.1f} мс{stats['refresh'] * 1000:>9.1f} мс"
+            f"{stats['retained'] / 2**20:>9.1f} МБ{stats['peak'] / 2**20:>9.1f} МБ"
+        )
+
+
+if __name__ == "__main__":
+    main()
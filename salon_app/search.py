@@ -0,0 +1,83 @@
+import re
+import sqlite3
+from dataclasses import dataclass
+
+from db import SEARCH_APPOINTMENT, SEARCH_CLIENT, SEARCH_SERVICE
+from salon_app.archive import archive_attached
+
+DEFAULT_LIMIT = 50
+SNIPPET_TOKENS = 12
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+ENTITY_NAMES = {
+    SEARCH_APPOINTMENT: "Запись",
+    SEARCH_CLIENT: "Клиент",
+    SEARCH_SERVICE: "Услуга",
+}
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    entity_type: int
+    entity_id: int
+    title: str
+    snippet: str
+    rank: float
+
+
+def match_query(text: str) -> str:
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", text))
+
+
+def search(connection: sqlite3.Connection, text: str, limit: int = DEFAULT_LIMIT) -> list[SearchHit]:
+    query = match_query(text)
+    if not query:
+        return []
+
+    appointment, archive_join = "a.{column}", ""
+    if archive_attached(connection):
+        appointment = "COALESCE(a.{column}, aa.{column})"
+        archive_join = f"""
+        LEFT JOIN archive.appointments aa
+            ON h.entity_type = {SEARCH_APPOINTMENT} AND a.id_appointment IS NULL AND aa.id_appointment = h.entity_id
+        """
+
+    rows = connection.execute(
+        f"""
+        WITH hits AS (
+            SELECT rowid % 4 AS entity_type, rowid / 4 AS entity_id,
+                   snippet(search_index, 0, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) AS snippet,
+                   bm25(search_index) AS rank
+            FROM search_index
+            WHERE search_index MATCH :query
+            ORDER BY rank
+            LIMIT :limit
+        )
+        SELECT h.entity_type, h.entity_id, h.snippet, h.rank,
+               CASE h.entity_type
+                   WHEN {SEARCH_APPOINTMENT} THEN {appointment.format(column="appointment_date")} || ' '
+                       || {appointment.format(column="appointment_time")} || ' ' || COALESCE(ac.fio, '')
+                   WHEN {SEARCH_CLIENT} THEN c.fio
+                   WHEN {SEARCH_SERVICE} THEN s.service_name
+               END AS title
+        FROM hits h
+        LEFT JOIN main.appointments a ON h.entity_type = {SEARCH_APPOINTMENT} AND a.id_appointment = h.entity_id
+        {archive_join}
+        LEFT JOIN clients ac ON ac.id_client = {appointment.format(column="id_client")}
+        LEFT JOIN clients c ON h.entity_type = {SEARCH_CLIENT} AND c.id_client = h.entity_id
+        LEFT JOIN service_pricelist s ON h.entity_type = {SEARCH_SERVICE} AND s.id_service = h.entity_id
+        ORDER BY h.rank
+        """,
+        {"query": query, "limit": limit},
+    ).fetchall()
+    return [
+        SearchHit(
+            entity_type=int(row["entity_type"]),
+            entity_id=int(row["entity_id"]),
+            title=str(row["title"] or ""),
+            snippet=str(row["snippet"] or ""),
+            rank=float(row["rank"]),
+        )
+        for row in rows
+    ]
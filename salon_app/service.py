@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import json
+import secrets
+import statistics
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from db import init_db
+from salon_app.db_access import AuthUser, Db
+from salon_app.write_queue import WriteQueue
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_READERS = 4
+METRICS_WINDOW = 1000
+MAX_BODY_BYTES = 1 << 20
+SESSION_TTL_SECONDS = 8 * 60 * 60.0
+
+Response = tuple[int, Any]
+
+_STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+
+class _Worker:
+    def __init__(self, db_path: Optional[Path]) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.db = self.executor.submit(Db, db_path, True).result()
+
+    def close(self) -> None:
+        self.executor.submit(self.db.close).result()
+        self.executor.shutdown(wait=True)
+
+
+class _ConnectionPool:
+    def __init__(self, db_path: Optional[Path], size: int) -> None:
+        self.workers = [_Worker(db_path) for _ in range(size)]
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def run(self, func: Callable[[Db], Any]) -> Any:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self.workers:
+                self._idle.put_nowait(worker)
+
+        worker = await self._idle.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(worker.executor, func, worker.db)
+        finally:
+            self._idle.put_nowait(worker)
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.close()
+
+
+def _rows(rows: list) -> list[dict]:
+    return [dict(row) for row in rows]
+
+
+def _may_access_client(user: AuthUser, id_client: int) -> bool:
+    return user.role == "admin" or user.id_client == id_client
+
+
+class SalonService:
+    def __init__(self, db_path: Optional[Path] = None, readers: int = DEFAULT_READERS) -> None:
+        self.readers = _ConnectionPool(db_path, readers)
+        self.writer = WriteQueue(db_path)
+        self.latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=METRICS_WINDOW))
+        self.sessions: dict[str, tuple[AuthUser, float]] = {}
+        self.public_routes = {("POST", "/auth")}
+        self.routes: dict[tuple[str, str], Callable[[dict, dict, Optional[AuthUser]], Any]] = {
+            ("POST", "/auth"): self._auth,
+            ("GET", "/availability"): self._availability,
+            ("POST", "/appointments"): self._create_appointment,
+            ("GET", "/client-appointments"): self._client_appointments,
+            ("GET", "/metrics"): self._metrics,
+        }
+
+    def close(self) -> None:
+        self.readers.close()
+        self.writer.close()
+
+    def _session_user(self, token: Optional[str]) -> Optional[AuthUser]:
+        session = self.sessions.get(token or "")
+        if session is None:
+            return None
+        user, expires_at = session
+        if expires_at < time.monotonic():
+            del self.sessions[token]
+            return None
+        return user
+
+    async def handle(
+        self, method: str, target: str, body: Optional[dict] = None, token: Optional[str] = None
+    ) -> Response:
+        url = urlsplit(target)
+        route = (method.upper(), url.path)
+        handler = self.routes.get(route)
+        if handler is None:
+            return 404, {"error": "Не найдено"}
+
+        user = self._session_user(token)
+        if user is None and route not in self.public_routes:
+            return 401, {"error": "Требуется вход в систему"}
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        started = time.perf_counter()
+        try:
+            return await handler(query, body or {}, user)
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, {"error": f"Некорректный запрос: {error}"}
+        finally:
+            self.latencies[f"{route[0]} {route[1]}"].append(time.perf_counter() - started)
+
+    async def _auth(self, query: dict, body: dict, user: Optional[AuthUser]) -> Response:
+        user = await self.readers.run(lambda db: db.authenticate(str(body["username"]), str(body["password"])))
+        if user is None:
+            return 401, {"error": "Неверный логин или пароль"}
+        token = secrets.token_urlsafe(32)
+        self.sessions[token] = (user, time.monotonic() + SESSION_TTL_SECONDS)
+        return 200, {"token": token, **asdict(user)}
+
+    async def _availability(self, query: dict, body: dict, user: Optional[AuthUser]) -> Response:
+        appointment_date = date.fromisoformat(query["date"])
+        appointment_time = query["time"]
+        rows = await self.readers.run(lambda db: db.list_available_masters(appointment_date, appointment_time))
+        return 200, _rows(rows)
+
+    async def _client_appointments(self, query: dict, body: dict, user: Optional[AuthUser]) -> Response:
+        id_client = int(query["id_client"])
+        if not _may_access_client(user, id_client):
+            return 403, {"error": "Нет доступа к записям этого клиента"}
+        rows = await self.readers.run(lambda db: db.list_client_appointments(id_client))
+        return 200, _rows(rows)
+
+    async def _create_appointment(self, query: dict, body: dict, user: Optional[AuthUser]) -> Response:
+        id_client = int(body["id_client"])
+        if not _may_access_client(user, id_client):
+            return 403, {"error": "Нет доступа к записям этого клиента"}
+        appointment_date = date.fromisoformat(body["appointment_date"])
+        planned_start = date.fromisoformat(body.get("planned_start") or body["appointment_date"])
+        planned_end = date.fromisoformat(body.get("planned_end") or body["appointment_date"])
+        id_option = body.get("id_additional_option")
+
+        def book(db: Db) -> tuple[bool, str, Optional[int]]:
+            db.set_actor(user)
+            return db.create_appointment_with_form(
+                id_client=id_client,
+                id_master=int(body["id_master"]),
+                id_service=int(body["id_service"]),
+                appointment_date=appointment_date,
+                appointment_time=str(body["appointment_time"]),
+                passport_number=str(body.get("passport_number", "")),
+                visit_purpose=str(body.get("visit_purpose", "")),
+                planned_start=planned_start,
+                planned_end=planned_end,
+                id_additional_option=int(id_option) if id_option is not None else None,
+                additional_notes=str(body.get("additional_notes", "")),
+            )
+
+        ok, status, id_appointment = await asyncio.wrap_future(self.writer.submit(book))
+        return (200 if ok else 409), {"ok": ok, "status": status, "id_appointment": id_appointment}
+
+    async def _metrics(self, query: dict, body: dict, user: Optional[AuthUser]) -> Response:
+        if user.role != "admin":
+            return 403, {"error": "Доступно только администратору"}
+        metrics = {}
+        for route, values in self.latencies.items():
+            ordered = sorted(values)
+            if not ordered:
+                continue
+            metrics[route] = {
+                "count": len(ordered),
+                "p50_ms": statistics.median(ordered) * 1000,
+                "p99_ms": ordered[min(int(0.99 * len(ordered)), len(ordered) - 1)] * 1000,
+            }
+        return 200, metrics
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                writer.close()
+                return
+            method, target, _version = request_line.split(" ", 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", "0"))
+            if length > MAX_BODY_BYTES:
+                status, payload = 400, {"error": "Слишком большой запрос"}
+            else:
+                raw = await reader.readexactly(length) if length else b""
+                try:
+                    body = json.loads(raw.decode("utf-8")) if raw else {}
+                except ValueError:
+                    status, payload = 400, {"error": "Некорректный JSON"}
+                else:
+                    scheme, _, token = headers.get("authorization", "").partition(" ")
+                    token = token.strip() if scheme.lower() == "bearer" else None
+                    status, payload = await self.handle(method, target, body, token)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = 400, {"error": "Некорректный запрос"}
+        except Exception:
+            status, payload = 500, {"error": "Внутренняя ошибка"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+
+class LocalClient:
+    def __init__(self, service: SalonService) -> None:
+        self.service = service
+        self.token: Optional[str] = None
+
+    async def request(self, method: str, target: str, body: Optional[dict] = None) -> Response:
+        status, payload = await self.service.handle(method, target, json.loads(json.dumps(body or {})), self.token)
+        payload = json.loads(json.dumps(payload, ensure_ascii=False))
+        if status == 200 and urlsplit(target).path == "/auth":
+            self.token = payload["token"]
+        return status, payload
+
+    async def get(self, target: str) -> Response:
+        return await self.request("GET", target)
+
+    async def post(self, target: str, body: dict) -> Response:
+        return await self.request("POST", target, body)
+
+
+async def _run(db_path: Optional[Path], host: str, port: int, readers: int) -> None:
+    service = SalonService(db_path, readers)
+    server = await service.serve(host, port)
+    print(f"Сервис запущен: http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP/JSON сервис для киосков поверх Db")
+    parser.add_argument("--db", type=Path, default=None)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS)
+    args = parser.parse_args()
+
+    init_db(seed=True, db_path=args.db)
+    try:
+        asyncio.run(_run(args.db, args.host, args.port, args.readers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import heapq
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+from db import branch_db_path, init_db
+from salon_app.db_access import Db
+from salon_app.pooled_db import PooledDb
+
+BRANCHES_ENV = "SALON_BRANCHES"
+
+T = TypeVar("T")
+
+
+def configured_branches() -> list[str]:
+    value = os.environ.get(BRANCHES_ENV, "")
+    return [branch.strip() for branch in value.split(",") if branch.strip()]
+
+
+class ShardRouter:
+    def __init__(self, paths: dict[str, Path]) -> None:
+        self.paths = paths
+        self._readers: dict[str, Db] = {}
+        self._locks = {branch: threading.Lock() for branch in paths}
+
+    @classmethod
+    def from_env(cls) -> "ShardRouter":
+        branches = configured_branches()
+        if not branches:
+            return cls({"": branch_db_path()})
+        return cls({branch: branch_db_path(branch) for branch in branches})
+
+    @property
+    def branches(self) -> list[str]:
+        return list(self.paths)
+
+    def init_all(self, seed: bool = True) -> None:
+        for path in self.paths.values():
+            init_db(seed=seed, db_path=path)
+
+    def open(self, branch: str) -> PooledDb:
+        return PooledDb(self.paths[branch])
+
+    def close(self) -> None:
+        for branch, lock in self._locks.items():
+            with lock:
+                reader = self._readers.pop(branch, None)
+                if reader is not None:
+                    reader.close()
+
+    def _fan_out(self, query: Callable[[Db], T]) -> list[tuple[str, T]]:
+        def run(branch: str) -> tuple[str, T]:
+            with self._locks[branch]:
+                reader = self._readers.get(branch)
+                if reader is None:
+                    reader = self._readers[branch] = Db(self.paths[branch], read_only=True)
+                return branch, query(reader)
+
+        if len(self.paths) == 1:
+            return [run(branch) for branch in self.paths]
+        with ThreadPoolExecutor(max_workers=len(self.paths)) as executor:
+            return list(executor.map(run, self.paths))
+
+    def find_clients(self, text: str) -> list[tuple[str, sqlite3.Row]]:
+        results = self._fan_out(lambda db: db.find_clients(text))
+        return list(
+            heapq.merge(
+                *([(branch, row) for row in rows] for branch, rows in results),
+                key=lambda item: str(item[1]["fio"] or ""),
+            )
+        )
+
+    def list_appointments(
+        self, date_from: Optional[date] = None, date_to: Optional[date] = None
+    ) -> list[tuple[str, sqlite3.Row]]:
+        results = self._fan_out(lambda db: db.list_appointments(date_from, date_to))
+        return list(
+            heapq.merge(
+                *([(branch, row) for row in rows] for branch, rows in results),
+                key=lambda item: (str(item[1]["appointment_date"] or ""), str(item[1]["appointment_time"] or "")),
+                reverse=True,
+            )
+        )
+
+    def revenue_by_branch(self, date_from: date, date_to: date) -> list[tuple[str, sqlite3.Row]]:
+        return self._fan_out(lambda db: db.revenue_summary(date_from, date_to))
+
+
+def _branch_label(branch: str) -> str:
+    return branch or "основной"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=f"Отчёты по всем филиалам (список филиалов в {BRANCHES_ENV})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    clients_parser = commands.add_parser("clients", help="поиск клиента во всех филиалах")
+    clients_parser.add_argument("text")
+
+    appointments_parser = commands.add_parser("appointments", help="записи всех филиалов за период")
+    appointments_parser.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None)
+    appointments_parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None)
+
+    revenue_parser = commands.add_parser("revenue", help="выручка по филиалам за период")
+    revenue_parser.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True)
+    revenue_parser.add_argument("--to", dest="date_to", type=date.fromisoformat, required=True)
+
+    args = parser.parse_args()
+    router = ShardRouter.from_env()
+    try:
+        if args.command == "clients":
+            for branch, row in router.find_clients(args.text):
+                print(f"{_branch_label(branch)}\t{row['id_client']}\t{row['fio']}\t{row['phone'] or ''}")
+        elif args.command == "appointments":
+            for branch, row in router.list_appointments(args.date_from, args.date_to):
+                print(
+                    f"{_branch_label(branch)}\t{row['appointment_date']} {row['appointment_time']}\t{row['status']}\t"
+                    f"{row['client_fio'] or ''}\t{row['master_fio'] or ''}\t{row['service_name'] or ''}\t"
+                    f"{row['total_price'] or 0}"
+                )
+        else:
+            total_count, total_amount = 0, 0
+            for branch, row in router.revenue_by_branch(args.date_from, args.date_to):
+                total_count += int(row["payments_count"])
+                total_amount += row["total_amount"]
+                print(f"{_branch_label(branch)}\tоплат: {row['payments_count']}\tсумма: {row['total_amount']}")
+            print(f"Итого\tоплат: {total_count}\tсумма: {total_amount}")
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from db import copy_database
+from salon_app.benchmark import ensure_database, parse_scale
+from salon_app.db_access import Db
+
+DEFAULT_STATIONS = 8
+DEFAULT_DURATION = 20.0
+DEFAULT_BUSY_TIMEOUT_MS = 0
+RETRY_SLEEP = 0.002
+RETRY_LIMIT = 5.0
+
+OPERATION_WEIGHTS = {
+    "login": 10,
+    "availability": 35,
+    "client_history": 25,
+    "booking": 20,
+    "admin_edit": 10,
+}
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class Station:
+    def __init__(self, db_path: Path, busy_timeout_ms: int, seed: int) -> None:
+        self.db = Db(db_path)
+        self.db.connection.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self.rng = random.Random(seed)
+        self.today = date.today()
+        connection = self.db.connection
+        self.client_ids = [int(row[0]) for row in connection.execute("SELECT id_client FROM clients")]
+        self.master_ids = [int(row[0]) for row in connection.execute("SELECT id_master FROM masters WHERE is_active = 1")]
+        self.service_ids = [int(row[0]) for row in connection.execute("SELECT id_service FROM service_pricelist")]
+        self.operations: dict[str, Callable[[], object]] = {
+            "login": lambda: self.db.authenticate("admin", "admin"),
+            "availability": self._availability,
+            "client_history": lambda: self.db.list_client_appointments(self.rng.choice(self.client_ids)),
+            "booking": self._booking,
+            "admin_edit": self._admin_edit,
+        }
+
+    def _slot(self) -> tuple[date, str]:
+        return self.today + timedelta(days=self.rng.randrange(1, 60)), f"{self.rng.randrange(9, 20):02d}:00:00"
+
+    def _availability(self) -> object:
+        return self.db.list_available_masters(*self._slot())
+
+    def _booking(self) -> object:
+        appointment_date, appointment_time = self._slot()
+        return self.db.create_appointment_with_form(
+            id_client=self.rng.choice(self.client_ids),
+            id_master=self.rng.choice(self.master_ids),
+            id_service=self.rng.choice(self.service_ids),
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            passport_number="",
+            visit_purpose="",
+            planned_start=appointment_date,
+            planned_end=appointment_date,
+            id_additional_option=None,
+            additional_notes="",
+        )
+
+    def _admin_edit(self) -> object:
+        row = self.db.connection.execute(
+            "SELECT id_client, fio, birth_date, phone, email, registration_date FROM clients WHERE id_client = ?",
+            (self.rng.choice(self.client_ids),),
+        ).fetchone()
+        return self.db.update_client(
+            int(row["id_client"]), row["fio"], row["birth_date"], row["phone"], row["email"], row["registration_date"]
+        )
+
+    def run(self, duration: float) -> dict:
+        names = list(OPERATION_WEIGHTS)
+        weights = list(OPERATION_WEIGHTS.values())
+        latencies: dict[str, list[float]] = defaultdict(list)
+        busy = 0
+        lock_wait = 0.0
+        failed = 0
+
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            while True:
+                attempt_started = time.perf_counter()
+                try:
+                    self.operations[name]()
+                    break
+                except sqlite3.OperationalError as error:
+                    if not _is_busy(error):
+                        raise
+                    self.db.connection.rollback()
+                    lock_wait += time.perf_counter() - attempt_started
+                    busy += 1
+                    if time.perf_counter() - started > RETRY_LIMIT:
+                        failed += 1
+                        break
+                    wait_started = time.perf_counter()
+                    time.sleep(RETRY_SLEEP * self.rng.uniform(0.5, 1.5))
+                    lock_wait += time.perf_counter() - wait_started
+            latencies[name].append(time.perf_counter() - started)
+
+        self.db.close()
+        return {"latencies": dict(latencies), "busy": busy, "lock_wait": lock_wait, "failed": failed}
+
+
+def _station(db_path: str, busy_timeout_ms: int, duration: float, seed: int) -> dict:
+    return Station(Path(db_path), busy_timeout_ms, seed).run(duration)
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def simulate(
+    db_path: Path,
+    stations: int = DEFAULT_STATIONS,
+    duration: float = DEFAULT_DURATION,
+    busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+    journal_mode: Optional[str] = None,
+) -> dict:
+    if journal_mode:
+        connection = sqlite3.connect(str(db_path))
+        connection.execute(f"PRAGMA journal_mode = {journal_mode}")
+        connection.close()
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(stations) as pool:
+        results = pool.starmap(
+            _station, [(str(db_path), busy_timeout_ms, duration, seed) for seed in range(stations)]
+        )
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    for result in results:
+        for name, values in result["latencies"].items():
+            latencies[name].extend(values)
+    everything = [value for values in latencies.values() for value in values]
+
+    return {
+        "stations": stations,
+        "duration": duration,
+        "operations": len(everything),
+        "throughput": len(everything) / duration,
+        "busy_timeout_ms": busy_timeout_ms,
+        "busy": sum(result["busy"] for result in results),
+        "lock_wait": sum(result["lock_wait"] for result in results),
+        "failed": sum(result["failed"] for result in results),
+        "p50": _percentile(everything, 0.50),
+        "p99": _percentile(everything, 0.99),
+        "by_operation": {
+            name: {"count": len(values), "p50": _percentile(values, 0.50), "p99": _percentile(values, 0.99)}
+            for name, values in sorted(latencies.items())
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Симуляция одновременной работы нескольких стоек с одной БД")
+    parser.add_argument("--db", type=Path, default=None, help="готовая БД; по умолчанию генерируется синтетическая")
+    parser.add_argument("--clients", default="10k")
+    parser.add_argument("--stations", type=int, default=DEFAULT_STATIONS)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument(
+        "--busy-timeout-ms",
+        type=int,
+        default=DEFAULT_BUSY_TIMEOUT_MS,
+        help="PRAGMA busy_timeout стоек; при 0 каждое ожидание блокировки видно как SQLITE_BUSY",
+    )
+    parser.add_argument("--journal-mode", choices=("delete", "truncate", "persist", "wal"), default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.db or ensure_database(Path(tmp), parse_scale(args.clients))
+        run_copy = Path(tmp) / "simulation.sqlite3"
+        copy_database(source, run_copy)
+        report = simulate(run_copy, args.stations, args.duration, args.busy_timeout_ms, args.journal_mode)
+
+    print(f"Стоек: {report['stations']}, длительность: {report['duration']:.0f} с")
+    print(f"Операций: {report['operations']}, в секунду: {report['throughput']:.1f}")
+    print(f"p50: {report['p50'] * 1000:.2f} мс, p99: {report['p99'] * 1000:.2f} мс")
+    if report["busy_timeout_ms"]:
+        print(
+            f"SQLITE_BUSY: {report['busy']}, время неудачных попыток и пауз: {report['lock_wait']:.2f} с "
+            f"(ожидание внутри busy_timeout у успешных попыток не видно), отказов: {report['failed']}"
+        )
+    else:
+        print(f"SQLITE_BUSY: {report['busy']}, ожидание блокировок: {report['lock_wait']:.2f} с, отказов: {report['failed']}")
+    for name, stats in report["by_operation"].items():
+        print(f"  {name:<16} {stats['count']:>8}  p50 {stats['p50'] * 1000:8.2f} мс  p99 {stats['p99'] * 1000:8.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
+import html
+import sqlite3
 from datetime import date
 from typing import Optional
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtWidgets import *
 
-from salon_app.db_access import AuthUser, Db
-from salon_app.ui.edit_dialogs import ClientEditDialog, MasterEditDialog, ServiceEditDialog
+from salon_app.client_metrics import SEGMENTS
+from salon_app.db_access import STATUS_TRANSITIONS, AuthUser, Db, ServiceChange
+from salon_app.search import ENTITY_NAMES, MATCH_END, MATCH_START
+from salon_app.ui.edit_dialogs import (
+    ClientEditDialog,
+    HistoryDialog,
+    MasterEditDialog,
+    ReassignmentDialog,
+    ServiceEditDialog,
+)
 from salon_app.ui.table_helpers import clear_table, set_table_row
 
 
@@ -15,17 +25,33 @@ class AdminWindow(QMainWindow):
         self.user = user
 
         self.tabs = QTabWidget()
-        self.setCentralWidget(self.tabs)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Поиск по заметкам, профилям и услугам")
+        self.search_input.returnPressed.connect(self._run_search)
+        search_button = QPushButton("Найти")
+        search_button.clicked.connect(self._run_search)
+
+        search_row = QHBoxLayout()
+        search_row.addWidget(self.search_input, 1)
+        search_row.addWidget(search_button)
+
+        central = QWidget()
+        central_layout = QVBoxLayout(central)
+        central_layout.addLayout(search_row)
+        central_layout.addWidget(self.tabs, 1)
+        self.setCentralWidget(central)
 
         self.clients_tab = self._build_clients_tab()
         self.masters_tab = self._build_masters_tab()
         self.services_tab = self._build_services_tab()
         self.appointments_tab = self._build_appointments_tab()
+        self.search_tab = self._build_search_tab()
 
         self.tabs.addTab(self.clients_tab, "Клиенты")
         self.tabs.addTab(self.masters_tab, "Мастера")
         self.tabs.addTab(self.services_tab, "Прайс")
         self.tabs.addTab(self.appointments_tab, "Записи")
+        self.tabs.addTab(self.search_tab, "Поиск")
 
         self.setWindowTitle("Администратор")
         self.setMinimumSize(980, 620)
@@ -39,23 +65,51 @@ class AdminWindow(QMainWindow):
         root = QWidget()
         layout = QVBoxLayout(root)
 
-        self.clients_table = QTableWidget(0, 6)
+        self.clients_table = QTableWidget(0, 10)
         self.clients_table.setHorizontalHeaderLabels(
-            ["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Регистрация"]
+            [
+                "ID", "ФИО", "Дата рождения", "Телефон", "Email", "Регистрация",
+                "Последний визит", "Визитов", "Сумма оплат", "Сегмент",
+            ]
         )
         self.clients_table.setSelectionBehavior(QTableWidget.SelectRows)
         self.clients_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.clients_table.verticalHeader().setVisible(False)
         self.clients_table.horizontalHeader().setStretchLastSection(True)
 
+        self.clients_segment = QComboBox()
+        self.clients_segment.addItem("Все сегменты", None)
+        for segment in SEGMENTS:
+            self.clients_segment.addItem(segment, segment)
+        self.clients_order = QComboBox()
+        for title, order_by in (
+            ("По ID", "id"),
+            ("По последнему визиту", "last_visit"),
+            ("По числу визитов", "visits"),
+            ("По сумме оплат", "total_spend"),
+        ):
+            self.clients_order.addItem(title, order_by)
+
         actions = QHBoxLayout()
         add_button = QPushButton("Добавить")
         edit_button = QPushButton("Изменить")
+        history_button = QPushButton("История")
+        metrics_button = QPushButton("Пересчитать метрики")
+        actions.addWidget(QLabel("Сегмент:"))
+        actions.addWidget(self.clients_segment)
+        actions.addWidget(QLabel("Сортировка:"))
+        actions.addWidget(self.clients_order)
+        actions.addWidget(metrics_button)
         actions.addStretch(1)
         actions.addWidget(add_button)
         actions.addWidget(edit_button)
+        actions.addWidget(history_button)
 
+        self.clients_segment.currentIndexChanged.connect(self._refresh_clients)
+        self.clients_order.currentIndexChanged.connect(self._refresh_clients)
+        metrics_button.clicked.connect(self._refresh_client_metrics)
         add_button.clicked.connect(self._add_client)
+        history_button.clicked.connect(lambda: self._show_history("client", self.clients_table))
         edit_button.clicked.connect(self._edit_client)
 
         layout.addLayout(actions)
@@ -78,11 +132,14 @@ class AdminWindow(QMainWindow):
         actions = QHBoxLayout()
         add_button = QPushButton("Добавить")
         edit_button = QPushButton("Изменить")
+        history_button = QPushButton("История")
         actions.addStretch(1)
         actions.addWidget(add_button)
         actions.addWidget(edit_button)
+        actions.addWidget(history_button)
 
         add_button.clicked.connect(self._add_master)
+        history_button.clicked.connect(lambda: self._show_history("master", self.masters_table))
         edit_button.clicked.connect(self._edit_master)
 
         layout.addLayout(actions)
@@ -105,12 +162,27 @@ class AdminWindow(QMainWindow):
         actions = QHBoxLayout()
         add_button = QPushButton("Добавить")
         edit_button = QPushButton("Изменить")
+        history_button = QPushButton("История")
+        self.services_bulk_button = QPushButton("Правка таблицы")
+        self.services_bulk_button.setCheckable(True)
+        self.services_apply_button = QPushButton("Применить")
+        self.services_cancel_button = QPushButton("Отменить")
+        self.services_apply_button.setVisible(False)
+        self.services_cancel_button.setVisible(False)
         actions.addStretch(1)
+        actions.addWidget(self.services_bulk_button)
+        actions.addWidget(self.services_apply_button)
+        actions.addWidget(self.services_cancel_button)
         actions.addWidget(add_button)
         actions.addWidget(edit_button)
+        actions.addWidget(history_button)
 
         add_button.clicked.connect(self._add_service)
+        history_button.clicked.connect(lambda: self._show_history("service", self.services_table))
         edit_button.clicked.connect(self._edit_service)
+        self.services_bulk_button.toggled.connect(self._set_services_bulk_mode)
+        self.services_apply_button.clicked.connect(self._apply_services_bulk)
+        self.services_cancel_button.clicked.connect(self._cancel_services_bulk)
 
         layout.addLayout(actions)
         layout.addWidget(self.services_table, 1)
@@ -147,14 +219,69 @@ class AdminWindow(QMainWindow):
             ["ID", "Дата", "Время", "Статус", "Клиент", "Мастер", "Услуга", "Сумма"]
         )
         self.appointments_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.appointments_table.setSelectionMode(QTableWidget.ExtendedSelection)
         self.appointments_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.appointments_table.verticalHeader().setVisible(False)
         self.appointments_table.horizontalHeader().setStretchLastSection(True)
 
+        status_row = QHBoxLayout()
+        self.status_combo = QComboBox()
+        self.status_combo.addItems([status for status in STATUS_TRANSITIONS if status != "Запланирован"])
+        status_button = QPushButton("Сменить статус")
+        self.appointments_totals_label = QLabel()
+        status_row.addWidget(self.appointments_totals_label)
+        status_row.addStretch(1)
+        status_row.addWidget(self.status_combo)
+        status_row.addWidget(status_button)
+
+        status_button.clicked.connect(self._change_appointments_status)
+
         layout.addLayout(filter_row)
         layout.addWidget(self.appointments_table, 1)
+        layout.addLayout(status_row)
         return root
 
+    def _build_search_tab(self) -> QWidget:
+        root = QWidget()
+        layout = QVBoxLayout(root)
+
+        self.search_status = QLabel()
+        self.search_table = QTableWidget(0, 4)
+        self.search_table.setHorizontalHeaderLabels(["Тип", "ID", "Объект", "Фрагмент"])
+        self.search_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.search_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.search_table.verticalHeader().setVisible(False)
+        self.search_table.horizontalHeader().setStretchLastSection(True)
+
+        layout.addWidget(self.search_status)
+        layout.addWidget(self.search_table, 1)
+        return root
+
+    def _run_search(self) -> None:
+        text = self.search_input.text().strip()
+        if not text:
+            return
+        try:
+            hits = self.db.search(text)
+        except sqlite3.OperationalError:
+            QMessageBox.warning(self, "Ошибка", "Полнотекстовый поиск недоступен в этой БД")
+            return
+
+        clear_table(self.search_table)
+        for i, hit in enumerate(hits):
+            set_table_row(self.search_table, i, [ENTITY_NAMES.get(hit.entity_type, ""), str(hit.entity_id), hit.title, ""])
+            snippet = html.escape(hit.snippet).replace(MATCH_START, "<b>").replace(MATCH_END, "</b>")
+            self.search_table.setCellWidget(i, 3, QLabel(snippet))
+        self.search_status.setText(f"Найдено: {len(hits)}")
+        self.tabs.setCurrentWidget(self.search_tab)
+
+    def _show_history(self, entity: str, table: QTableWidget) -> None:
+        entity_id = self._selected_id(table)
+        if entity_id is None:
+            QMessageBox.information(self, "Инфо", "Выберите запись")
+            return
+        HistoryDialog(self, title=f"История изменений #{entity_id}", rows=self.db.entity_history(entity, entity_id)).exec_()
+
     def _selected_id(self, table: QTableWidget) -> Optional[int]:
         row = table.currentRow()
         if row < 0:
@@ -169,20 +296,15 @@ class AdminWindow(QMainWindow):
 
     def _refresh_clients(self) -> None:
         clear_table(self.clients_table)
-        rows = self.db.list_clients()
-        for i, row in enumerate(rows):
-            set_table_row(
-                self.clients_table,
-                i,
-                [
-                    str(row["id_client"]),
-                    str(row["fio"] or ""),
-                    str(row["birth_date"] or ""),
-                    str(row["phone"] or ""),
-                    str(row["email"] or ""),
-                    str(row["registration_date"] or ""),
-                ],
-            )
+        records = self.db.list_client_records(
+            segment=self.clients_segment.currentData(), order_by=self.clients_order.currentData()
+        )
+        for i, record in enumerate(records):
+            set_table_row(self.clients_table, i, record)
+
+    def _refresh_client_metrics(self) -> None:
+        self.db.refresh_client_metrics()
+        self._refresh_clients()
 
     def _add_client(self) -> None:
         dialog = ClientEditDialog(self, title="Новый клиент")
@@ -276,21 +398,113 @@ class AdminWindow(QMainWindow):
         self.db.update_master(id_master=id_master, **data)
         self._refresh_masters()
 
+        if int(current["is_active"] or 0) == 1 and data["is_active"] == 0:
+            self._reassign_master_appointments(id_master)
+
+    def _reassign_master_appointments(self, id_master: int) -> None:
+        plan = self.db.plan_master_reassignment(id_master)
+        if not plan:
+            return
+
+        master_names = {int(row["id_master"]): str(row["fio"]) for row in self.db.list_masters()}
+        dialog = ReassignmentDialog(self, plan=plan, master_names=master_names)
+        if dialog.exec_() != dialog.Accepted:
+            return
+
+        moved = self.db.apply_master_reassignment(plan)
+        QMessageBox.information(self, "Перенос записей", f"Перенесено записей: {moved}")
+        self._show_all_appointments()
+
     def _refresh_services(self) -> None:
         clear_table(self.services_table)
         rows = self.db.list_services()
+        self.services_loaded = {}
         for i, row in enumerate(rows):
-            set_table_row(
-                self.services_table,
-                i,
-                [
-                    str(row["id_service"]),
-                    str(row["category_name"] or ""),
-                    str(row["service_name"] or ""),
-                    str(row["price"] or ""),
-                    str(row["duration_minutes"] or ""),
-                ],
+            values = [
+                str(row["id_service"]),
+                str(row["category_name"] or ""),
+                str(row["service_name"] or ""),
+                str(row["price"] or ""),
+                str(row["duration_minutes"] or ""),
+            ]
+            self.services_loaded[int(row["id_service"])] = values
+            set_table_row(self.services_table, i, values)
+            for col in (0, 1):
+                item = self.services_table.item(i, col)
+                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+
+    def _services_have_unsaved_edits(self) -> bool:
+        for i in range(self.services_table.rowCount()):
+            loaded = self.services_loaded.get(int(self.services_table.item(i, 0).text()))
+            if loaded is None:
+                continue
+            edited = [self.services_table.item(i, col).text().strip() for col in (2, 3, 4)]
+            if edited != [value.strip() for value in loaded[2:5]]:
+                return True
+        return False
+
+    def _set_services_bulk_mode(self, enabled: bool) -> None:
+        if not enabled and self._services_have_unsaved_edits():
+            answer = QMessageBox.question(
+                self,
+                "Правка таблицы",
+                "В таблице услуг есть несохранённые изменения.\n\nОтменить их?",
             )
+            if answer != QMessageBox.Yes:
+                self.services_bulk_button.blockSignals(True)
+                self.services_bulk_button.setChecked(True)
+                self.services_bulk_button.blockSignals(False)
+                return
+            self._refresh_services()
+        self.services_table.setEditTriggers(
+            QTableWidget.DoubleClicked | QTableWidget.EditKeyPressed | QTableWidget.AnyKeyPressed
+            if enabled
+            else QTableWidget.NoEditTriggers
+        )
+        self.services_table.setSelectionBehavior(QTableWidget.SelectItems if enabled else QTableWidget.SelectRows)
+        self.services_apply_button.setVisible(enabled)
+        self.services_cancel_button.setVisible(enabled)
+
+    def _cancel_services_bulk(self) -> None:
+        self._refresh_services()
+        self.services_bulk_button.setChecked(False)
+
+    def _collect_service_changes(self) -> list[ServiceChange]:
+        changes = []
+        for i in range(self.services_table.rowCount()):
+            id_service = int(self.services_table.item(i, 0).text())
+            loaded = self.services_loaded.get(id_service)
+            if loaded is None:
+                continue
+            name, price, duration = (self.services_table.item(i, col).text().strip() for col in (2, 3, 4))
+            if [name, price, duration] == [value.strip() for value in loaded[2:5]]:
+                continue
+            try:
+                changes.append(
+                    ServiceChange(
+                        id_service=id_service,
+                        service_name=name if name != loaded[2].strip() else None,
+                        price=float(price.replace(",", ".")) if price != loaded[3].strip() else None,
+                        duration_minutes=int(duration) if duration != loaded[4].strip() else None,
+                    )
+                )
+            except ValueError:
+                raise ValueError(f"Услуга {id_service}: некорректная цена или длительность") from None
+        return changes
+
+    def _apply_services_bulk(self) -> None:
+        try:
+            changes = self._collect_service_changes()
+        except ValueError as error:
+            QMessageBox.warning(self, "Ошибка", str(error))
+            return
+        ok, status = self.db.update_services_bulk(changes)
+        if not ok:
+            QMessageBox.warning(self, "Ошибка", status)
+            return
+        self._refresh_services()
+        self.services_bulk_button.setChecked(False)
+        QMessageBox.information(self, "Статус", status)
 
     def _add_service(self) -> None:
         dialog = ServiceEditDialog(self, db=self.db, title="Новая услуга")
@@ -333,23 +547,16 @@ class AdminWindow(QMainWindow):
         self._refresh_services()
 
     def _load_appointments(self, date_from: Optional[date], date_to: Optional[date]) -> None:
+        self.appointments_period = (date_from, date_to)
         clear_table(self.appointments_table)
-        rows = self.db.list_appointments(date_from, date_to)
-        for i, row in enumerate(rows):
-            set_table_row(
-                self.appointments_table,
-                i,
-                [
-                    str(row["id_appointment"]),
-                    str(row["appointment_date"] or ""),
-                    str(row["appointment_time"] or ""),
-                    str(row["status"] or ""),
-                    str(row["client_fio"] or ""),
-                    str(row["master_fio"] or ""),
-                    str(row["service_name"] or ""),
-                    str(row["total_price"] or ""),
-                ],
-            )
+        with self.db.snapshot() as view:
+            records = view.list_appointment_records(date_from, date_to)
+            totals = view.appointment_totals(date_from, date_to)
+        self.appointments_totals_label.setText(
+            f"Записей: {totals['appointments_count']}, сумма: {totals['total_amount']}"
+        )
+        for i, record in enumerate(records):
+            set_table_row(self.appointments_table, i, record)
 
     def _filter_appointments(self) -> None:
         d_from = self.date_from.date().toPyDate()
@@ -362,11 +569,39 @@ class AdminWindow(QMainWindow):
     def _show_all_appointments(self) -> None:
         self._load_appointments(None, None)
 
+    def _selected_ids(self, table: QTableWidget) -> list[int]:
+        ids = []
+        for index in table.selectionModel().selectedRows():
+            item = table.item(index.row(), 0)
+            if item is None:
+                continue
+            try:
+                ids.append(int(item.text()))
+            except ValueError:
+                continue
+        return ids
+
+    def _change_appointments_status(self) -> None:
+        ids = self._selected_ids(self.appointments_table)
+        if not ids:
+            QMessageBox.information(self, "Инфо", "Выберите записи")
+            return
+
+        new_status = self.status_combo.currentText()
+        updated = self.db.transition_status_bulk(ids, new_status)
+        skipped = len(ids) - updated
+        message = f"Статус «{new_status}» установлен: {updated}"
+        if skipped:
+            message += f"\nПропущено (недопустимый переход): {skipped}"
+        QMessageBox.information(self, "Статус", message)
+        self._load_appointments(*self.appointments_period)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_F5:
             self._refresh_clients()
             self._refresh_masters()
-            self._refresh_services()
+            if not self.services_bulk_button.isChecked():
+                self._refresh_services()
             self._show_all_appointments()
             return
         super().keyPressEvent(event)
\ No newline at end of file
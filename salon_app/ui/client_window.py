@@ -2,6 +2,7 @@ from typing import Optional
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtWidgets import *
 from salon_app.db_access import AuthUser, Db
+from salon_app.history_cache import ClientHistoryCache, Move
 from salon_app.ui.table_helpers import clear_table, set_table_row
 
 
@@ -10,6 +11,7 @@ class BookingDialog(QDialog):
         super().__init__()
         self.db = db
         self.user = user
+        self.created_id: Optional[int] = None
 
         self.service_combo = QComboBox()
         self.master_combo = QComboBox()
@@ -107,7 +109,7 @@ class BookingDialog(QDialog):
         planned_start = self.planned_start.date().toPyDate()
         planned_end = self.planned_end.date().toPyDate()
 
-        ok, status, _id = self.db.create_appointment_with_form(
+        ok, status, id_appointment = self.db.create_appointment_with_form(
             id_client=self.user.id_client,
             id_master=id_master,
             id_service=id_service,
@@ -123,6 +125,7 @@ class BookingDialog(QDialog):
         if not ok:
             QMessageBox.warning(self, "Статус", status)
             return
+        self.created_id = id_appointment
         QMessageBox.information(self, "Статус", status)
         self.accept()
 
@@ -132,14 +135,17 @@ class ClientWindow(QWidget):
         super().__init__()
         self.db = db
         self.user = user
+        self.history = ClientHistoryCache(db, user.id_client) if user.id_client is not None else None
 
         self.tabs = QTabWidget()
 
         self.available_tab = self._build_available_tab()
         self.appointments_tab = self._build_appointments_tab()
+        self.waitlist_tab = self._build_waitlist_tab()
 
         self.tabs.addTab(self.available_tab, "Доступно")
         self.tabs.addTab(self.appointments_tab, "Мои записи")
+        self.tabs.addTab(self.waitlist_tab, "Лист ожидания")
 
         layout = QVBoxLayout()
         layout.addWidget(self.tabs)
@@ -148,7 +154,8 @@ class ClientWindow(QWidget):
         self.setWindowTitle("Клиент")
         self.setMinimumSize(900, 620)
 
-        self._refresh_my_appointments()
+        self._load_my_appointments()
+        self._refresh_waitlist()
 
     def _build_available_tab(self) -> QWidget:
         root = QWidget()
@@ -197,6 +204,135 @@ class ClientWindow(QWidget):
         layout.addWidget(self.my_table, 1)
         return root
 
+    def _build_waitlist_tab(self) -> QWidget:
+        root = QWidget()
+        layout = QVBoxLayout(root)
+
+        self.waitlist_services = self.db.list_active_services()
+        self.waitlist_masters = self.db.list_active_masters()
+        self.waitlist_service = QComboBox()
+        for row in self.waitlist_services:
+            self.waitlist_service.addItem(str(row["service_name"]), int(row["id_service"]))
+        self.waitlist_master = QComboBox()
+        self.waitlist_master.addItem("Любой", None)
+        for row in self.waitlist_masters:
+            self.waitlist_master.addItem(str(row["fio"]), int(row["id_master"]))
+
+        self.waitlist_from = QDateEdit()
+        self.waitlist_to = QDateEdit()
+        for edit, days in ((self.waitlist_from, 0), (self.waitlist_to, 14)):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+            edit.setDate(QDate.currentDate().addDays(days))
+        self.waitlist_auto_book = QCheckBox("Записать автоматически")
+
+        join_button = QPushButton("Встать в очередь")
+        join_button.clicked.connect(self._join_waitlist)
+
+        form = QHBoxLayout()
+        form.addWidget(self.waitlist_service)
+        form.addWidget(self.waitlist_master)
+        form.addWidget(QLabel("с"))
+        form.addWidget(self.waitlist_from)
+        form.addWidget(QLabel("по"))
+        form.addWidget(self.waitlist_to)
+        form.addWidget(self.waitlist_auto_book)
+        form.addStretch(1)
+        form.addWidget(join_button)
+
+        self.waitlist_table = QTableWidget(0, 7)
+        self.waitlist_table.setHorizontalHeaderLabels(
+            ["ID", "Услуга", "Мастер", "Период", "Автозапись", "Статус", "Предложение"]
+        )
+        self.waitlist_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.waitlist_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.waitlist_table.verticalHeader().setVisible(False)
+        self.waitlist_table.horizontalHeader().setStretchLastSection(True)
+
+        accept_button = QPushButton("Принять предложение")
+        remove_button = QPushButton("Убрать из очереди")
+        accept_button.clicked.connect(self._accept_waitlist_offer)
+        remove_button.clicked.connect(self._remove_from_waitlist)
+
+        actions = QHBoxLayout()
+        actions.addStretch(1)
+        actions.addWidget(accept_button)
+        actions.addWidget(remove_button)
+
+        layout.addLayout(form)
+        layout.addWidget(self.waitlist_table, 1)
+        layout.addLayout(actions)
+        return root
+
+    def _refresh_waitlist(self) -> None:
+        if self.user.id_client is None:
+            return
+        clear_table(self.waitlist_table)
+        for i, row in enumerate(self.db.list_client_waitlist(self.user.id_client)):
+            offer = ""
+            if row["offer_date"]:
+                offer = f"{row['offer_date']} {row['offer_time']} {row['offer_master_fio'] or ''}"
+                if row["status"] == "Предложено":
+                    offer += f" (до {str(row['offer_expires_at'])[:16]})"
+            set_table_row(
+                self.waitlist_table,
+                i,
+                [
+                    str(row["id_waitlist"]),
+                    str(row["service_name"] or ""),
+                    str(row["master_fio"] or ""),
+                    f"{row['date_from']} — {row['date_to']}",
+                    "Да" if row["auto_book"] else "Нет",
+                    str(row["status"] or ""),
+                    offer,
+                ],
+            )
+
+    def _selected_waitlist_id(self) -> Optional[int]:
+        row = self.waitlist_table.currentRow()
+        item = self.waitlist_table.item(row, 0) if row >= 0 else None
+        return int(item.text()) if item is not None else None
+
+    def _join_waitlist(self) -> None:
+        if self.user.id_client is None:
+            QMessageBox.critical(self, "Ошибка", "Для пользователя не привязан клиент")
+            return
+        if self.waitlist_service.currentIndex() < 0:
+            QMessageBox.warning(self, "Ошибка", "Выберите услугу")
+            return
+        ok, status = self.db.add_to_waitlist(
+            self.user.id_client,
+            self.waitlist_service.currentData(),
+            self.waitlist_from.date().toPyDate(),
+            self.waitlist_to.date().toPyDate(),
+            id_master=self.waitlist_master.currentData(),
+            auto_book=self.waitlist_auto_book.isChecked(),
+        )
+        if not ok:
+            QMessageBox.warning(self, "Ошибка", status)
+            return
+        self._refresh_waitlist()
+
+    def _accept_waitlist_offer(self) -> None:
+        id_waitlist = self._selected_waitlist_id()
+        if id_waitlist is None:
+            QMessageBox.information(self, "Инфо", "Выберите предложение")
+            return
+        ok, status, _id_appointment = self.db.accept_waitlist_offer(id_waitlist)
+        if ok:
+            QMessageBox.information(self, "Статус", status)
+        else:
+            QMessageBox.warning(self, "Статус", status)
+        self._refresh_waitlist()
+        self._refresh_my_appointments()
+
+    def _remove_from_waitlist(self) -> None:
+        id_waitlist = self._selected_waitlist_id()
+        if id_waitlist is None or self.user.id_client is None:
+            return
+        self.db.remove_from_waitlist(id_waitlist, self.user.id_client)
+        self._refresh_waitlist()
+
     def _search_available(self) -> None:
         d_from = self.period_from.date().toPyDate()
         d_to = self.period_to.date().toPyDate()
@@ -213,27 +349,40 @@ class ClientWindow(QWidget):
 
     def _open_booking(self) -> None:
         dialog = BookingDialog(self.db, user=self.user)
-        if dialog.exec_() == dialog.Accepted:
-            self._refresh_my_appointments()
+        if dialog.exec_() == dialog.Accepted and self.history is not None and dialog.created_id is not None:
+            move = self.history.add(dialog.created_id)
+            if move is not None:
+                self._apply_history_move(self.history.rows[dialog.created_id], move)
+
+    def _history_cells(self, row) -> list[str]:
+        return [
+            str(row["id_appointment"]),
+            str(row["appointment_date"] or ""),
+            str(row["appointment_time"] or ""),
+            str(row["status"] or ""),
+            str(row["master_fio"] or ""),
+            str(row["service_name"] or ""),
+        ]
+
+    def _load_my_appointments(self) -> None:
+        if self.history is None:
+            return
+        clear_table(self.my_table)
+        for i, row in enumerate(self.history.warm()):
+            set_table_row(self.my_table, i, self._history_cells(row))
+
+    def _apply_history_move(self, row, move: Move) -> None:
+        old_index, new_index = move
+        if old_index is not None:
+            self.my_table.removeRow(old_index)
+        if new_index is not None:
+            set_table_row(self.my_table, new_index, self._history_cells(row))
 
     def _refresh_my_appointments(self) -> None:
-        if self.user.id_client is None:
+        if self.history is None:
             return
-        clear_table(self.my_table)
-        rows = self.db.list_client_appointments(self.user.id_client)
-        for i, row in enumerate(rows):
-            set_table_row(
-                self.my_table,
-                i,
-                [
-                    str(row["id_appointment"]),
-                    str(row["appointment_date"] or ""),
-                    str(row["appointment_time"] or ""),
-                    str(row["status"] or ""),
-                    str(row["master_fio"] or ""),
-                    str(row["service_name"] or ""),
-                ],
-            )
+        for row, move in self.history.sync():
+            self._apply_history_move(row, move)
 
     def _selected_appointment_id(self) -> Optional[int]:
         row = self.my_table.currentRow()
@@ -250,5 +399,6 @@ class ClientWindow(QWidget):
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_F5:
             self._refresh_my_appointments()
+            self._refresh_waitlist()
             return
         super().keyPressEvent(event)
\ No newline at end of file
@@ -1,5 +1,7 @@
+import json
 from PyQt5.QtWidgets import *
 from salon_app.db_access import Db
+from salon_app.ui.table_helpers import set_table_row
 
 
 class ClientEditDialog(QDialog):
@@ -81,12 +83,15 @@ class MasterEditDialog(QDialog):
         self.phone_input = QLineEdit(phone)
         self.email_input = QLineEdit(email)
         self.hire_date_input = QLineEdit(hire_date)
+        self.is_active_input = QCheckBox()
+        self.is_active_input.setChecked(bool(is_active))
         form = QFormLayout()
         form.addRow("ФИО", self.fio_input)
         form.addRow("Специализация", self.specialization_input)
         form.addRow("Телефон", self.phone_input)
         form.addRow("Email", self.email_input)
         form.addRow("Дата найма (YYYY-MM-DD)", self.hire_date_input)
+        form.addRow("Активен", self.is_active_input)
 
         save_button = QPushButton("Сохранить")
         cancel_button = QPushButton("Отмена")
@@ -119,7 +124,7 @@ class MasterEditDialog(QDialog):
             "phone": self.phone_input.text().strip(),
             "email": self.email_input.text().strip(),
             "hire_date": self.hire_date_input.text().strip(),
-            "is_active": 1,
+            "is_active": 1 if self.is_active_input.isChecked() else 0,
         }
 
 
@@ -205,4 +210,89 @@ class ServiceEditDialog(QDialog):
             "duration_minutes": int(self.duration_input.value()),
             "required_materials": self.required_materials_input.text().strip(),
             "is_active": 1,
-        }
\ No newline at end of file
+        }
+
+class HistoryDialog(QDialog):
+    def __init__(self, parent, *, title: str, rows: list):
+        super().__init__(parent)
+        table = QTableWidget(0, 4)
+        table.setHorizontalHeaderLabels(["Время", "Пользователь", "Действие", "Изменения"])
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setStretchLastSection(True)
+        for i, row in enumerate(rows):
+            changes = "; ".join(
+                f"{field}: {old if old is not None else '—'} → {new if new is not None else '—'}"
+                for field, (old, new) in json.loads(row["diff"]).items()
+            )
+            set_table_row(
+                table,
+                i,
+                [
+                    str(row["changed_at"]),
+                    str(row["username"] or "система"),
+                    "Создание" if row["action"] == "insert" else "Изменение",
+                    changes,
+                ],
+            )
+
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        actions = QHBoxLayout()
+        actions.addStretch(1)
+        actions.addWidget(close_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(table, 1)
+        layout.addLayout(actions)
+        self.setLayout(layout)
+
+        self.setWindowTitle(title)
+        self.setMinimumSize(760, 420)
+
+
+class ReassignmentDialog(QDialog):
+    def __init__(self, parent, *, plan: list, master_names: dict[int, str]):
+        super().__init__(parent)
+        assigned = sum(1 for item in plan if item.to_master is not None)
+        summary = QLabel(
+            f"Будущих записей мастера: {len(plan)}\n"
+            f"Можно передать другим мастерам: {assigned}\n"
+            f"Без замены: {len(plan) - assigned}"
+        )
+
+        table = QTableWidget(0, 4)
+        table.setHorizontalHeaderLabels(["Запись", "Дата", "Время", "Новый мастер"])
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setStretchLastSection(True)
+        for i, item in enumerate(plan):
+            set_table_row(
+                table,
+                i,
+                [
+                    str(item.id_appointment),
+                    item.appointment_date,
+                    item.appointment_time,
+                    master_names.get(item.to_master, str(item.to_master)) if item.to_master is not None else "без замены",
+                ],
+            )
+
+        apply_button = QPushButton("Применить перенос")
+        cancel_button = QPushButton("Отмена")
+        apply_button.setEnabled(assigned > 0)
+        apply_button.clicked.connect(self.accept)
+        cancel_button.clicked.connect(self.reject)
+        actions = QHBoxLayout()
+        actions.addStretch(1)
+        actions.addWidget(apply_button)
+        actions.addWidget(cancel_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(summary)
+        layout.addWidget(table, 1)
+        layout.addLayout(actions)
+        self.setLayout(layout)
+
+        self.setWindowTitle("Перенос записей")
+        self.setMinimumSize(640, 420)
@@ -6,16 +6,21 @@ from salon_app.ui.client_window import ClientWindow
 
 
 class LoginWindow(QDialog):
-    def __init__(self, db: Db):
+    def __init__(self, dbs: dict[str, Db]):
         super().__init__()
-        self.db = db
+        self.dbs = dbs
+        self.db = next(iter(dbs.values()))
         self.next_window = None
 
+        self.branch_combo = QComboBox()
+        self.branch_combo.addItems(list(dbs))
         self.username_input = QLineEdit()
         self.password_input = QLineEdit()
         self.password_input.setEchoMode(QLineEdit.Password)
 
         form = QFormLayout()
+        if len(dbs) > 1:
+            form.addRow("Филиал", self.branch_combo)
         form.addRow("Логин", self.username_input)
         form.addRow("Пароль", self.password_input)
 
@@ -49,6 +54,7 @@ class LoginWindow(QDialog):
             QMessageBox.warning(self, "Ошибка", "Введите логин и пароль")
             return
 
+        self.db = self.dbs[self.branch_combo.currentText()]
         user = self.db.authenticate(username, password)
         if user is None:
             QMessageBox.critical(self, "Ошибка", "Неверный логин или пароль")
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from db import copy_database
+from salon_app.benchmark import DEFAULT_THRESHOLD, ensure_database, find_regressions, parse_scale
+from salon_app.db_access import AuthUser, Db
+from salon_app.ui.admin_window import AdminWindow
+from salon_app.ui.client_window import BookingDialog, ClientWindow
+
+DEFAULT_SCALES = "10k,100k"
+DEFAULT_REPEAT = 3
+HEARTBEAT_MS = 5
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _timed(action: Callable[[], object], repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def _event_loop_stall(action: Callable[[], object]) -> float:
+    gaps = []
+    last = [time.perf_counter()]
+
+    def tick() -> None:
+        now = time.perf_counter()
+        gaps.append(now - last[0])
+        last[0] = now
+
+    loop = QEventLoop()
+    heartbeat = QTimer()
+    heartbeat.setInterval(HEARTBEAT_MS)
+    heartbeat.timeout.connect(tick)
+    heartbeat.start()
+
+    def run_action() -> None:
+        action()
+        QTimer.singleShot(HEARTBEAT_MS * 10, loop.quit)
+
+    QTimer.singleShot(HEARTBEAT_MS * 4, run_action)
+    loop.exec_()
+    heartbeat.stop()
+    return max(gaps, default=0.0) - HEARTBEAT_MS / 1000
+
+
+def _memory_per_10k_rows(load: Callable[[], int], clear: Callable[[], None]) -> dict[str, float]:
+    clear()
+    tracemalloc.start()
+    rss_before = _rss_bytes()
+    rows = load()
+    rss_after = _rss_bytes()
+    python_heap, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {"python_heap": python_heap / max(rows, 1) * 10_000}
+    if rss_before is not None and rss_after is not None:
+        result["rss"] = (rss_after - rss_before) / max(rows, 1) * 10_000
+    return result
+
+
+def run_scale(db_path: Path, repeat: int) -> dict[str, dict[str, float]]:
+    db = Db(db_path)
+    try:
+        admin = AuthUser(id_user=0, username="admin", role="admin", id_client=None)
+        row = db.connection.execute(
+            "SELECT id_client FROM appointments GROUP BY id_client ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()
+        client = AuthUser(id_user=0, username="client", role="client", id_client=int(row["id_client"]))
+        week = (date.today() - timedelta(days=7), date.today() + timedelta(days=7))
+
+        results = {}
+        started = time.perf_counter()
+        window = AdminWindow(db, admin)
+        elapsed = time.perf_counter() - started
+        results["admin_window_open"] = {"min": elapsed, "median": elapsed}
+        results["refresh_clients"] = _timed(window._refresh_clients, repeat)
+        results["load_appointments_all"] = _timed(lambda: window._load_appointments(None, None), repeat)
+        results["load_appointments_week"] = _timed(lambda: window._load_appointments(*week), repeat)
+        results["booking_dialog_open"] = _timed(lambda: BookingDialog(db, user=client).deleteLater(), repeat)
+
+        client_window = ClientWindow(db, client)
+        results["refresh_my_appointments"] = _timed(client_window._refresh_my_appointments, repeat)
+
+        for name, action in (
+            ("stall_refresh_clients", window._refresh_clients),
+            ("stall_load_appointments_all", lambda: window._load_appointments(None, None)),
+        ):
+            stall = _event_loop_stall(action)
+            results[name] = {"min": stall, "median": stall}
+
+        def load_clients() -> int:
+            window._refresh_clients()
+            return window.clients_table.rowCount()
+
+        def load_appointments() -> int:
+            window._load_appointments(None, None)
+            return window.appointments_table.rowCount()
+
+        for name, load, table in (
+            ("clients", load_clients, window.clients_table),
+            ("appointments", load_appointments, window.appointments_table),
+        ):
+            for kind, value in _memory_per_10k_rows(load, lambda: table.setRowCount(0)).items():
+                results[f"memory_{kind}_per_10k_{name}"] = {"min": value, "median": value}
+
+        client_window.deleteLater()
+        window.deleteLater()
+        return results
+    finally:
+        db.close()
+
+
+def _commit_id() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _format(name: str, value: float) -> str:
+    if name.startswith("memory_"):
+        return f"{value / 1024:12.1f} КБ"
+    return f"{value * 1000:12.3f} мс"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замеры отклика окон PyQt на синтетических данных (offscreen)")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="число клиентов, например 10k,100k")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--workdir", type=Path, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    report = {"commit": _commit_id(), "scales": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for scale in (parse_scale(value) for value in args.scales.split(",")):
+            run_copy = Path(tmp) / f"ui_run_{scale}.sqlite3"
+            copy_database(ensure_database(workdir, scale), run_copy)
+            report["scales"][str(scale)] = run_scale(run_copy, args.repeat)
+            app.processEvents()
+            run_copy.unlink()
+
+            print(f"\nКлиентов: {scale} (commit {report['commit'] or '-'})")
+            for name, value in report["scales"][str(scale)].items():
+                print(f"  {name:<40} {_format(name, value['median'])}")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = find_regressions(report["scales"], baseline.get("scales", {}), args.threshold)
+        for scale, name, before, after in regressions:
+            print(f"Регрессия [{scale}] {name} (commit {baseline.get('commit') or '-'}): {before:.6g} -> {after:.6g}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from salon_app.audit import AuditLog, diff_fields, system_audit
+
+OFFER_TTL = timedelta(hours=2)
+ACTIVE_STATUSES = ("Запланирован", "Клиент пришёл", "Выполняется")
+_ACTIVE = ", ".join(f"'{status}'" for status in ACTIVE_STATUSES)
+
+
+@dataclass(frozen=True)
+class WaitlistMatch:
+    id_waitlist: int
+    id_client: int
+    booked: bool
+    id_appointment: Optional[int]
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.replace(microsecond=0).isoformat(sep=" ")
+
+
+def _master_busy(connection: sqlite3.Connection, id_master: int, appointment_date: str, appointment_time: str) -> bool:
+    row = connection.execute(
+        f"""
+        SELECT 1 FROM appointments
+        WHERE id_master = ? AND appointment_date = ? AND appointment_time = ? AND status IN ({_ACTIVE})
+        LIMIT 1
+        """,
+        (id_master, appointment_date, appointment_time),
+    ).fetchone()
+    return row is not None
+
+
+def _book(
+    connection: sqlite3.Connection,
+    audit: AuditLog,
+    id_client: int,
+    id_service: int,
+    id_master: int,
+    appointment_date: str,
+    appointment_time: str,
+) -> int:
+    appointment = {
+        "id_client": id_client,
+        "id_master": id_master,
+        "id_service": id_service,
+        "appointment_date": appointment_date,
+        "appointment_time": appointment_time,
+    }
+    cursor = connection.execute(
+        """
+        INSERT INTO appointments (
+            id_client, id_master, id_service, appointment_date, appointment_time, status, total_price, notes
+        )
+        VALUES (:id_client, :id_master, :id_service, :appointment_date, :appointment_time, 'Запланирован',
+                COALESCE(
+                    (SELECT price FROM service_price_history
+                     WHERE id_service = :id_service AND valid_from <= :appointment_date
+                     ORDER BY valid_from DESC LIMIT 1),
+                    (SELECT price FROM service_pricelist WHERE id_service = :id_service)
+                ),
+                'Из листа ожидания')
+        """,
+        appointment,
+    )
+    id_appointment = int(cursor.lastrowid)
+    audit.record("appointment", id_appointment, "insert", diff_fields(None, appointment))
+    return id_appointment
+
+
+def add_to_waitlist(
+    connection: sqlite3.Connection,
+    id_client: int,
+    id_service: int,
+    date_from: date,
+    date_to: date,
+    id_master: Optional[int] = None,
+    auto_book: bool = False,
+    audit: Optional[AuditLog] = None,
+) -> int:
+    entry = {
+        "id_client": id_client,
+        "id_service": id_service,
+        "id_master": id_master,
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "auto_book": int(auto_book),
+    }
+    with connection:
+        cursor = connection.execute(
+            """
+            INSERT INTO waitlist (id_client, id_service, id_master, date_from, date_to, auto_book)
+            VALUES (:id_client, :id_service, :id_master, :date_from, :date_to, :auto_book)
+            """,
+            entry,
+        )
+        id_waitlist = int(cursor.lastrowid)
+        (audit or system_audit(connection)).record("waitlist", id_waitlist, "insert", diff_fields(None, entry))
+    return id_waitlist
+
+
+def _find_candidate(
+    connection: sqlite3.Connection, id_service: int, id_master: int, appointment_date: str, appointment_time: str
+) -> Optional[sqlite3.Row]:
+    for master in (id_master, None):
+        row = connection.execute(
+            f"""
+            SELECT w.id_waitlist, w.id_client, w.auto_book
+            FROM waitlist w
+            WHERE w.status = 'Ожидает' AND w.id_service = :id_service AND w.id_master IS :master
+              AND w.date_to >= :appointment_date AND w.date_from <= :appointment_date
+              AND NOT (w.offer_master IS :id_master AND w.offer_date IS :appointment_date
+                       AND w.offer_time IS :appointment_time)
+              AND NOT EXISTS (
+                  SELECT 1 FROM appointments a
+                  WHERE a.id_client = w.id_client AND a.appointment_date = :appointment_date
+                    AND a.appointment_time = :appointment_time AND a.status IN ({_ACTIVE})
+              )
+            ORDER BY w.id_waitlist
+            LIMIT 1
+            """,
+            {
+                "id_service": id_service,
+                "master": master,
+                "id_master": id_master,
+                "appointment_date": appointment_date,
+                "appointment_time": appointment_time,
+            },
+        ).fetchone()
+        if row is not None:
+            return row
+    return None
+
+
+def offer_slot(
+    connection: sqlite3.Connection,
+    id_service: int,
+    id_master: int,
+    appointment_date: str,
+    appointment_time: str,
+    now: Optional[datetime] = None,
+    audit: Optional[AuditLog] = None,
+) -> Optional[WaitlistMatch]:
+    now = now or datetime.now()
+    audit = audit or system_audit(connection)
+    if f"{appointment_date} {appointment_time}" <= _timestamp(now):
+        return None
+    if _master_busy(connection, id_master, appointment_date, appointment_time):
+        return None
+
+    candidate = _find_candidate(connection, id_service, id_master, appointment_date, appointment_time)
+    if candidate is None:
+        return None
+
+    id_waitlist = int(candidate["id_waitlist"])
+    id_client = int(candidate["id_client"])
+    if candidate["auto_book"]:
+        id_appointment = _book(connection, audit, id_client, id_service, id_master, appointment_date, appointment_time)
+        connection.execute(
+            """
+            UPDATE waitlist
+            SET status = 'Записан', id_appointment = ?, offer_master = ?, offer_date = ?, offer_time = ?,
+                offer_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id_waitlist = ?
+            """,
+            (id_appointment, id_master, appointment_date, appointment_time, id_waitlist),
+        )
+        audit.record(
+            "waitlist", id_waitlist, "update", {"status": ["Ожидает", "Записан"], "id_appointment": [None, id_appointment]}
+        )
+        return WaitlistMatch(id_waitlist, id_client, True, id_appointment)
+
+    connection.execute(
+        """
+        UPDATE waitlist
+        SET status = 'Предложено', offer_master = ?, offer_date = ?, offer_time = ?, offer_expires_at = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id_waitlist = ?
+        """,
+        (id_master, appointment_date, appointment_time, _timestamp(now + OFFER_TTL), id_waitlist),
+    )
+    audit.record(
+        "waitlist",
+        id_waitlist,
+        "update",
+        {
+            "status": ["Ожидает", "Предложено"],
+            "offer_master": [None, id_master],
+            "offer_date": [None, appointment_date],
+            "offer_time": [None, appointment_time],
+        },
+    )
+    connection.execute(
+        """
+        INSERT OR IGNORE INTO notification_outbox (idempotency_key, id_waitlist, kind, due_at)
+        VALUES (?, ?, 'Предложение', ?)
+        """,
+        (f"offer:{id_waitlist}:{appointment_date}T{appointment_time}:{id_master}", id_waitlist, _timestamp(now)),
+    )
+    return WaitlistMatch(id_waitlist, id_client, False, None)
+
+
+def fill_cancelled_slot(
+    connection: sqlite3.Connection,
+    id_appointment: int,
+    now: Optional[datetime] = None,
+    audit: Optional[AuditLog] = None,
+) -> Optional[WaitlistMatch]:
+    row = connection.execute(
+        """
+        SELECT id_service, id_master, appointment_date, appointment_time
+        FROM appointments
+        WHERE id_appointment = ? AND status = 'Отменён'
+        """,
+        (id_appointment,),
+    ).fetchone()
+    if row is None or row["id_service"] is None or row["id_master"] is None:
+        return None
+    return offer_slot(
+        connection,
+        int(row["id_service"]),
+        int(row["id_master"]),
+        str(row["appointment_date"]),
+        str(row["appointment_time"]),
+        now,
+        audit,
+    )
+
+
+def accept_offer(
+    connection: sqlite3.Connection, id_waitlist: int, now: Optional[datetime] = None, audit: Optional[AuditLog] = None
+) -> tuple[bool, str, Optional[int]]:
+    now = now or datetime.now()
+    audit = audit or system_audit(connection)
+    with connection:
+        row = connection.execute(
+            """
+            SELECT id_client, id_service, offer_master, offer_date, offer_time, offer_expires_at
+            FROM waitlist
+            WHERE id_waitlist = ? AND status = 'Предложено'
+            """,
+            (id_waitlist,),
+        ).fetchone()
+        if row is None:
+            return False, "Предложение не найдено", None
+        if str(row["offer_expires_at"]) < _timestamp(now):
+            return False, "Срок предложения истёк", None
+        if _master_busy(connection, row["offer_master"], row["offer_date"], row["offer_time"]):
+            return False, "Слот уже занят", None
+
+        id_appointment = _book(
+            connection,
+            audit,
+            int(row["id_client"]),
+            int(row["id_service"]),
+            int(row["offer_master"]),
+            str(row["offer_date"]),
+            str(row["offer_time"]),
+        )
+        connection.execute(
+            """
+            UPDATE waitlist
+            SET status = 'Записан', id_appointment = ?, offer_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id_waitlist = ?
+            """,
+            (id_appointment, id_waitlist),
+        )
+        audit.record(
+            "waitlist", id_waitlist, "update", {"status": ["Предложено", "Записан"], "id_appointment": [None, id_appointment]}
+        )
+    return True, "Запись создана", id_appointment
+
+
+def remove_from_waitlist(
+    connection: sqlite3.Connection, id_waitlist: int, id_client: int, audit: Optional[AuditLog] = None
+) -> bool:
+    with connection:
+        old = connection.execute(
+            "SELECT status FROM waitlist WHERE id_waitlist = ? AND id_client = ? AND status IN ('Ожидает', 'Предложено')",
+            (id_waitlist, id_client),
+        ).fetchone()
+        if old is None:
+            return False
+        connection.execute(
+            "UPDATE waitlist SET status = 'Снят', offer_expires_at = NULL, updated_at = CURRENT_TIMESTAMP WHERE id_waitlist = ?",
+            (id_waitlist,),
+        )
+        (audit or system_audit(connection)).record("waitlist", id_waitlist, "update", {"status": [old["status"], "Снят"]})
+    return True
+
+
+def list_client_waitlist(connection: sqlite3.Connection, id_client: int) -> list[sqlite3.Row]:
+    return connection.execute(
+        """
+        SELECT w.id_waitlist, s.service_name, COALESCE(m.fio, 'Любой') AS master_fio, w.date_from, w.date_to,
+               w.auto_book, w.status, w.offer_date, w.offer_time, om.fio AS offer_master_fio, w.offer_expires_at
+        FROM waitlist w
+        LEFT JOIN service_pricelist s ON s.id_service = w.id_service
+        LEFT JOIN masters m ON m.id_master = w.id_master
+        LEFT JOIN masters om ON om.id_master = w.offer_master
+        WHERE w.id_client = ? AND w.status IN ('Ожидает', 'Предложено', 'Записан')
+        ORDER BY w.id_waitlist DESC
+        """,
+        (id_client,),
+    ).fetchall()
+
+
+def expire_waitlist(
+    connection: sqlite3.Connection, now: Optional[datetime] = None, audit: Optional[AuditLog] = None
+) -> int:
+    now = now or datetime.now()
+    moment = _timestamp(now)
+    audit = audit or system_audit(connection)
+    with connection:
+        expired_offers = connection.execute(
+            """
+            UPDATE waitlist
+            SET status = 'Ожидает', offer_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'Предложено' AND offer_expires_at < ?
+            RETURNING id_waitlist, id_service, offer_master, offer_date, offer_time
+            """,
+            (moment,),
+        ).fetchall()
+        audit.record_many(
+            "waitlist",
+            "update",
+            [(int(row["id_waitlist"]), {"status": ["Предложено", "Ожидает"]}) for row in expired_offers],
+        )
+        for row in expired_offers:
+            offer_slot(
+                connection,
+                int(row["id_service"]),
+                int(row["offer_master"]),
+                str(row["offer_date"]),
+                str(row["offer_time"]),
+                now,
+                audit,
+            )
+        stale = connection.execute(
+            "SELECT id_waitlist, status FROM waitlist WHERE status IN ('Ожидает', 'Предложено') AND date_to < ?",
+            (now.date().isoformat(),),
+        ).fetchall()
+        connection.executemany(
+            """
+            UPDATE waitlist
+            SET status = 'Истёк', offer_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id_waitlist = ?
+            """,
+            [(row["id_waitlist"],) for row in stale],
+        )
+        audit.record_many(
+            "waitlist", "update", [(int(row["id_waitlist"]), {"status": [row["status"], "Истёк"]}) for row in stale]
+        )
+    return len(expired_offers) + len(stale)
@@ -0,0 +1,181 @@
+import argparse
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from db import init_db
+from salon_app.db_access import Db
+
+T = TypeVar("T")
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_DELAY = 0.002
+_STOP = object()
+
+
+class _GroupCommitConnection:
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self._connection = connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def __enter__(self) -> "_GroupCommitConnection":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            self.rollback()
+        return False
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        self._connection.execute("ROLLBACK TO write_job")
+
+
+class WriteQueue:
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ) -> None:
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._jobs: queue.Queue = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(db_path,), name="salon-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def submit(self, func: Callable[[Db], T]) -> "Future[T]":
+        future: Future = Future()
+        self._jobs.put((func, future))
+        return future
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Future:
+        return self.submit(lambda db: getattr(db, method)(*args, **kwargs))
+
+    def close(self) -> None:
+        self._jobs.put(_STOP)
+        self._thread.join()
+
+    def _next_batch(self) -> tuple[list, bool]:
+        first = self._jobs.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._jobs.get(timeout=timeout) if timeout > 0 else self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self, db_path: Optional[Path]) -> None:
+        db = Db(db_path)
+        connection = db.connection
+        db.connection = _GroupCommitConnection(connection)
+        self._ready.set()
+
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._execute(db, connection, batch)
+        connection.close()
+
+    def _execute(self, db: Db, connection: sqlite3.Connection, batch: list) -> None:
+        results = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for func, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                connection.execute("SAVEPOINT write_job")
+                try:
+                    results.append((future, func(db), None))
+                except Exception as error:
+                    connection.execute("ROLLBACK TO write_job")
+                    results.append((future, None, error))
+                connection.execute("RELEASE write_job")
+            connection.commit()
+        except sqlite3.Error as error:
+            if connection.in_transaction:
+                connection.rollback()
+            for _func, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def _bench_direct(db_path: Path, threads: int, writes: int) -> float:
+    def worker(index: int) -> None:
+        db = Db(db_path)
+        try:
+            for n in range(writes):
+                db.create_client(f"Клиент {index}-{n}", "", "", "", "")
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return time.perf_counter() - started
+
+
+def _bench_queue(db_path: Path, threads: int, writes: int) -> float:
+    writer = WriteQueue(db_path)
+
+    def worker(index: int) -> None:
+        for n in range(writes):
+            writer.call("create_client", f"Клиент {index}-{n}", "", "", "", "").result()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+    writer.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение прямых записей и очереди с групповой фиксацией")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    total = args.threads * args.writes
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, bench in (("Прямые записи", _bench_direct), ("Очередь записи", _bench_queue)):
+            db_path = Path(tmp) / f"{bench.__name__}.sqlite3"
+            init_db(seed=True, db_path=db_path)
+            try:
+                elapsed = bench(db_path, args.threads, args.writes)
+            except sqlite3.OperationalError as error:
+                print(f"{name}: ошибка {error}")
+                continue
+            print(f"{name}: {total} записей за {elapsed:.2f} с ({total / elapsed:.0f} в секунду)")
+
+
+if __name__ == "__main__":
+    main()